@@ -1,5 +1,5 @@
 ### Author: Ashlynn Wimer
-### Last Modified: 3/8/2024
+### Last Modified: 10/18/2026
 ### About: This script is used to scrape 4chan, and is called about once every
 ###        30 minutes from a local device.
 
@@ -8,56 +8,41 @@ from pandas import DataFrame, concat
 from bs4 import BeautifulSoup as bs
 from requests_html import HTMLSession
 # from datetime import datetime
+from ChanParser import get_thread_subject, get_threads, parse_thread
+from ScrapeState import ScrapeState, thread_number
+from PostStore import PostStore, is_store
+from ScrapeMetrics import ScrapeMetrics
+import AsyncScraper
+import ChanAPI
 import HelperChan
 import pandas as pd
+import argparse
 import logging
-import spacy
-import re
 from time import sleep
 
-URL_REGEX = r'[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*)'
-POST_REF_REGEX = r'>>[\d]{8}'
+STATE_TTL = 7 * 24 * 60 * 60 # seconds before a thread we no longer see is forgotten
 KWARGS = {'headers':{'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.75 Safari/537.36'}}
 
 
-nlp = spacy.load('en_core_web_sm')
-
 # TODO: test to see if this works on other boards
 
-def get_thread_subject(soup):
-    '''
-    Given the soup for a thread, finds the thread's subject.
-
-    Inputs:
-      soup (BeautifulSoup): BeautifulSoup for a 4chan thread.
-
-    Returns: string containing the thread's subject
-    '''
-    subject = soup.find('span', class_='subject')
-
-    if not subject:
-        first_post = soup.find('div', class_='post')
-        subject = first_post.find('a', title='Reply to this post').get_text()
-        return subject
-
-    if subject.get_text().strip() == '':
-        first_post = soup.find('div', class_='post')
-        subject = first_post.find('a', title='Reply to this post').get_text()
-        return subject
-    
-    return subject.get_text()
-
-def scrape_thread(url):
+def scrape_thread(url, state=None, metrics=None):
     '''
     Function which scrapes all posts from a given 4chan thread and 
     outputs them in a pandas DataFrame.
 
     Inputs:
       url (str): url of the thread
+      state (ScrapeState): if given, the thread is only fetched if it changed
+        since the last run, and only posts newer than those already saved
+        are returned.
+      metrics (ScrapeMetrics): where request, render and parse times and
+        the thread's post count are recorded.
     
     Returns: DataFrame containing 
                 subject: subject heading for the post, or ID of lead post
-                id: id for the post itself
+                thread: post number of the thread's lead post (int)
+                id: id for the post itself (int)
                 author: username, if available, anonymous otherwise
                 date: the date the post was made, MM/DD/YYYY
                 time: time, in HH:MM:SS
@@ -65,71 +50,40 @@ def scrape_thread(url):
                 clean_content: content of the post without URLS, refs
                 refs: other posts referenced by this one
                 urls: other websites referenced by this post
+                datetime: date and time parsed into a timestamp
+             or None if state says the thread has not changed.
     '''
+    metrics = metrics or ScrapeMetrics()
     session = HTMLSession()
 
+    headers = dict(KWARGS['headers'])
+    if state is not None:
+        headers.update(state.conditional_headers(thread_number(url)))
+
     #### Extract content and render
-    req = session.get(url, **KWARGS)
-    req.html.render(timeout=20)
-    soup = bs(req.text, 'html.parser')
+    with metrics.timer('request_seconds', kind='thread') as labels:
+        req = session.get(url, headers=headers)
+        labels['status'] = req.status_code
+    if req.status_code == 304:
+        session.close()
+        return None
+    with metrics.timer('render_seconds', kind='thread'):
+        req.html.render(timeout=20)
 
-    posts = [post for post in\
-             soup.find_all('div', class_='post')]
-    
-    subject = get_thread_subject(soup)
-
-    ### Sort content from posts        
-    post_content, date, time, post_id, posters = [], [], [], [], []
-    clean_contents, refs, links = [], [], []
-    for post in posts:
-        poster = post.find('span', class_='name').get_text()
-        time_dirty = post.find('span', class_='dateTime').get_text()
-        num = post.find('a', title='Reply to this post').get_text()
-        content = post.find('blockquote', class_='postMessage').get_text()
-
-        references = HelperChan.get_references(content)
-        links_to = HelperChan.get_urls(content)
-
-        clean_content = HelperChan.remove_links(content)
-
-        post_content.append(content)
-        date.append(re.search(r'[0-9]{2}/[0-9]{2}/[0-9]{2}', time_dirty)[0])
-        time.append(re.search(r'[0-9]{2}:[0-9]{2}:[0-9]{2}', time_dirty)[0])
-        post_id.append(num)
-        posters.append(poster)
-        clean_contents.append(clean_content)
-        refs.append(references)
-        links.append(links_to)
-    
+    with metrics.timer('parse_seconds', kind='thread'):
+        soup = bs(req.text, 'html.parser')
+        df = parse_thread(soup)
     session.close()
+    metrics.observe('thread_posts', len(df), kind='thread')
 
-    return DataFrame({'subject':[subject for i, _ in enumerate(post_content)],\
-                      'id':post_id, \
-                        'author':posters, \
-                          'date':date,\
-                          'time':time,\
-                      'content':post_content, \
-                        'clean_content':clean_contents,\
-                        'refs':refs,\
-                          'urls':links})
-
-def get_threads(soup):
-    '''
-    Function which finds all the threads from a given
-    4chan page.
-
-    Inputs: 
-      url (str): url of the thread.
-
-    Returns: list of urls pointing to threads.
-    '''
-    replylinks = [replylink['href'] for replylink\
-                  in soup.find_all('a', class_='replylink')\
-                    if replylink.text == 'Click here']
-
-    return(replylinks)
+    if state is not None:
+        no = thread_number(url)
+        state.update(no, last_modified=req.headers.get('Last-Modified'),
+                     etag=req.headers.get('ETag'))
+        df = state.new_posts(no, df)
+    return df
 
-def get_posts_from_page(url):
+def get_posts_from_page(url, metrics=None):
     '''
     Extract all posts from every thread on a given page.
 
@@ -139,99 +93,262 @@ def get_posts_from_page(url):
     Returns: Pandas DataFrame containing post content, post time, post id,
       and poster for all threads on the page.
     '''
+    metrics = metrics or ScrapeMetrics()
     session = HTMLSession()
 
+    def get_page():
+        with metrics.timer('request_seconds', kind='index') as labels:
+            req = session.get(url, **KWARGS)
+            labels['status'] = req.status_code
+        with metrics.timer('render_seconds', kind='index'):
+            req.html.render(timeout=20)
+        return req
+
     try:
-        req = session.get(url, **KWARGS)
-        req.html.render(timeout=20)
+        req = get_page()
     except ConnectionResetError:
+        metrics.increment('retries', kind='index', reason='ConnectionResetError')
         sleep(4)
-        req = session.get(url, **KWARGS)
-        req.html.render(timeout=20)
+        req = get_page()
 
-    soup = bs(req.text, 'html.parser')
+    with metrics.timer('parse_seconds', kind='index'):
+        soup = bs(req.text, 'html.parser')
+        threads = [url + thread for thread in get_threads(soup)]
+    logging.info(f'Got {len(threads)} threads from {url}')
 
-    threads = [url + thread for thread in get_threads(soup)]
-    logging.info('Got threads!\n', threads)
+    return collect_posts(iter_threads(threads, metrics=metrics))
 
-    df = scrape_thread(threads.pop())
-    
-    for thread in threads:
-        df = concat([df, scrape_thread(thread)], ignore_index=True)
-    
-    return df
+def iter_threads(threads, state=None, metrics=None):
+    '''
+    Generator which scrapes the given threads one at a time, so that posts
+    can be handed off (to a PostStore, say) as they come in rather than
+    piled up in memory.
+
+    Inputs:
+      threads (list of str): urls of the threads to scrape.
+      state (ScrapeState): passed through to scrape_thread.
+      metrics (ScrapeMetrics): passed through to scrape_thread; threads
+        scraped and posts found are counted in it too.
 
-def get_all_current_posts(board):
+    Yields: a DataFrame of posts per thread, as from scrape_thread. Threads
+      which state says have not changed are skipped.
     '''
-    Get all posts currently on 4chan's /lgbt/. This heavily abuses the fact
-    that 4chan has 10 pages worth of posts at any time.
-    
-    Returns: DataFrame of 4chan posts sorted by thread subject, with post id, 
-      post contents, poster, and post time. 
+    metrics = metrics or ScrapeMetrics()
+    for i, thread in enumerate(threads):
+        logging.info(f'Scraping thread number {i}...')
+        posts = scrape_thread(thread, state, metrics)
+        if posts is None:
+            metrics.increment('threads', outcome='unchanged')
+            continue
+        metrics.increment('threads', outcome='scraped')
+        metrics.increment('posts', len(posts))
+        yield posts
+
+def collect_posts(batches):
+    '''
+    Gather batches of posts (e.g. from iter_threads) into one DataFrame,
+    concatenating once at the end rather than once per batch.
     '''
-    reqs = [HTMLSession().get(f'https://boards.4chan.org/{board}/{i}', **KWARGS)\
-            for i in range(1, 11)]
+    batches = list(batches)
+    if not batches:
+        return DataFrame(columns=HelperChan.POST_COLUMNS)
+    return concat(batches, ignore_index=True)
+
+def get_board_threads(board, metrics=None):
+    '''
+    Get the urls of the threads currently on 4chan's /lgbt/. This heavily
+    abuses the fact that 4chan has 10 pages worth of posts at any time.
+
+    Returns: list of thread urls.
+    '''
+    metrics = metrics or ScrapeMetrics()
+    reqs = []
+    for i in range(1, 11):
+        with metrics.timer('request_seconds', kind='index') as labels:
+            reqs.append(HTMLSession().get(f'https://boards.4chan.org/{board}/{i}', **KWARGS))
+            labels['status'] = reqs[-1].status_code
     logging.info("Made reqs!")
     
     soups = []
     for req in reqs:
         # might be necessary to make a copy 
-        req.html.render(timeout=20)
+        with metrics.timer('render_seconds', kind='index'):
+            req.html.render(timeout=20)
         sleep(.5)
-        soups.append(bs(req.text, 'html.parser'))
+        with metrics.timer('parse_seconds', kind='index'):
+            soups.append(bs(req.text, 'html.parser'))
     logging.info('Made soups!')
     
     threads = []
     for soup in soups:
-        rel_threads = get_threads(soup)
+        with metrics.timer('parse_seconds', kind='index'):
+            rel_threads = get_threads(soup)
         threads.extend([f'https://boards.4chan.org/{board}/' + thread\
                         for thread in rel_threads]) 
     logging.info(f'Got threads! {len(threads)} in total, {len(list(set(threads)))} unique!')
+    return threads
 
-    logging.info(f'Scraping thread number 0...')
-    df = scrape_thread(threads.pop())
+def get_all_current_posts(board, state=None, metrics=None):
+    '''
+    Get all posts currently on 4chan's /lgbt/.
 
-    for i, thread in enumerate(threads):
-        logging.info(f'Scraping thread number {i+1}...')
-        ## Adding this to test something weird
-        print(f'Scraping thread numbe {i+1}...')
-        df = concat([df, scrape_thread(thread)], ignore_index=True)
+    If a ScrapeState is given as state, threads unchanged since the last run
+    are skipped and only new posts are returned.
     
+    Returns: DataFrame of 4chan posts sorted by thread subject, with post id, 
+      post contents, poster, and post time. 
+    '''
+    df = collect_posts(iter_threads(get_board_threads(board, metrics), state, metrics))
+
     logging.info('Returning a dataframe!')
     return df
 
-if __name__ == "__main__":
+def scrape(board, save_path, engine='render', backend='html', api_url=ChanAPI.API_URL,
+           state_path=None, max_connections=8, rate=1.0, metrics=None):
+    '''
+    Scrape every thread currently on a board into the archive at save_path.
 
-    logging.basicConfig(level=logging.INFO, filename='logs.txt',
-                            format='%(asctime)-15s %(levelname)-8s %(message)s')
-    print('here')
-    with open('constants.txt', 'r') as f:
+    Inputs:
+      board (str): board to scrape, e.g. '/lgbt/'.
+      save_path (str): PostStore (.sqlite/.db) or CSV the posts are added to.
+      engine (str): 'render' pages one at a time with requests_html, or
+        fetch them concurrently with AsyncScraper ('async').
+      backend (str): parse the board's 'html' pages, or read its 'json' API.
+      api_url (str): (json backend) root of the JSON API, or (render engine
+        only) a fixture directory laid out the same way.
+      state_path (str): path of a scrape state file; if given, only threads
+        that changed since the last run are scraped.
+      max_connections (int): (async engine) size of the connection pool.
+      rate (float): (async engine) max requests per second per host.
+      metrics (ScrapeMetrics): where the run's measurements are recorded,
+        the rows written included.
+    '''
+    if engine == 'async' and backend == 'json' and \
+            not api_url.startswith(('http://', 'https://')):
+        # AsyncScraper fetches everything over HTTP; only ChanAPI reads fixtures.
+        raise ValueError(f'The async engine needs an http(s) api_url, not {api_url!r}; '
+                         'use the render engine to read a fixture directory.')
+    metrics = metrics or ScrapeMetrics()
+    state = ScrapeState(state_path) if state_path else None
+
+    if engine == 'async':
+        batches = [AsyncScraper.get_all_current_posts(board,
+                                                      max_connections=max_connections,
+                                                      requests_per_second=rate,
+                                                      backend=backend,
+                                                      api_url=api_url,
+                                                      state=state,
+                                                      metrics=metrics)]
+    elif backend == 'json':
+        batches = [ChanAPI.get_all_current_posts(board, api_url=api_url, state=state,
+                                                 metrics=metrics)]
+    else:
+        batches = iter_threads(get_board_threads(board, metrics), state, metrics)
+        
+    ## New Save
+
+    if is_store(save_path):
+        # Append-only: the store skips ids it already has, so we never
+        # need to read the archive back in, and each thread can go
+        # straight in as soon as it is scraped.
+        store = PostStore(save_path)
+        pulled, added = 0, 0
+        for posts in batches:
+            pulled += len(posts)
+            with metrics.timer('write_seconds', sink='store'):
+                written = store.append(posts)
+            metrics.increment('rows_written', written, sink='store')
+            added += written
+        logging.info(f'Pulled {pulled} posts, {added} of them new.')
+        logging.info(f'Store now has {len(store)} posts')
+        logging.info(f'It also has {store.thread_count()} unique threads')
+        store.close()
+    else:
+        df = collect_posts(batches)
+        logging.info('Reading old data...')
+
+        try:
+            old_df = pd.read_csv(save_path)
+        except FileNotFoundError:
+            logging.info(f"No old file found. Saving to {save_path}")
+            with metrics.timer('write_seconds', sink='csv'):
+                df.to_csv(save_path, index=False)
+            metrics.increment('rows_written', df['id'].nunique(), sink='csv')
+            logging.info('Saved!')
+            if state is not None:
+                state.commit()
+            return
+
+        logging.info(f'Pulled {len(df)} posts, merging into dataframe of {len(old_df)} posts...')
+
+        old_ids = pd.to_numeric(old_df['id'])
+        df = concat([old_df, df], ignore_index=True)
+        df['id'] = df['id'].astype('int64')
+        # Older archives have no thread numbers; keep the rest integers.
+        df['thread'] = df['thread'].astype('Int64')
+        df.drop_duplicates(subset=['id'], inplace=True)
+        # Older archives have no (or untyped) datetimes.
+        HelperChan.add_datetime(df)
+
+        logging.info(f'Resultant dataframe has {len(df)} posts')
+        logging.info(f'It also has {df[HelperChan.thread_column(df)].nunique()} unique threads')
+        logging.info('Saving...')
+        with metrics.timer('write_seconds', sink='csv'):
+            df.to_csv(save_path, index=False)
+        # The whole archive is rewritten; count only the posts it gained.
+        metrics.increment('rows_written', int((~df['id'].isin(old_ids)).sum()), sink='csv')
+
+    # Only remember what we scraped once it is safely on disk.
+    if state is not None:
+        state.forget_older_than(STATE_TTL)
+        state.commit()
+
+def read_constants(path='constants.txt'):
+    '''
+    Returns: (board, save_path), from the first two lines of constants.txt.
+    '''
+    with open(path, 'r') as f:
         board = f.readline().strip()
         save_path = f.readline().strip()
+    return board, save_path
 
-    df = get_all_current_posts(board)
-        
-    ## New Save
 
-    print('Reading old data...')
-    
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Scrape every thread currently on a 4chan board.')
+    parser.add_argument('--engine', choices=['render', 'async'], default='render',
+                        help='render pages one at a time with requests_html, or fetch '
+                             'them concurrently with AsyncScraper.')
+    parser.add_argument('--backend', choices=['html', 'json'], default='html',
+                        help='parse the board\'s html pages, or read its JSON API.')
+    parser.add_argument('--api-url', default=ChanAPI.API_URL,
+                        help='(json backend) root of the JSON API, or (render engine '
+                             'only) a fixture directory.')
+    parser.add_argument('--state', default=None,
+                        help='path of a scrape state file; if given, only threads that '
+                             'changed since the last run are scraped.')
+    parser.add_argument('--max-connections', type=int, default=8,
+                        help='(async engine) size of the connection pool.')
+    parser.add_argument('--rate', type=float, default=1.0,
+                        help='(async engine) max requests per second per host.')
+    parser.add_argument('--metrics', default='scrape_metrics.jsonl',
+                        help='JSONL file every measurement of the run is appended to.')
+    parser.add_argument('--prom', default=None,
+                        help='Prometheus textfile to write the run\'s metrics to, e.g. for '
+                             'node_exporter\'s textfile collector.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, filename='logs.txt',
+                            format='%(asctime)-15s %(levelname)-8s %(message)s')
+    board, save_path = read_constants()
+    metrics = ScrapeMetrics(args.metrics)
     try:
-        old_df = pd.read_csv(save_path)
-    except FileNotFoundError:
-        logging.info(f"No old file found. Saving to {save_path}")
-        df.to_csv(save_path, index=False)
-        logging.info('Saved!')
-        exit()        
-
-    logging.info(f'Pulled {len(df)} posts, merging into dataframe of {len(old_df)} posts...')
-    
-    df = concat([old_df, df], ignore_index=True)
-    df['id'] = df['id'].astype(str)
-    df.drop_duplicates(subset=['id'], inplace=True)
-    
-    logging.info(f'Resultant dataframe has {len(df)} posts')
-    logging.info(f'It also has {df["subject"].nunique()} unique threads')
-    print('Saving..')
-    df.to_csv(save_path, index=False)
+        scrape(board, save_path, args.engine, args.backend, args.api_url, args.state,
+               args.max_connections, args.rate, metrics)
+    except Exception as err:
+        metrics.increment('errors', kind='run', error=type(err).__name__)
+        raise
+    finally:
+        metrics.finish(args.prom)
 
     logging.info('=' * 40)
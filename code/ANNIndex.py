@@ -0,0 +1,262 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Approximate nearest neighbor search over docvecs, in plain NumPy.
+###        An inverted file (IVF) index: the vectors are clustered with
+###        k-means, each vector is filed under its nearest cluster center,
+###        and a query only compares against the vectors filed under the
+###        n_probe centers nearest to it instead of against everything.
+###        Used both as a standalone "posts similar to this one" search and,
+###        through ANNKNeighborsClassifier, as the KNN member of the stack.
+
+from sklearn.base import BaseEstimator, ClassifierMixin
+import numpy as np
+
+METRICS = ('l1', 'l2', 'cosine')
+
+
+def _sq_distances(X, centers):
+    '''
+    Squared euclidean distance from every row of X to every center.
+    '''
+    return (np.einsum('ij,ij->i', X, X)[:, None]
+            - 2 * X @ centers.T
+            + np.einsum('ij,ij->i', centers, centers)[None, :])
+
+def _nearest_center(X, centers, block=8192):
+    '''
+    Index of the nearest center to every row of X, a block at a time.
+    '''
+    return np.concatenate([np.argmin(_sq_distances(X[i:i + block], centers), axis=1)
+                           for i in range(0, len(X), block)]) if len(X) else np.zeros(0, int)
+
+def kmeans(X, n_clusters, n_iter=10, sample=40, seed=0):
+    '''
+    Lloyd's k-means, fit on (at most) sample points per cluster.
+
+    Returns: (n_clusters, dims) array of cluster centers.
+    '''
+    rng = np.random.default_rng(seed)
+    if len(X) > sample * n_clusters:
+        X = X[rng.choice(len(X), sample * n_clusters, replace=False)]
+    centers = X[rng.choice(len(X), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assigned = _nearest_center(X, centers)
+        counts = np.bincount(assigned, minlength=n_clusters)
+        filled = counts > 0
+        order = np.argsort(assigned, kind='stable')
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        centers[filled] = np.add.reduceat(X[order], starts) / counts[filled, None]
+        # Restart empty clusters on random points.
+        centers[~filled] = X[rng.choice(len(X), (~filled).sum())]
+    return centers
+
+
+class IVFIndex:
+
+    def __init__(self, n_lists=None, n_probe=8, metric='l2', seed=0):
+        '''
+        Inputs:
+          n_lists (int): clusters to file vectors under; defaults to about
+            4 * sqrt(number of vectors).
+          n_probe (int): clusters searched per query. More is slower but
+            finds more of the true nearest neighbors.
+          metric (str): 'l1' (manhattan), 'l2' (euclidean) or 'cosine'.
+          seed (int): seed for k-means.
+        '''
+        if metric not in METRICS:
+            raise ValueError(f'metric must be one of {METRICS}, not {metric!r}.')
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.metric = metric
+        self.seed = seed
+
+    def fit(self, vectors, ids=None):
+        '''
+        Build the index.
+
+        Inputs:
+          vectors (2d array): one vector per post.
+          ids (array of int): post ids of the vectors; defaults to row numbers.
+
+        Returns: self.
+        '''
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.metric == 'cosine':
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        n_lists = self.n_lists or max(1, int(4 * np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+
+        self.centers_ = kmeans(vectors, n_lists, seed=self.seed)
+        assigned = _nearest_center(vectors, self.centers_)
+        # Lay the vectors out list by list, like a CSR matrix.
+        order = np.argsort(assigned, kind='stable')
+        self.offsets_ = np.concatenate([[0], np.cumsum(np.bincount(assigned, minlength=n_lists))])
+        self.vectors_ = vectors[order]
+        self.rows_ = order
+        self.ids_ = np.arange(len(vectors)) if ids is None else np.asarray(ids)
+        return self
+
+    def _distances(self, candidates, query):
+        if self.metric == 'l1':
+            return np.abs(candidates - query).sum(axis=1)
+        if self.metric == 'l2':
+            return np.sqrt(np.maximum(((candidates - query) ** 2).sum(axis=1), 0))
+        return 1 - candidates @ query
+
+    def search(self, queries, k=10, n_probe=None):
+        '''
+        Find the approximate k nearest neighbors of each query.
+
+        Inputs:
+          queries (2d array): vectors to search for.
+          k (int): neighbors to return per query.
+          n_probe (int): clusters to search; defaults to the index's.
+
+        Returns: (rows, distances), each (len(queries), k) arrays. rows
+          are row numbers of the vectors the index was fit on, nearest
+          first; -1 (and an infinite distance) pads queries with fewer than
+          k candidates.
+        '''
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.metric == 'cosine':
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        n_probe = min(n_probe or self.n_probe, len(self.centers_))
+
+        rows = np.full((len(queries), k), -1)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for start in range(0, len(queries), 1024):
+            block = queries[start:start + 1024]
+            probes = np.argpartition(_sq_distances(block, self.centers_), n_probe - 1,
+                                     axis=1)[:, :n_probe]
+            for i, (query, lists) in enumerate(zip(block, probes)):
+                found = np.concatenate([np.arange(self.offsets_[l], self.offsets_[l + 1])
+                                        for l in lists])
+                dists = self._distances(self.vectors_[found], query)
+                n = min(k, len(found))
+                nearest = np.argpartition(dists, n - 1)[:n] if n < len(found) else np.arange(n)
+                nearest = nearest[np.argsort(dists[nearest], kind='stable')]
+                rows[start + i, :n] = self.rows_[found[nearest]]
+                distances[start + i, :n] = dists[nearest]
+        return rows, distances
+
+    def similar(self, queries, k=10, n_probe=None):
+        '''
+        Like search, but gives post ids rather than row numbers.
+
+        Returns: (ids, distances) arrays; ids are -1 where there was no match.
+        '''
+        rows, distances = self.search(queries, k, n_probe)
+        return np.where(rows >= 0, self.ids_[rows], -1), distances
+
+    def save(self, path):
+        '''
+        Save the index, e.g. to '../data/docvecs.ivf.npz'.
+        '''
+        np.savez(path, centers=self.centers_, offsets=self.offsets_, vectors=self.vectors_,
+                 rows=self.rows_, ids=self.ids_,
+                 params=np.array([self.n_lists or 0, self.n_probe, self.seed]),
+                 metric=np.array(self.metric))
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Load an index saved with save.
+        '''
+        with np.load(path) as archive:
+            n_lists, n_probe, seed = archive['params'].tolist()
+            index = cls(n_lists or None, n_probe, str(archive['metric']), seed)
+            index.centers_ = archive['centers']
+            index.offsets_ = archive['offsets']
+            index.vectors_ = archive['vectors']
+            index.rows_ = archive['rows']
+            index.ids_ = archive['ids']
+        return index
+
+
+class ANNKNeighborsClassifier(ClassifierMixin, BaseEstimator):
+
+    def __init__(self, n_neighbors=5, p=1, n_lists=None, n_probe=8):
+        '''
+        KNeighborsClassifier (uniform weights) over an IVFIndex, for use in
+        the stacking ensemble in place of an exact ball tree search.
+
+        Inputs:
+          n_neighbors (int): neighbors that vote.
+          p (int): 1 for manhattan distance, 2 for euclidean, as in sklearn.
+          n_lists, n_probe: see IVFIndex.
+        '''
+        self.n_neighbors = n_neighbors
+        self.p = p
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+
+    def fit(self, X, y):
+        self.classes_, self._y = np.unique(y, return_inverse=True)
+        self.index_ = IVFIndex(self.n_lists, self.n_probe, 'l1' if self.p == 1 else 'l2').fit(X)
+        return self
+
+    def predict_proba(self, X):
+        rows, _ = self.index_.search(X, self.n_neighbors)
+        votes = np.zeros((len(rows), len(self.classes_)))
+        for j in range(rows.shape[1]):
+            found = rows[:, j] >= 0
+            np.add.at(votes, (np.flatnonzero(found), self._y[rows[found, j]]), 1)
+        return votes / np.maximum(votes.sum(axis=1, keepdims=True), 1)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+def build_index(vectors_path='../data/docvecs.npy', index_path='../data/docvecs.ivf.npz',
+                n_lists=None, n_probe=8, metric='l2'):
+    '''
+    Build an IVFIndex over some saved docvecs and save it.
+
+    Inputs:
+      vectors_path (str): docvecs, saved by embedder.
+      index_path (str): where to save the index.
+      n_lists, n_probe, metric: see IVFIndex.
+
+    Returns: the IVFIndex.
+    '''
+    from VectorStore import load_vectors
+
+    ids, vectors = load_vectors(vectors_path)
+    index = IVFIndex(n_lists, n_probe, metric).fit(vectors, ids)
+    index.save(index_path)
+    print(f'Indexed {len(ids)} vectors in {len(index.centers_)} lists.')
+    return index
+
+
+if __name__ == '__main__':
+    import argparse
+    from VectorStore import load_vectors, rows_for
+
+    parser = argparse.ArgumentParser(description='Build, or find similar posts with, an IVF index of docvecs.')
+    parser.add_argument('index', help='index file, e.g. ../data/docvecs.ivf.npz')
+    parser.add_argument('--build', default=None,
+                        help='build the index from these docvecs (e.g. ../data/docvecs.npy) first.')
+    parser.add_argument('--metric', choices=METRICS, default='l2')
+    parser.add_argument('--n-lists', type=int, default=None)
+    parser.add_argument('--similar', nargs='*', type=int, default=[],
+                        help='post ids to find similar posts for (needs --vectors).')
+    parser.add_argument('--vectors', default='../data/docvecs.npy',
+                        help='docvecs to look the --similar posts up in.')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--n-probe', type=int, default=8)
+    args = parser.parse_args()
+
+    if args.build:
+        index = build_index(args.build, args.index, args.n_lists, args.n_probe, args.metric)
+    else:
+        index = IVFIndex.load(args.index)
+
+    if args.similar:
+        ids, vectors = load_vectors(args.vectors)
+        rows = rows_for(ids, args.similar)
+        for post_id, row in zip(args.similar, rows):
+            if row < 0:
+                print(f'{post_id}: no docvec')
+                continue
+            found, distances = index.similar(vectors[row], args.k + 1, args.n_probe)
+            print(f'{post_id}: ' + ', '.join(f'{i} ({d:.3f})' for i, d in zip(found[0], distances[0])
+                                             if i != post_id and i >= 0))
@@ -0,0 +1,280 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: asyncio version of the 4chan scraper. Rather than rendering every
+###        page in a headless browser one at a time, this fetches index pages
+###        and threads concurrently over a bounded aiohttp connection pool,
+###        politely rate limited per host, and parses them with ChanParser
+###        (or, with backend='json', reads the JSON API through ChanAPI).
+###        `get_all_current_posts` returns the same DataFrame as the function
+###        of the same name in `4chan_scrape.py`.
+
+from urllib.parse import urlsplit
+from pandas import DataFrame, concat
+from ScrapeState import thread_number
+from ScrapeMetrics import ScrapeMetrics
+import ChanParser
+import HelperChan
+import ChanAPI
+import aiohttp
+import asyncio
+import logging
+import json
+
+BOARD_URL = 'https://boards.4chan.org'
+HEADERS = {'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.75 Safari/537.36'}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+
+    def __init__(self, requests_per_second=1.0):
+        '''
+        Spaces out requests so that no single host sees more than
+        requests_per_second of them. A rate of 0 or None disables limiting.
+        '''
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self._next_slot = {}
+        self._locks = {}
+
+    async def wait(self, host):
+        '''
+        Sleep until we are allowed to make another request to host.
+        '''
+        if not self.interval:
+            return
+
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def fetch_response(session, url, limiter, retries=3, headers=None, metrics=None,
+                         kind='thread'):
+    '''
+    Fetch a url, retrying on connection trouble and on the statuses 4chan
+    hands out when it is overloaded.
+
+    Inputs:
+      session (aiohttp.ClientSession): session to make the request with.
+      url (str): url to fetch.
+      limiter (RateLimiter): rate limiter shared by every request.
+      retries (int): how many times to retry before giving up.
+      headers (dict): extra request headers, e.g. If-Modified-Since.
+      metrics (ScrapeMetrics): where request latency, time spent waiting
+        on the rate limiter, retries and errors are recorded.
+      kind (str): what is being fetched ('index', 'catalog' or 'thread'),
+        for metrics.
+
+    Returns: tuple of the body of the response as a string (None if the
+      server answered 304 Not Modified) and the response headers.
+    '''
+    metrics = metrics or ScrapeMetrics()
+    host = urlsplit(url).netloc
+    for attempt in range(retries + 1):
+        with metrics.timer('throttle_seconds', kind=kind):
+            await limiter.wait(host)
+        try:
+            with metrics.timer('request_seconds', kind=kind) as labels:
+                async with session.get(url, headers=headers) as resp:
+                    labels['status'] = resp.status
+                    if resp.status == 304:
+                        return None, resp.headers
+                    if resp.status in RETRY_STATUSES and attempt < retries:
+                        logging.warning(f'Got {resp.status} from {url}, retrying...')
+                        metrics.increment('retries', kind=kind, reason=resp.status)
+                    else:
+                        if resp.status >= 400:
+                            metrics.increment('errors', kind=kind, error=resp.status)
+                        resp.raise_for_status()
+                        return await resp.text(), resp.headers
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+            if attempt == retries:
+                metrics.increment('errors', kind=kind, error=type(err).__name__)
+                raise
+            logging.warning(f'{type(err).__name__} on {url}, retrying...')
+            metrics.increment('retries', kind=kind, reason=type(err).__name__)
+        await asyncio.sleep(2 ** attempt)
+
+async def fetch(session, url, limiter, retries=3, metrics=None, kind='index'):
+    '''
+    Fetch the text of a url; see fetch_response.
+    '''
+    text, _ = await fetch_response(session, url, limiter, retries, metrics=metrics, kind=kind)
+    return text
+
+def parse_html_thread(html):
+    '''
+    Parse the html of a thread page into a DataFrame of its posts.
+    '''
+    return ChanParser.parse_thread(ChanParser.make_soup(html))
+
+def parse_json_thread(text):
+    '''
+    Parse an API `thread/<no>.json` document into a DataFrame of its posts.
+    '''
+    return ChanAPI.parse_thread_json(json.loads(text))
+
+async def scrape_thread(session, url, limiter, retries=3, parse=parse_html_thread,
+                        headers=None, metrics=None):
+    '''
+    Scrape all posts from a given thread.
+
+    Returns: tuple of a DataFrame of the thread's posts, as from
+      ChanParser.parse_thread (None if the thread is unchanged since the
+      conditional headers were issued), and the response headers.
+    '''
+    metrics = metrics or ScrapeMetrics()
+    text, resp_headers = await fetch_response(session, url, limiter, retries, headers,
+                                              metrics, 'thread')
+    if text is None:
+        return None, resp_headers
+
+    def timed_parse(text):
+        with metrics.timer('parse_seconds', kind='thread'):
+            return parse(text)
+    posts = await asyncio.to_thread(timed_parse, text)
+    metrics.observe('thread_posts', len(posts), kind='thread')
+    return posts, resp_headers
+
+async def get_thread_urls(session, board, base_url, pages, limiter, retries, metrics=None):
+    '''
+    Read the first `pages` index pages of a board and return the urls of
+    every thread linked from them, without duplicates.
+    '''
+    board_url = f'{base_url.rstrip("/")}/{board.strip("/")}/'
+    page_urls = [board_url + str(i) for i in range(1, pages + 1)]
+    metrics = metrics or ScrapeMetrics()
+    htmls = await asyncio.gather(*[fetch(session, url, limiter, retries, metrics, 'index')
+                                   for url in page_urls])
+    logging.info('Made soups!')
+
+    threads = []
+    for html in htmls:
+        with metrics.timer('parse_seconds', kind='index'):
+            threads.extend(board_url + thread
+                           for thread in ChanParser.get_threads(ChanParser.make_soup(html)))
+    unique_threads = list(dict.fromkeys(threads))
+    logging.info(f'Got threads! {len(threads)} in total, {len(unique_threads)} unique!')
+    return unique_threads
+
+async def get_api_thread_urls(session, board, api_url, limiter, retries, metrics=None):
+    '''
+    Read a board's `threads.json`.
+
+    Returns: dict mapping the API url of every thread on the board to the
+      thread's last_modified timestamp.
+    '''
+    root = ChanAPI.board_url(board, api_url)
+    catalog = json.loads(await fetch(session, f'{root}/threads.json', limiter, retries,
+                                     metrics, 'catalog'))
+    threads = {f'{root}/thread/{thread["no"]}.json': thread['last_modified']
+               for page in catalog for thread in page['threads']}
+    logging.info(f'Got threads! {len(threads)} in total.')
+    return threads
+
+async def scrape_board(board, base_url=BOARD_URL, pages=10, max_connections=8,
+                       requests_per_second=1.0, retries=3, timeout=60,
+                       backend='html', api_url=ChanAPI.API_URL, state=None, metrics=None):
+    '''
+    Scrape every thread currently on a board.
+
+    Inputs:
+      board (str): board to scrape, e.g. 'lgbt' or '/lgbt/'.
+      base_url (str): where the board's html lives; point this at FakeBoard
+        to scrape offline.
+      pages (int): number of index pages to read (html backend only).
+      max_connections (int): size of the connection pool; this also bounds the
+        number of requests in flight.
+      requests_per_second (float): max request rate per host.
+      retries (int): retries per request.
+      timeout (float): total seconds allowed per request.
+      backend (str): 'html' to parse the board's pages, or 'json' to read
+        the JSON API instead.
+      api_url (str): root of the JSON API (json backend only).
+      state (ScrapeState): if given, only threads that changed since the
+        last run are fetched, and only posts newer than the ones already
+        saved are returned. The caller commits the state once the posts
+        are safely saved.
+      metrics (ScrapeMetrics): where the run's measurements are recorded.
+
+    Returns: DataFrame of every (new) post found, with the columns described
+      in `4chan_scrape.scrape_thread`.
+    '''
+    metrics = metrics or ScrapeMetrics()
+    limiter = RateLimiter(requests_per_second)
+    connector = aiohttp.TCPConnector(limit=max_connections)
+
+    async with aiohttp.ClientSession(connector=connector, headers=HEADERS,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        if backend == 'json':
+            modified = await get_api_thread_urls(session, board, api_url, limiter, retries,
+                                                 metrics)
+            thread_urls = list(modified)
+            if state is not None:
+                thread_urls = []
+                for url, last_modified in modified.items():
+                    if state.is_changed(thread_number(url), last_modified):
+                        thread_urls.append(url)
+                    else:
+                        state.update(thread_number(url))
+                        metrics.increment('threads', outcome='unchanged')
+                logging.info(f'{len(thread_urls)} threads changed since the last run.')
+            parse = parse_json_thread
+        else:
+            thread_urls = await get_thread_urls(session, board, base_url, pages, limiter, retries,
+                                                metrics)
+            parse = parse_html_thread
+
+        tasks = []
+        for url in thread_urls:
+            headers = None
+            if state is not None and backend != 'json':
+                headers = state.conditional_headers(thread_number(url))
+            tasks.append(scrape_thread(session, url, limiter, retries, parse, headers, metrics))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    frames = []
+    unchanged = 0
+    for url, result in zip(thread_urls, results):
+        if isinstance(result, BaseException):
+            # Threads routinely 404 between reading the index and getting to
+            # them, so a failure here should not sink the whole run.
+            logging.warning(f'Failed to scrape {url}: {result!r}')
+            metrics.increment('threads', outcome='failed')
+            continue
+
+        posts, headers = result
+        if state is not None:
+            no = thread_number(url)
+            if backend == 'json':
+                state.update(no, last_modified=modified[url])
+            else:
+                state.update(no, last_modified=headers.get('Last-Modified'),
+                             etag=headers.get('ETag'))
+            if posts is None:
+                unchanged += 1
+                metrics.increment('threads', outcome='unchanged')
+                continue
+            posts = state.new_posts(no, posts)
+        metrics.increment('threads', outcome='scraped')
+        metrics.increment('posts', len(posts))
+        frames.append(posts)
+
+    logging.info(f'Scraped {len(frames)} of {len(thread_urls)} threads '
+                 f'({unchanged} unchanged).')
+    if not frames:
+        return DataFrame(columns=HelperChan.POST_COLUMNS)
+    return concat(frames, ignore_index=True)
+
+def get_all_current_posts(board, **kwargs):
+    '''
+    Synchronous wrapper around scrape_board, so this can be dropped in
+    wherever `4chan_scrape.get_all_current_posts` is used. Keyword arguments
+    are passed through to scrape_board.
+    '''
+    return asyncio.run(scrape_board(board, **kwargs))
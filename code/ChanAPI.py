@@ -0,0 +1,178 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Ingestion backend built on 4chan's read-only JSON API
+###        (`threads.json` and `thread/<no>.json`) rather than rendering
+###        every page in a headless browser. Produces the exact columns that
+###        `4chan_scrape.scrape_thread` does.
+###        The API asks for no more than one request per second, which
+###        get_all_current_posts respects.
+
+from pandas import DataFrame, concat
+from html import unescape
+from time import sleep, monotonic
+from ScrapeMetrics import ScrapeMetrics
+import HelperChan
+import requests
+import logging
+import json
+import os
+import re
+
+API_URL = 'https://a.4cdn.org'
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           '..', 'data', 'fixtures')
+
+TAG_REGEX = re.compile(r'<[^>]*>')
+DATE_REGEX = re.compile(r'[0-9]{2}/[0-9]{2}/[0-9]{2}')
+TIME_REGEX = re.compile(r'[0-9]{2}:[0-9]{2}:[0-9]{2}')
+
+
+def comment_text(com):
+    '''
+    Turn the html of an API comment into the text BeautifulSoup would pull
+    out of the rendered post's blockquote: tags (and <br>s) are dropped
+    outright and entities are unescaped.
+    '''
+    return unescape(TAG_REGEX.sub('', com or ''))
+
+def thread_subject(op):
+    '''
+    Subject of a thread given its opening post; falls back to the post's
+    number when there is no subject, like ChanParser.get_thread_subject.
+    '''
+    subject = unescape(op.get('sub', ''))
+    if subject.strip() == '':
+        return str(op['no'])
+    return subject
+
+def thread_rows(thread):
+    '''
+    The rows parse_thread_json makes of a thread, as tuples in the order of
+    HelperChan.POST_COLUMNS (datetime left None), so that many threads can
+    go into one DataFrame.
+    '''
+    posts = thread['posts']
+    subject = thread_subject(posts[0])
+
+    rows = []
+    for post in posts:
+        content = comment_text(post.get('com'))
+        refs, urls, clean_content = HelperChan.process_content(content)
+        rows.append((subject,
+                     posts[0]['no'],
+                     post['no'],
+                     unescape(post.get('name', 'Anonymous')),
+                     DATE_REGEX.search(post['now'])[0],
+                     TIME_REGEX.search(post['now'])[0],
+                     content,
+                     clean_content,
+                     refs,
+                     urls,
+                     None))
+    return rows
+
+def parse_thread_json(thread):
+    '''
+    Converts a thread from the API into a DataFrame.
+
+    Inputs:
+      thread (dict): decoded `thread/<no>.json`, i.e. {'posts': [...]}.
+
+    Returns: DataFrame containing the columns described in
+      `4chan_scrape.scrape_thread`.
+    '''
+    return HelperChan.add_datetime(DataFrame(thread_rows(thread), columns=HelperChan.POST_COLUMNS))
+
+def board_url(board, api_url=API_URL):
+    '''
+    Url (or fixture directory) for a board in the API.
+    '''
+    return f'{api_url.rstrip("/")}/{board.strip("/")}'
+
+def fetch_json(url, session=None):
+    '''
+    Fetch and decode a JSON document. Anything that isn't an http(s) url is
+    read from disk instead, which is how the fixtures are used.
+    '''
+    if not url.startswith(('http://', 'https://')):
+        with open(url, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    resp = (session or requests).get(url, timeout=30)
+    resp.raise_for_status()
+    return resp.json()
+
+def get_all_current_posts(board, api_url=API_URL, delay=1.0, state=None, metrics=None):
+    '''
+    Get all posts currently on a board through the JSON API. Unlike the html
+    scraper, this reaches every thread on the board, not just the ones with
+    a "Click here" link.
+
+    Inputs:
+      board (str): board to scrape, e.g. 'lgbt' or '/lgbt/'.
+      api_url (str): root of the API, or a fixture directory laid out the
+        same way (e.g. FIXTURE_DIR).
+      delay (float): minimum seconds between requests.
+      state (ScrapeState): if given, threads whose last_modified has not
+        moved since the last run are skipped, and only posts newer than the
+        ones already saved are returned.
+      metrics (ScrapeMetrics): where the run's measurements are recorded.
+
+    Returns: DataFrame of posts with the columns of `4chan_scrape.scrape_thread`.
+    '''
+    metrics = metrics or ScrapeMetrics()
+    root = board_url(board, api_url)
+    session = requests.Session()
+
+    last = 0.0
+    def polite_fetch(url, kind):
+        nonlocal last
+        if url.startswith(('http://', 'https://')):
+            with metrics.timer('throttle_seconds', kind=kind):
+                sleep(max(0.0, last + delay - monotonic()))
+            last = monotonic()
+        with metrics.timer('request_seconds', kind=kind):
+            return fetch_json(url, session)
+
+    catalog = polite_fetch(f'{root}/threads.json', 'catalog')
+    modified = {thread['no']: thread['last_modified']
+                for page in catalog for thread in page['threads']}
+    logging.info(f'Got threads! {len(modified)} in total.')
+
+    threads = list(modified)
+    if state is not None:
+        threads = []
+        for no, last_modified in modified.items():
+            if state.is_changed(no, last_modified):
+                threads.append(no)
+            else:
+                state.update(no)
+                metrics.increment('threads', outcome='unchanged')
+        logging.info(f'{len(threads)} threads changed since the last run.')
+
+    frames = []
+    for i, no in enumerate(threads):
+        logging.info(f'Scraping thread number {i}...')
+        try:
+            thread = polite_fetch(f'{root}/thread/{no}.json', 'thread')
+        except requests.HTTPError as err:
+            # Threads 404 when they are pruned between reading threads.json
+            # and getting to them.
+            logging.warning(f'Failed to get thread {no}: {err}')
+            metrics.increment('errors', kind='thread', error=err.response.status_code)
+            metrics.increment('threads', outcome='failed')
+            continue
+        with metrics.timer('parse_seconds', kind='thread'):
+            posts = parse_thread_json(thread)
+        metrics.observe('thread_posts', len(posts), kind='thread')
+        if state is not None:
+            state.update(no, last_modified=modified[no])
+            posts = state.new_posts(no, posts)
+        metrics.increment('threads', outcome='scraped')
+        metrics.increment('posts', len(posts))
+        frames.append(posts)
+    session.close()
+
+    if not frames:
+        return DataFrame(columns=HelperChan.POST_COLUMNS)
+    return concat(frames, ignore_index=True)
@@ -0,0 +1,112 @@
+### Author: Ashlynn Wimer
+### Last Modified: 10/18/2026
+### About: Module containing the HTML parsing half of the scraper, pulled out of
+###        `4chan_scrape.py` so that every fetching backend (the requests_html
+###        scraper and the asyncio one in `AsyncScraper.py`) parses pages the
+###        exact same way.
+
+from pandas import DataFrame
+from bs4 import BeautifulSoup as bs
+import HelperChan
+import re
+
+
+def make_soup(html):
+    '''
+    Parse raw page html into BeautifulSoup.
+    '''
+    return bs(html, 'html.parser')
+
+def get_thread_subject(soup):
+    '''
+    Given the soup for a thread, finds the thread's subject.
+
+    Inputs:
+      soup (BeautifulSoup): BeautifulSoup for a 4chan thread.
+
+    Returns: string containing the thread's subject
+    '''
+    subject = soup.find('span', class_='subject')
+
+    if not subject:
+        first_post = soup.find('div', class_='post')
+        subject = first_post.find('a', title='Reply to this post').get_text()
+        return subject
+
+    if subject.get_text().strip() == '':
+        first_post = soup.find('div', class_='post')
+        subject = first_post.find('a', title='Reply to this post').get_text()
+        return subject
+
+    return subject.get_text()
+
+def get_thread_number(soup):
+    '''
+    Given the soup for a thread, finds the thread's number, i.e. the post
+    number of its OP.
+
+    Inputs:
+      soup (BeautifulSoup): BeautifulSoup for a 4chan thread.
+
+    Returns: int
+    '''
+    first_post = soup.find('div', class_='post')
+    return int(first_post.find('a', title='Reply to this post').get_text())
+
+def get_threads(soup):
+    '''
+    Function which finds all the threads from a given
+    4chan page.
+
+    Inputs:
+      soup (BeautifulSoup): BeautifulSoup for a 4chan index page.
+
+    Returns: list of urls pointing to threads.
+    '''
+    replylinks = [replylink['href'] for replylink\
+                  in soup.find_all('a', class_='replylink')\
+                    if replylink.text == 'Click here']
+
+    return(replylinks)
+
+def iter_posts(soup):
+    '''
+    Generator over the posts in the soup for a single 4chan thread.
+
+    Inputs:
+      soup (BeautifulSoup): BeautifulSoup for a 4chan thread.
+
+    Yields: one dict per post, keyed by the columns described in
+      `4chan_scrape.scrape_thread`.
+    '''
+    subject = get_thread_subject(soup)
+    thread = get_thread_number(soup)
+
+    for post in soup.find_all('div', class_='post'):
+        time_dirty = post.find('span', class_='dateTime').get_text()
+        content = post.find('blockquote', class_='postMessage').get_text()
+        refs, urls, clean_content = HelperChan.process_content(content)
+
+        yield {'subject': subject,
+               'thread': thread,
+               'id': int(post.find('a', title='Reply to this post').get_text()),
+               'author': post.find('span', class_='name').get_text(),
+               'date': re.search(r'[0-9]{2}/[0-9]{2}/[0-9]{2}', time_dirty)[0],
+               'time': re.search(r'[0-9]{2}:[0-9]{2}:[0-9]{2}', time_dirty)[0],
+               'content': content,
+               'clean_content': clean_content,
+               'refs': refs,
+               'urls': urls}
+
+def parse_thread(soup):
+    '''
+    Pulls every post out of the soup for a single 4chan thread.
+
+    Inputs:
+      soup (BeautifulSoup): BeautifulSoup for a 4chan thread.
+
+    Returns: DataFrame with the columns described in
+      `4chan_scrape.scrape_thread`.
+    '''
+    return HelperChan.add_datetime(DataFrame.from_records(list(iter_posts(soup)),
+                                                          columns=HelperChan.POST_COLUMNS))
@@ -5,6 +5,8 @@
 ###        so that errors were less time consuming.
 
 # I also need a very specific cleanup to occur, so we write that below.
+DROPPED_TOKENS = ['<', '+', '>', ':', ';', '=', '/', '\\']
+
 def cleaner_tokens(soiled_tokens):
     '''
     Cleans up a few messes in my tokens.
@@ -16,24 +18,48 @@ def cleaner_tokens(soiled_tokens):
     '''
     rv = []
     for value in soiled_tokens:
-        if value not in ['<', '+', '>', ':', ';', '=', '/', '\\']:
+        if value not in DROPPED_TOKENS:
             rv.append(value)
     return rv
 
 import gensim.models.doc2vec as d2v
+from PostStore import load_posts
+from TokenCache import TokenCache, config_hash
+from VectorStore import save_tokens, load_tokens, rows_for
 import HelperChan
 import pandas as pd
+import numpy as np
+import argparse
+import json
 import spacy
+import os
 from tqdm import tqdm
 tqdm.pandas()
 
-try:
-    nlp = spacy.load("en")
-except OSError:
-    nlp = spacy.load("en_core_web_sm")
+# The full spaCy pipeline word_tokenize uses by default. It is loaded on first
+# use, so that importing this module (e.g. from Scorer) doesn't load a model.
+nlp = None
+
+# Every pipeline component of en_core_web_sm; none of them are needed to tokenize.
+NON_TOKENIZER_PIPES = ['tok2vec', 'tagger', 'parser', 'senter', 'attribute_ruler',
+                       'lemmatizer', 'ner']
+
+def default_model():
+    '''
+    The spaCy pipeline word_tokenize uses by default, loaded on first use.
+    '''
+    global nlp
+    if nlp is None:
+        try:
+            nlp = spacy.load("en")
+        except OSError:
+            nlp = spacy.load("en_core_web_sm")
+    return nlp
 
 # moved this here from lucem_illud just to ensure I can debug it as needed.
-def word_tokenize(word_list, model=nlp, MAX_LEN=30000000):
+def word_tokenize(word_list, model=None, MAX_LEN=30000000):
+    if model is None:
+        model = default_model()
     tokenized = []
     if type(word_list) == list and len(word_list) == 1:
         word_list = word_list[0]
@@ -50,29 +76,237 @@ def word_tokenize(word_list, model=nlp, MAX_LEN=30000000):
             tokenized.append(str(token.text))
     return tokenized
 
+def load_tokenizer(name=None):
+    '''
+    Load a spaCy pipeline with nothing but its tokenizer, for use with
+    tokenize_corpus. Defaults to the same model as nlp.
+    '''
+    if name is not None:
+        return spacy.load(name, exclude=NON_TOKENIZER_PIPES)
+    try:
+        return spacy.load("en", exclude=NON_TOKENIZER_PIPES)
+    except OSError:
+        return spacy.load("en_core_web_sm", exclude=NON_TOKENIZER_PIPES)
+
+def tokenize_corpus(texts, model=None, batch_size=1000, n_process=1, MAX_LEN=30000000):
+    '''
+    Tokenize a whole corpus in batches with nlp.pipe, optionally spread
+    across several processes. Gives the same tokens as running
+    cleaner_tokens(word_tokenize(text)) on every text, without paying the
+    pipeline's per-document overhead each time.
+
+    Inputs:
+      texts (iterable of str): documents to tokenize.
+      model (Language): spaCy pipeline to tokenize with; defaults to
+        load_tokenizer().
+      batch_size (int): documents handed to each worker at a time.
+      n_process (int): worker processes; -1 uses every core.
+      MAX_LEN (int): max characters per document.
 
-if __name__ == '__main__':
-    print('Reading in three weeks of data..')
-    week1 = pd.read_csv('../data/lgbt_week_1.csv')[['subject', 'id', 'content']]
-    week2 = pd.read_csv('../data/lgbt_week_2.csv')[['subject', 'id', 'content']]
-    week3 = pd.read_csv('../data/lgbt_week_3.csv')[['subject', 'id', 'content']]
+    Yields: list of tokens per document, in order.
+    '''
+    if model is None:
+        model = load_tokenizer()
+    model.max_length = MAX_LEN
+
+    docs = model.pipe((str(text) for text in texts), batch_size=batch_size,
+                      n_process=n_process)
+    for doc in docs:
+        yield cleaner_tokens([str(token.text) for token in doc
+                              if not token.is_punct and len(token.text.strip()) > 0])
+
+def tokenizer_config(model, depth=1, name=None):
+    '''
+    Everything besides the text itself that decides what cleaned text and
+    tokens a post gets: the tokenizer (and the name it was loaded by, see
+    load_tokenizer), the backref depth and the URL pattern. Keys the
+    TokenCache, and is saved alongside the cleaned posts.
+    '''
+    return {'tokenizer': name, 'model': model.meta.get('name'),
+            'model_version': model.meta.get('version'),
+            'lang': model.lang, 'spacy': spacy.__version__,
+            'dropped_tokens': DROPPED_TOKENS, 'backref_depth': depth,
+            'url_regex': HelperChan.URL_REGEX}
+
+def config_path(preprocessed_path):
+    '''
+    Where the configuration the cleaned posts at preprocessed_path were made
+    with is saved.
+    '''
+    return preprocessed_path + '.json'
+
+def load_config(preprocessed_path):
+    '''
+    Returns: the configuration saved with the cleaned posts at
+      preprocessed_path (see tokenizer_config), or None.
+    '''
+    if not os.path.exists(config_path(preprocessed_path)):
+        return None
+    with open(config_path(preprocessed_path)) as f:
+        return json.load(f)
 
+def load_previous(tokens_path, preprocessed_path, config):
+    '''
+    The output of the last clean_corpus, if it was made with the same config.
+
+    Returns: (DataFrame of its id, content and clean_content, its
+      TokenTable), or None.
+    '''
+    saved = load_config(preprocessed_path)
+    if saved is None or config_hash(saved) != config_hash(config) or \
+            not os.path.exists(tokens_path) or not os.path.exists(preprocessed_path):
+        return None
+    # Empty content was written as NaN (an empty cell), but empty cleaned
+    # text as ''.
+    previous = pd.read_csv(preprocessed_path, usecols=['id', 'content', 'clean_content'],
+                           keep_default_na=False, na_values={'content': ['']})
+    return previous, load_tokens(tokens_path)
+
+def stale_posts(corpus, previous, depth=1):
+    '''
+    Find the posts whose cleaned text may have changed since the last
+    clean: posts that are new or whose content changed, and the posts
+    referencing those (up to depth references away), whose expansions
+    include them. References to posts that are gone now count too.
+
+    Inputs:
+      corpus (DataFrame): posts, with id and content, without duplicate ids.
+      previous (DataFrame): id and content of the posts cleaned last time.
+      depth (int): levels of back references expanded.
+
+    Returns: boolean array, True for each post of corpus to clean again.
+    '''
+    ids = pd.to_numeric(corpus['id']).to_numpy(dtype=np.int64)
+    # As expand_all sees them; NaN (no content) as 'nan'.
+    contents = np.array([str(content) for content in corpus['content']], dtype=object)
+    old = pd.Series([str(content) for content in previous['content']],
+                    index=pd.to_numeric(previous['id']).to_numpy(dtype=np.int64))
+    stale = pd.Series(ids).map(old).to_numpy() != contents
+
+    changed = set(ids[stale].tolist()) | (set(old.index.tolist()) - set(ids.tolist()))
+    for _ in range(depth):
+        if not changed:
+            break
+        # Posts only ever reference older posts (post numbers only go up),
+        # so only posts newer than the oldest change can be affected.
+        candidates = np.flatnonzero(~stale & (ids > min(changed)))
+        hit = [row for row, refs in zip(candidates, HelperChan.reference_ids(contents[candidates]))
+               if any(ref in changed for ref in refs)]
+        stale[hit] = True
+        changed = set(ids[hit].tolist())
+    return stale
+
+def clean_corpus(sources, tokens_path='../data/tokens.npz',
+                 preprocessed_path='../data/preprocessed.csv', depth=1, batch_size=1000,
+                 n_process=1, cache_path='../data/token_cache.sqlite', incremental=True,
+                 tokenizer=None):
+    '''
+    Backreference and tokenize every post in some archives, saving the
+    tokens (see VectorStore) and the cleaned posts.
+
+    Inputs:
+      sources (list of str): CSVs and/or PostStores to read posts from.
+      tokens_path (str): where to save the tokens.
+      preprocessed_path (str): where to save the cleaned posts.
+      depth (int): levels of back references to expand.
+      batch_size (int): posts per tokenization batch.
+      n_process (int): tokenizer processes; -1 for one per core.
+      cache_path (str): token cache, so only new or changed posts are
+        tokenized; None to tokenize everything.
+      incremental (bool): only backreference and tokenize the posts whose
+        cleaned text may have changed since the last run (see
+        stale_posts), reusing the saved output for the rest.
+      tokenizer (str): spaCy pipeline to tokenize with; see load_tokenizer.
+    '''
+    print(f'Reading in {len(sources)} sources of data..')
     corpus = pd.concat(
-        [week1, week2, week3], ignore_index=True
+        [load_posts(source, ['subject', 'id', 'content']) for source in sources],
+        ignore_index=True
     ).drop_duplicates('id')
 
     print(f'Read in corpus! Is of shape {corpus.shape}')
 
+    name, tokenizer = tokenizer, load_tokenizer(tokenizer)
+    config = tokenizer_config(tokenizer, depth, name)
+    previous = load_previous(tokens_path, preprocessed_path, config) if incremental else None
+    stale = np.ones(len(corpus), dtype=bool)
+    if previous is not None:
+        old_posts, old_tokens = previous
+        stale = stale_posts(corpus, old_posts, depth)
+        # Posts the saved tokens somehow lack are redone too.
+        rows = rows_for(old_tokens.ids, pd.to_numeric(corpus['id']))
+        stale |= rows < 0
+        print(f'{int(stale.sum())} of {len(corpus)} posts are new or affected by new posts.')
+
     print('Preprocessing corpus..')
     print('Backreffing...')
-    corpus['clean_content'] = corpus['content']\
-                                .progress_apply(lambda x: HelperChan.content_with_back_reference(str(x), corpus))\
-                                .progress_apply(HelperChan.remove_links)
+    backreffer = HelperChan.BackReferencer(corpus)
+    todo = corpus[stale]
+    clean = HelperChan.remove_links_series(
+        pd.Series(backreffer.expand_all(tqdm(todo['content']), depth), index=todo.index))
 
     print('Tokenizing...')
-    corpus['tokens'] = corpus['clean_content']\
-                        .progress_apply(word_tokenize)\
-                        .progress_apply(cleaner_tokens)
+    def tokenize(texts):
+        return tqdm(tokenize_corpus(texts, tokenizer, batch_size, n_process),
+                    total=len(texts))
 
-    corpus.to_csv('../data/preprocessed.csv')
-    
+    if cache_path is None:
+        tokens = list(tokenize(clean.tolist()))
+    else:
+        cache = TokenCache(cache_path, config)
+        tokens = cache.tokens_for(todo['id'], clean, tokenize)
+        print(f'{cache.hits} posts were cached, {cache.misses} tokenized.')
+        cache.close()
+
+    if previous is None:
+        corpus['clean_content'] = clean
+        corpus['tokens'] = tokens
+    else:
+        kept = np.flatnonzero(~stale)
+        old_clean = pd.Series([str(text) for text in old_posts['clean_content']],
+                              index=pd.to_numeric(old_posts['id']).to_numpy(dtype=np.int64))
+        clean_content = np.empty(len(corpus), dtype=object)
+        clean_content[stale] = clean.to_numpy()
+        clean_content[kept] = old_clean.reindex(pd.to_numeric(corpus['id']).to_numpy()[kept]).to_numpy()
+        all_tokens = np.empty(len(corpus), dtype=object)
+        for row, toks in zip(np.flatnonzero(stale), tokens):
+            all_tokens[row] = toks
+        for row, old_row in zip(kept, rows[kept]):
+            all_tokens[row] = old_tokens[old_row]
+        corpus['clean_content'] = clean_content
+        corpus['tokens'] = all_tokens
+
+    print('Saving..')
+    save_tokens(tokens_path, corpus['id'], corpus['tokens'])
+    corpus.drop(columns='tokens').to_csv(preprocessed_path)
+    with open(config_path(preprocessed_path), 'w') as f:
+        json.dump(config, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backreference and tokenize the corpus.')
+    parser.add_argument('--posts', nargs='+',
+                        default=['../data/lgbt_week_1.csv',
+                                 '../data/lgbt_week_2.csv',
+                                 '../data/lgbt_week_3.csv'],
+                        help='CSVs and/or PostStores to read posts from.')
+    parser.add_argument('--depth', type=int, default=1,
+                        help='levels of back references to expand.')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='posts per tokenization batch.')
+    parser.add_argument('--n-process', type=int, default=1,
+                        help='tokenizer processes; -1 for one per core.')
+    parser.add_argument('--cache', default='../data/token_cache.sqlite',
+                        help='token cache, so only new or changed posts are tokenized.')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='tokenize everything, ignoring the cache.')
+    parser.add_argument('--full', action='store_true',
+                        help='clean every post again, rather than only new or affected ones.')
+    parser.add_argument('--tokens', default='../data/tokens.npz',
+                        help='where to save the tokens (see VectorStore).')
+    parser.add_argument('--preprocessed', default='../data/preprocessed.csv',
+                        help='where to save the cleaned posts.')
+    args = parser.parse_args()
+
+    clean_corpus(args.posts, args.tokens, args.preprocessed, args.depth, args.batch_size,
+                 args.n_process, None if args.no_cache else args.cache, not args.full)
@@ -0,0 +1,197 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: The stacking ensemble SemiSupervisedClassifier trains, as its own
+###        class rather than sklearn's StackingClassifier, so that it can:
+###          - fit every base estimator and every cross-validation fold in
+###            parallel (n_jobs), instead of one after another;
+###          - warm start the estimators that allow it from the previous
+###            self-training round instead of refitting them from scratch
+###            (the fits on all the data and the final estimator; the
+###            cross-validation folds are always fit from scratch);
+###          - have its slow members swapped for scalable ones by name
+###            (e.g. LinearSVC for SVC, HistGradientBoost for GradientBoost,
+###            ANNKNN for KNN);
+###          - report how long each estimator took to fit.
+###        It lives in its own module so that a pickled ensemble can be
+###        loaded from any script.
+
+from sklearn.neural_network import MLPClassifier
+from sklearn.ensemble import (BaggingClassifier,
+                              GradientBoostingClassifier,
+                              HistGradientBoostingClassifier)
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.svm import SVC, LinearSVC
+from sklearn.model_selection import StratifiedKFold
+from sklearn.base import clone
+from ANNIndex import ANNKNeighborsClassifier
+from joblib import Parallel, delayed
+import numpy as np
+import copy
+import time
+
+# Every estimator the ensemble can be built from, by name.
+ESTIMATORS = {
+    'SVC': lambda: SVC(),
+    'LinearSVC': lambda: LinearSVC(dual='auto'),
+    'BaggedLogistics': lambda: BaggingClassifier(estimator=LogisticRegression(),
+                                                 max_features=.75,
+                                                 max_samples=.75,
+                                                 bootstrap_features=True,
+                                                 n_estimators=10),
+    'GradientBoost': lambda: GradientBoostingClassifier(),
+    'HistGradientBoost': lambda: HistGradientBoostingClassifier(),
+    'KNN': lambda: KNeighborsClassifier(algorithm='ball_tree',
+                                        leaf_size=10,
+                                        n_neighbors=5, p=1),
+    'ANNKNN': lambda: ANNKNeighborsClassifier(n_neighbors=5, p=1),
+    'DecisionTree': lambda: DecisionTreeClassifier()
+}
+# The original ensemble, and one with its slow members swapped out.
+DEFAULT_ESTIMATORS = ['SVC', 'BaggedLogistics', 'GradientBoost', 'KNN', 'DecisionTree']
+FAST_ESTIMATORS = ['LinearSVC', 'BaggedLogistics', 'HistGradientBoost', 'ANNKNN', 'DecisionTree']
+
+# Boosting and bagging only warm start by adding stages / estimators (a warm
+# start without more of them fits nothing at all), so when warm started
+# these grow by this many on the new data rather than being refit.
+GROWING_PARAMS = {GradientBoostingClassifier: 'n_estimators',
+                  HistGradientBoostingClassifier: 'max_iter',
+                  BaggingClassifier: 'n_estimators'}
+GROW_BY = 20
+
+
+def _fit(estimator, X, y, train=None):
+    '''
+    Fit estimator on X, y (or on the rows in train of them).
+
+    Returns: (fitted estimator, seconds taken).
+    '''
+    start = time.perf_counter()
+    if train is None:
+        estimator.fit(X, y)
+    else:
+        estimator.fit(X[train], y[train])
+    return estimator, time.perf_counter() - start
+
+def _stack_predictions(estimator, X):
+    '''
+    What a base estimator contributes to the final estimator's input, as in
+    StackingClassifier: the positive class probability if it has
+    predict_proba, otherwise its decision function.
+    '''
+    if hasattr(estimator, 'predict_proba'):
+        return estimator.predict_proba(X)[:, 1]
+    return estimator.decision_function(X)
+
+def _warm(previous, estimator):
+    '''
+    Set up a warm start of estimator from its fit last round, if it has
+    one and supports it. The fit is copied, so last round's ensemble (which
+    may have been saved or still be in use) is left as it was.
+    Returns the estimator to fit.
+    '''
+    if previous is None or 'warm_start' not in previous.get_params():
+        return estimator
+    previous = copy.deepcopy(previous)
+    previous.set_params(warm_start=True)
+    param = GROWING_PARAMS.get(type(previous))
+    if param is not None:
+        previous.set_params(**{param: previous.get_params()[param] + GROW_BY})
+    return previous
+
+
+class StackedEnsemble:
+
+    def __init__(self, estimators=DEFAULT_ESTIMATORS, final_estimator=None,
+                 cv=5, n_jobs=None, warm_start=False):
+        '''
+        Stacking classifier for binary classification, fit like sklearn's
+        StackingClassifier: the final estimator learns from out-of-fold
+        predictions of the base estimators, which are then refit on all of
+        the data.
+
+        Inputs:
+          estimators (list): names from ESTIMATORS and/or (name, estimator) pairs.
+          final_estimator: defaults to MLPClassifier(max_iter=1000).
+          cv (int): cross-validation folds for the out-of-fold predictions.
+          n_jobs (int): estimators / folds fit at once; -1 for every core.
+          warm_start (bool): on refitting, continue from the last fit for
+            estimators that support it, rather than starting over.
+        '''
+        self.estimators = [(est, ESTIMATORS[est]()) if isinstance(est, str) else est
+                           for est in estimators]
+        self.final_estimator = final_estimator or MLPClassifier(max_iter=1000)
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.warm_start = warm_start
+        self.estimators_ = None
+        self.fold_estimators_ = None
+        self.final_estimator_ = None
+        self.fit_times_ = {}
+
+    def fit(self, X, y):
+        '''
+        Fit the ensemble.
+
+        Returns: self.
+        '''
+        X = np.asarray(X)
+        y = np.asarray(y)
+        self.classes_ = np.unique(y)
+        folds = list(StratifiedKFold(self.cv).split(X, y))
+
+        # Only the full fits are warm started. The labeled set grows and
+        # the folds are split anew every round, so a fold model continued
+        # from last round could have seen rows in its test split, and the
+        # final estimator would learn from in-sample predictions.
+        previous = dict(self.estimators_ or []) if self.warm_start else {}
+        full = [_warm(previous.get(name), clone(est)) for name, est in self.estimators]
+        fold_fits = [[clone(est) for _ in folds] for _, est in self.estimators]
+
+        # Every fold of every estimator, plus every estimator on all the
+        # data, is its own job.
+        jobs = [(i, k, train) for i in range(len(full)) for k, (train, _) in enumerate(folds)]
+        fitted = Parallel(n_jobs=self.n_jobs)(
+            [delayed(_fit)(fold_fits[i][k], X, y, train) for i, k, train in jobs] +
+            [delayed(_fit)(est, X, y) for est in full])
+
+        out_of_fold = np.zeros((len(X), len(full)))
+        self.fit_times_ = {name: 0.0 for name, _ in self.estimators}
+        for (i, k, train), (est, seconds) in zip(jobs, fitted[:len(jobs)]):
+            test = np.setdiff1d(np.arange(len(X)), train)
+            out_of_fold[test, i] = _stack_predictions(est, X[test])
+            fold_fits[i][k] = est
+            self.fit_times_[self.estimators[i][0]] += seconds
+        self.fold_estimators_ = [(name, fold_fits[i]) for i, (name, _) in enumerate(self.estimators)]
+
+        self.estimators_ = []
+        for (name, _), (est, seconds) in zip(self.estimators, fitted[len(jobs):]):
+            self.estimators_.append((name, est))
+            self.fit_times_[name] += seconds
+
+        final = copy.deepcopy(self.final_estimator_) \
+            if self.warm_start and self.final_estimator_ is not None \
+            else clone(self.final_estimator)
+        if 'warm_start' in final.get_params():
+            final.set_params(warm_start=self.warm_start)
+        self.final_estimator_, self.fit_times_['final'] = _fit(final, out_of_fold, y)
+        return self
+
+    def transform(self, X):
+        '''
+        The base estimators' predictions for X, as fed to the final estimator.
+        '''
+        return np.column_stack([_stack_predictions(est, X) for _, est in self.estimators_])
+
+    def predict_proba(self, X):
+        return self.final_estimator_.predict_proba(self.transform(X))
+
+    def predict(self, X):
+        return self.final_estimator_.predict(self.transform(X))
+
+    def score(self, X, y):
+        '''
+        Mean accuracy on X, y.
+        '''
+        return np.mean(self.predict(X) == np.asarray(y))
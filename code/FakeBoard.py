@@ -0,0 +1,568 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: A tiny stand-in for boards.4chan.org that serves a randomly generated
+###        board over local HTTP. It exists so that the scrapers can be run and
+###        timed offline, without hammering (or waiting on) the real site.
+###        Both the html pages and the JSON API (`threads.json`,
+###        `thread/<no>.json`) are served, from the same host.
+###        Boards are generated as a stream, the way the real board fills
+###        up: posts land on whichever of the live threads, so post numbers
+###        interleave across threads; thread lengths can vary up to the bump
+###        limit; and posts carry `>>` references (to the OP, to recent
+###        posts, across threads, and dead ones), greentext, URLs, html
+###        entities and image-only posts. Only the live threads are held in
+###        memory, so corpora of millions of posts can be written out a
+###        chunk at a time for benchmarking.
+###        Running this file directly serves a board until interrupted, or
+###        writes a generated corpus or set of pages to disk.
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from email.utils import formatdate
+from html import escape
+from PostStore import PostStore, is_store
+import HelperChan
+import ChanAPI
+import pandas as pd
+import numpy as np
+import threading
+import argparse
+import json
+import os
+import random
+import time
+
+START = datetime(2024, 2, 14, 12, 0, 0)
+FIRST_NO = 34000000
+BUMP_LIMIT = 310
+WORDS = ['trans', 'hrt', 'estrogen', 'boymoder', 'passing', 'voice', 'therapist',
+         'anon', 'thread', 'general', 'egg', 'doctor', 'dilate', 'cute', 'gay',
+         'boyfriend', 'girlfriend', 'clothes', 'work', 'family', 'hair', 'makeup',
+         'really', 'think', 'just', 'like', 'dont', 'know', 'feel', 'good', 'bad',
+         'the', 'a', 'is', 'it', 'to', 'and', 'of', 'you', 'that', 'im',
+         "don't", "she's", 'r&d', 'q&a', '<3', 'dysphoria', 'euphoria', 'spiro', 'cypro',
+         'bica', 'e2', 't-levels', 'timeline', 'pass', 'clocked', 'discord', 'reddit',
+         'troon', 'kek', 'lmao', 'based']
+# Roughly Zipfian: the first words are by far the most common.
+WORD_WEIGHTS = np.array([1 / (rank + 1) ** .8 for rank in range(len(WORDS))])
+NAMES = ['Anonymous'] * 9 + ['Rank 1 Boymoder']
+SUBJECTS = ['/sftmg/ — straight ftm general', '/mmg/ manmoder general', '/oldgen/',
+            '/hrtgen/', '/trans/ general', 'Why do', 'Gay thread'] + [''] * 9
+URLS = ['https://www.youtube.com/watch?v={code}', 'https://youtu.be/{code}',
+        'https://twitter.com/anon/status/{number}', 'https://x.com/anon/status/{number}',
+        'https://www.reddit.com/r/asktransgender/comments/{code}/',
+        'http://imgur.com/{code}', 'www.transline.zone/{code}', 'https://diyhrt.wiki/{code}']
+CODE_CHARS = 'abcdefghijkmnopqrstuvwxyzABCDEFGHJK0123456789_-'
+# The board breaks long words, URLs included, with <wbr>s.
+WBR_EVERY = 35
+# Chances of each kind of content; see iter_threads.
+RATES = {'ref_rate': .6, 'cross_thread_rate': .03, 'dead_ref_rate': .02,
+         'greentext_rate': .12, 'url_rate': .05, 'image_only_rate': .05}
+
+
+class WordStream:
+
+    def __init__(self, seed, buffer=1 << 16):
+        '''
+        An endless, reproducible stream of words, escaped like the board
+        escapes comment text. Words are drawn a buffer at a time with numpy,
+        which is far cheaper than drawing them one by one.
+        '''
+        self.rng = np.random.default_rng(seed)
+        self.words = np.array([escape(word) for word in WORDS], dtype=object)
+        self.buffer = buffer
+        self.drawn = self.words[:0]
+        self.at = 0
+
+    def take(self, k):
+        '''
+        Returns: the next k words, joined by spaces.
+        '''
+        if self.at + k > len(self.drawn):
+            self.drawn = self.words[self.rng.choice(len(self.words), max(k, self.buffer),
+                                                    p=WORD_WEIGHTS / WORD_WEIGHTS.sum())]
+            self.at = 0
+        self.at += k
+        return ' '.join(self.drawn[self.at - k:self.at])
+
+
+def make_url(rng):
+    '''
+    A URL, broken up with <wbr>s the way the board does.
+    '''
+    url = rng.choice(URLS).format(code=''.join(rng.choices(CODE_CHARS, k=11)),
+                                  number=rng.randint(10 ** 17, 10 ** 18))
+    return '<wbr>'.join(url[i:i + WBR_EVERY] for i in range(0, len(url), WBR_EVERY))
+
+def make_comment(rng, words, thread, other, board, ref_rate, cross_thread_rate, dead_ref_rate,
+                 greentext_rate, url_rate, image_only_rate):
+    '''
+    The html comment of a new post in thread.
+
+    Inputs:
+      rng (Random): source of randomness.
+      words (WordStream): source of words.
+      thread (dict): the thread posted in; its posts so far can be referenced.
+      other (dict): another live thread, for cross-thread references, or None.
+      board (str): board name, for cross-thread links.
+      ref_rate, ..., image_only_rate: chances of each kind of content; see
+        iter_threads.
+
+    Returns: str of html, as in the API's `com` field ('' for an image-only post).
+    '''
+    if thread['posts'] and rng.random() < image_only_rate:
+        return ''
+    lines = []
+    posts = thread['posts']
+    if posts and rng.random() < ref_rate:
+        for _ in range(rng.choice([1, 1, 1, 1, 2, 2, 3])):
+            if other is not None and other['posts'] and rng.random() < cross_thread_rate:
+                ref = rng.choice(other['posts'][-50:])['no']
+                lines.append(f'<a href="/{board}/thread/{other["no"]}#p{ref}" class="quotelink">'
+                             f'&gt;&gt;{ref}</a>')
+            elif rng.random() < dead_ref_rate:
+                ref = posts[-1]['no'] - rng.randint(1, 500)
+                lines.append(f'<span class="deadlink">&gt;&gt;{ref}</span>')
+            else:
+                # Mostly recent posts, now and then the OP.
+                ref = posts[0]['no'] if rng.random() < .15 else \
+                    posts[max(0, len(posts) - 1 - int(rng.expovariate(.25)))]['no']
+                lines.append(f'<a href="#p{ref}" class="quotelink">&gt;&gt;{ref}</a>')
+    for _ in range(rng.choice([1, 1, 1, 2, 2, 3, 5])):
+        roll = rng.random()
+        if roll < greentext_rate:
+            lines.append(f'<span class="quote">&gt;{words.take(rng.randint(2, 15))}</span>')
+        elif roll < greentext_rate + url_rate:
+            lines.append(make_url(rng))
+        else:
+            lines.append(words.take(rng.randint(3, 40)))
+    return '<br>'.join(lines)
+
+def make_post(no, thread, posted, rng, words, other=None, board='lgbt', **rates):
+    '''
+    Make a single fake post in thread, in the shape of a post from 4chan's
+    JSON API. The post is not added to the thread.
+
+    Inputs:
+      no (int): the post's number.
+      thread (dict): the thread posted in; a thread without posts yet is
+        opened by this post.
+      posted (datetime): when the post was made.
+      rng (Random), words (WordStream): sources of randomness and words.
+      other (dict): another live thread, for cross-thread references.
+      board (str): board name, for cross-thread links.
+      rates: chances of each kind of content, overriding RATES.
+
+    Returns: dict with no, resto, name, now, time and com keys (and sub, for an OP).
+    '''
+    post = {'no': no,
+            'resto': thread['no'] if thread['posts'] else 0,
+            'name': rng.choice(NAMES),
+            'now': posted.strftime('%m/%d/%y(%a)%H:%M:%S'),
+            'time': int(posted.timestamp()),
+            'com': make_comment(rng, words, thread, other if other is not thread else None,
+                                board, **{**RATES, **rates})}
+    if not thread['posts']:
+        post['sub'] = thread['sub']
+    return post
+
+def iter_threads(n_posts, posts_per_thread=100, live_threads=150, seed=0, board='lgbt',
+                 vary_length=True, posts_per_minute=7, start=START, **rates):
+    '''
+    Generate a board's threads, streaming, in the order they fill up.
+
+    Inputs:
+      n_posts (int): total posts, across every thread.
+      posts_per_thread (int): average thread length (OP included); with
+        vary_length, lengths are drawn from an exponential distribution
+        up to BUMP_LIMIT, otherwise every thread has exactly this many.
+      live_threads (int): threads open at once; each post goes to one of
+        them, so post numbers interleave across threads.
+      seed (int): seed for the generator; the same arguments always make
+        the same board.
+      board (str): board name, used in cross-thread links.
+      vary_length (bool): whether thread lengths vary.
+      posts_per_minute (float): average rate posts come in at.
+      start (datetime): when the first post is made.
+      rates: chances of each kind of content, overriding RATES:
+        ref_rate (a post references earlier posts), cross_thread_rate (a
+        reference points into another thread), dead_ref_rate (a reference
+        is to a deleted post), greentext_rate and url_rate (a line is
+        greentext / a URL), image_only_rate (a reply has no text at all).
+
+    Yields: threads as dicts with the thread number ('no'), subject ('sub')
+      and list of posts ('posts') in the API's shape.
+    '''
+    rng = random.Random(seed)
+    words = WordStream(seed)
+    board = board.strip('/')
+    no = FIRST_NO
+    posted = start
+    planned = 0
+    live = []
+
+    def open_thread():
+        nonlocal planned
+        length = posts_per_thread
+        if vary_length:
+            length = min(BUMP_LIMIT, 1 + int(rng.expovariate(1 / max(posts_per_thread - 1, 1e-9))))
+        length = min(length, n_posts - planned)
+        planned += length
+        live.append({'no': None, 'sub': rng.choice(SUBJECTS), 'posts': [], 'length': length})
+
+    while planned < n_posts and len(live) < live_threads:
+        open_thread()
+    while live:
+        i = rng.randrange(len(live))
+        thread = live[i]
+        other = live[rng.randrange(len(live))] if len(live) > 1 else None
+        post = make_post(no, thread, posted, rng, words, other, board, **rates)
+        if not thread['posts']:
+            thread['no'] = no
+        thread['posts'].append(post)
+        no += 1
+        posted += timedelta(seconds=rng.expovariate(posts_per_minute / 60))
+
+        if len(thread['posts']) == thread['length']:
+            live[i] = live[-1]
+            live.pop()
+            del thread['length']
+            yield thread
+            if planned < n_posts:
+                open_thread()
+
+def make_board(n_threads=150, posts_per_thread=200, seed=0, **board):
+    '''
+    Generate a fake board, with every thread live at once.
+
+    Inputs:
+      n_threads (int): number of threads on the board.
+      posts_per_thread (int): number of posts (OP included) in every thread.
+      seed (int): seed for the generator, so boards are reproducible.
+      board: other arguments of iter_threads.
+
+    Returns: list of threads, newest bump first. Each thread is a dict with the
+      thread number ('no'), subject ('sub') and list of posts ('posts').
+    '''
+    board.setdefault('vary_length', False)
+    threads = list(iter_threads(n_threads * posts_per_thread, posts_per_thread,
+                                live_threads=n_threads, seed=seed, **board))
+    threads.sort(key=lambda thread: thread['posts'][-1]['time'], reverse=True)
+    return threads
+
+def bump_threads(threads, n_threads=15, replies=5, seed=1):
+    '''
+    Simulate the passing of time: add replies to a random n_threads of the
+    board's threads, in place, and re-sort the board by bump order.
+    '''
+    rng = random.Random(seed)
+    words = WordStream(seed)
+    no = max(thread['posts'][-1]['no'] for thread in threads) + 1
+    newest = max(thread['posts'][-1]['time'] for thread in threads)
+    posted = datetime.fromtimestamp(newest)
+
+    for thread in rng.sample(threads, min(n_threads, len(threads))):
+        for _ in range(replies):
+            posted += timedelta(seconds=rng.randint(1, 300))
+            thread['posts'].append(make_post(no, thread, posted, rng, words))
+            no += rng.randint(1, 50)
+
+    threads.sort(key=lambda thread: thread['posts'][-1]['time'], reverse=True)
+
+
+### HTML rendering, mimicking the markup the real board serves.
+
+def render_post(post, subject=None):
+    '''
+    Render a post dict as a 4chan post div.
+    '''
+    subject_html = '' if subject is None else f'<span class="subject">{escape(subject)}</span> '
+    return (f'<div class="post {"op" if post["resto"] == 0 else "reply"}" id="p{post["no"]}">'
+            f'<div class="postInfo desktop">{subject_html}'
+            f'<span class="nameBlock"><span class="name">{escape(post["name"])}</span></span> '
+            f'<span class="dateTime" data-utc="{post["time"]}">{post["now"]}</span> '
+            f'<span class="postNum desktop"><a href="#p{post["no"]}" title="Link to this post">No.</a>'
+            f'<a href="javascript:quote(\'{post["no"]}\');" title="Reply to this post">{post["no"]}</a>'
+            f'</span></div><blockquote class="postMessage" id="m{post["no"]}">{post["com"]}</blockquote></div>')
+
+def render_thread(thread):
+    '''
+    Render the full page for a thread.
+    '''
+    posts = [render_post(thread['posts'][0], thread['sub'])]
+    posts.extend(render_post(post) for post in thread['posts'][1:])
+    return ('<html><body><div class="board">'
+            f'<div class="thread" id="t{thread["no"]}">{"".join(posts)}</div>'
+            '</div></body></html>')
+
+def render_index(threads, shown_replies=5):
+    '''
+    Render an index page listing the given threads.
+    '''
+    rendered = []
+    for thread in threads:
+        omitted = len(thread['posts']) - 1 - shown_replies
+        summary = ''
+        if omitted > 0:
+            summary = (f'<span class="summary desktop">{omitted} replies omitted. '
+                       f'<a href="thread/{thread["no"]}" class="replylink">Click here</a>'
+                       ' to view.</span>')
+        shown = [render_post(thread['posts'][0], thread['sub'])]
+        shown.extend(render_post(post) for post in thread['posts'][-shown_replies:])
+        rendered.append(f'<div class="thread" id="t{thread["no"]}">{shown[0]}{summary}'
+                        f'{"".join(shown[1:])}</div>')
+    return f'<html><body><div class="board">{"".join(rendered)}</div></body></html>'
+
+def render_catalog(threads, threads_per_page=15):
+    '''
+    Build the board's `threads.json`, as served by the JSON API.
+    '''
+    return [{'page': i // threads_per_page + 1,
+             'threads': [{'no': thread['no'],
+                          'last_modified': thread['posts'][-1]['time'],
+                          'replies': len(thread['posts']) - 1}
+                         for thread in threads[i:i + threads_per_page]]}
+            for i in range(0, len(threads), threads_per_page)]
+
+
+def write_fixtures(threads, path, board='lgbt', threads_per_page=15):
+    '''
+    Write a board to disk laid out like the JSON API, i.e.
+    `<path>/<board>/threads.json` and `<path>/<board>/thread/<no>.json`,
+    so it can be read back with ChanAPI without a server.
+    '''
+    thread_dir = os.path.join(path, board.strip('/'), 'thread')
+    os.makedirs(thread_dir, exist_ok=True)
+
+    with open(os.path.join(path, board.strip('/'), 'threads.json'), 'w', encoding='utf-8') as f:
+        json.dump(render_catalog(threads, threads_per_page), f, indent=1)
+    for thread in threads:
+        with open(os.path.join(thread_dir, f'{thread["no"]}.json'), 'w', encoding='utf-8') as f:
+            json.dump({'posts': thread['posts']}, f, indent=1, ensure_ascii=False)
+
+
+### Corpora, for benchmarking at scale.
+
+def make_corpus(n_posts, chunksize=None, **board):
+    '''
+    Posts of a generated board, exactly as ChanAPI (or ChanParser, from the
+    rendered pages) would scrape them.
+
+    Inputs:
+      n_posts (int): number of posts.
+      chunksize (int): if given, return an iterator of DataFrames of about
+        this many posts (whole threads) instead of a single DataFrame.
+      board: arguments of iter_threads.
+
+    Returns: DataFrame of posts (or iterator of them).
+    '''
+    chunks = iter_corpus(n_posts, chunksize or n_posts, **board)
+    if chunksize:
+        return chunks
+    return next(chunks, pd.DataFrame(columns=HelperChan.POST_COLUMNS))
+
+def iter_corpus(n_posts, chunksize, **board):
+    rows = []
+    for thread in iter_threads(n_posts, **board):
+        rows.extend(ChanAPI.thread_rows(thread))
+        if len(rows) >= chunksize:
+            yield HelperChan.add_datetime(pd.DataFrame(rows, columns=HelperChan.POST_COLUMNS))
+            rows = []
+    if rows:
+        yield HelperChan.add_datetime(pd.DataFrame(rows, columns=HelperChan.POST_COLUMNS))
+
+def write_corpus(path, n_posts, chunksize=100000, **board):
+    '''
+    Write a generated board's posts to a PostStore or CSV, a chunk at a
+    time, so the size of the corpus is bounded only by disk.
+
+    Returns: number of posts written.
+    '''
+    written = 0
+    if is_store(path):
+        store = PostStore(path)
+        for chunk in make_corpus(n_posts, chunksize, **board):
+            written += store.append(chunk)
+        store.close()
+        return written
+    for chunk in make_corpus(n_posts, chunksize, **board):
+        chunk.to_csv(path, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+        written += len(chunk)
+    return written
+
+def iter_pages(n_posts, **board):
+    '''
+    Yields: (thread, html of its page, as served) for every thread of a
+      generated board.
+    '''
+    for thread in iter_threads(n_posts, **board):
+        yield thread, render_thread(thread)
+
+def write_pages(path, n_posts, **board):
+    '''
+    Write the page of every thread of a generated board to
+    `<path>/thread/<no>.html`, with the JSON API's view of the same threads
+    alongside (see write_fixtures).
+
+    Returns: number of pages written.
+    '''
+    thread_dir = os.path.join(path, 'thread')
+    os.makedirs(thread_dir, exist_ok=True)
+    threads = []
+    for thread, page in iter_pages(n_posts, **board):
+        with open(os.path.join(thread_dir, f'{thread["no"]}.html'), 'w', encoding='utf-8') as f:
+            f.write(page)
+        threads.append(thread)
+    write_fixtures(threads, path, board.get('board', 'lgbt'))
+    return len(threads)
+
+
+### Serving
+
+def make_handler(board, threads, latency=0.0, threads_per_page=15, stats=None):
+    '''
+    Build a request handler class serving the given fake board.
+
+    Inputs:
+      board (str): name of the board, e.g. 'lgbt'.
+      threads (list): threads, as returned by make_board. Changes made to
+        the list (e.g. by bump_threads) are picked up as they happen.
+      latency (float): seconds to wait before answering every request.
+      threads_per_page (int): number of threads on each index page.
+      stats (dict): if given, counts of 'requests' served and of those
+        answered 'not_modified' are kept in it.
+    '''
+    stats = {} if stats is None else stats
+    stats.setdefault('requests', 0)
+    stats.setdefault('not_modified', 0)
+    lock = threading.Lock()
+
+    class FakeBoardHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            with lock:
+                stats['requests'] += 1
+
+            parts = [part for part in self.path.split('?')[0].split('/') if part]
+            body = None
+            if parts and parts[0] == board:
+                body = self.route(parts[1:])
+
+            if body is None:
+                self.send_error(404)
+                return
+
+            last_modified = None
+            if len(parts) >= 3 and parts[1] == 'thread' and parts[2].isdigit():
+                thread = self.find_thread(parts[2])
+                last_modified = formatdate(thread['posts'][-1]['time'], usegmt=True)
+                if self.headers.get('If-Modified-Since') == last_modified:
+                    with lock:
+                        stats['not_modified'] += 1
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+
+            is_json = parts[-1].endswith('.json')
+            encoded = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json' if is_json
+                                             else 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(encoded)))
+            if last_modified:
+                self.send_header('Last-Modified', last_modified)
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def find_thread(self, no):
+            for thread in threads:
+                if str(thread['no']) == no:
+                    return thread
+            return None
+
+        def route(self, parts):
+            if not parts or (len(parts) == 1 and parts[0].isdigit()):
+                page = int(parts[0]) if parts else 1
+                shown = threads[(page - 1) * threads_per_page:page * threads_per_page]
+                return render_index(shown) if shown else None
+            if parts == ['threads.json']:
+                return json.dumps(render_catalog(threads, threads_per_page))
+            if parts[0] == 'thread' and len(parts) == 2 and parts[1].endswith('.json'):
+                thread = self.find_thread(parts[1][:-5])
+                return json.dumps({'posts': thread['posts']}) if thread else None
+            if parts[0] == 'thread' and len(parts) >= 2 and parts[1].isdigit():
+                thread = self.find_thread(parts[1])
+                return render_thread(thread) if thread else None
+            return None
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeBoardHandler
+
+@contextmanager
+def serve_board(threads, board='lgbt', latency=0.0, port=0, stats=None):
+    '''
+    Serve a fake board from a background thread for the duration of a
+    `with` block.
+
+    Inputs:
+      threads (list): threads, as returned by make_board.
+      board (str): name of the board to serve under.
+      latency (float): seconds each response is delayed by.
+      port (int): port to listen on; 0 picks a free one.
+      stats (dict): request counts are kept here; see make_handler.
+
+    Returns: base url to hand to the scrapers, e.g. 'http://127.0.0.1:5000'.
+    '''
+    server = ThreadingHTTPServer(('127.0.0.1', port),
+                                 make_handler(board.strip('/'), threads, latency, stats=stats))
+    server.daemon_threads = True
+    worker = threading.Thread(target=server.serve_forever, daemon=True)
+    worker.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a fake 4chan board locally, or write '
+                                                 'a generated corpus or its pages to disk.')
+    parser.add_argument('--board', default='lgbt')
+    parser.add_argument('--threads', type=int, default=150)
+    parser.add_argument('--posts', type=int, default=200, help='posts per thread')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--write-corpus', default=None, metavar='PATH',
+                        help='write the posts to this CSV / PostStore instead of serving.')
+    parser.add_argument('--write-pages', default=None, metavar='PATH',
+                        help='write the thread pages to this directory instead of serving.')
+    parser.add_argument('--total-posts', type=int, default=100000,
+                        help='posts to write, across threads of --posts posts on average.')
+    args = parser.parse_args()
+
+    if args.write_corpus or args.write_pages:
+        board = {'posts_per_thread': args.posts, 'live_threads': args.threads,
+                 'seed': args.seed, 'board': args.board}
+        if args.write_corpus:
+            count = write_corpus(args.write_corpus, args.total_posts, **board)
+            print(f'Wrote {count} posts to {args.write_corpus}')
+        if args.write_pages:
+            count = write_pages(args.write_pages, args.total_posts, **board)
+            print(f'Wrote {count} pages to {args.write_pages}')
+        raise SystemExit
+
+    with serve_board(make_board(args.threads, args.posts, args.seed), args.board,
+                     args.latency, args.port) as url:
+        print(f'Serving /{args.board}/ at {url}/{args.board}/')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
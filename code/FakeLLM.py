@@ -0,0 +1,191 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: A local stand-in for OpenAI's chat completions endpoint, so that
+###        LLMLabeler can be run and timed offline, without an API key or
+###        paying for tokens. It answers "Yes" to posts mentioning trans
+###        people and "No" otherwise, after a configurable delay, and
+###        enforces requests / tokens per minute limits the way the real API
+###        does: over the limit, it answers 429 with a Retry-After header.
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from collections import deque
+import threading
+import argparse
+import random
+import json
+import time
+import re
+
+TRANS_PATTERN = re.compile(r'\btrans|\btroon|\btranny|\bhrt\b|\bmtf\b|\bftm\b', re.IGNORECASE)
+
+
+def count_tokens(messages):
+    '''
+    Rough token count of some chat messages (about 4 characters a token).
+    '''
+    return sum(len(str(message.get('content', ''))) // 4 + 4 for message in messages)
+
+def answer(messages):
+    '''
+    What the fake model says about the post in the last message it was
+    sent (what follows "MESSAGE:", if anything does).
+    '''
+    content = str(messages[-1].get('content', ''))
+    post = content.split('MESSAGE:', 1)[-1]
+    return 'Yes' if TRANS_PATTERN.search(post) else 'No'
+
+
+class MinuteWindow:
+
+    def __init__(self, limit):
+        '''
+        Counts usage (requests or tokens) over the last minute.
+        '''
+        self.limit = limit
+        self.used = deque()
+        self.total = 0
+
+    def admit(self, amount, now):
+        '''
+        Record amount of usage at now if it fits in the limit.
+
+        Returns: 0 if admitted, otherwise seconds until it would fit.
+        '''
+        while self.used and self.used[0][0] <= now - 60:
+            self.total -= self.used.popleft()[1]
+        if not self.limit or self.total + amount <= self.limit or not self.used:
+            self.used.append((now, amount))
+            self.total += amount
+            return 0
+        return max(self.used[0][0] + 60 - now, 0.01)
+
+
+### Serving
+
+def make_handler(latency=0.0, requests_per_minute=None, tokens_per_minute=None,
+                 error_rate=0.0, seed=0, stats=None):
+    '''
+    Build a request handler class answering POSTs to /v1/chat/completions.
+
+    Inputs:
+      latency (float): seconds to wait before answering every request.
+      requests_per_minute, tokens_per_minute (int): rate limits; None for none.
+      error_rate (float): fraction of requests answered with a 500, to
+        exercise retrying.
+      seed (int): seed for which requests fail.
+      stats (dict): if given, counts of 'requests' answered, of those
+        'rate_limited' and of 'errors' are kept in it.
+    '''
+    stats = {} if stats is None else stats
+    for key in ['requests', 'rate_limited', 'errors']:
+        stats.setdefault(key, 0)
+    lock = threading.Lock()
+    rng = random.Random(seed)
+    windows = {'requests': MinuteWindow(requests_per_minute),
+               'tokens': MinuteWindow(tokens_per_minute)}
+
+    class FakeLLMHandler(BaseHTTPRequestHandler):
+
+        def send_json(self, status, body, headers=None):
+            encoded = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(encoded)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def do_POST(self):
+            if self.path.rstrip('/') not in ('/v1/chat/completions', '/chat/completions'):
+                self.send_json(404, {'error': {'message': 'not found'}})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                messages = request['messages']
+            except (ValueError, KeyError, TypeError) as err:
+                self.send_json(400, {'error': {'message': str(err)}})
+                return
+
+            prompt_tokens = count_tokens(messages)
+            with lock:
+                stats['requests'] += 1
+                now = time.monotonic()
+                wait = windows['requests'].admit(1, now)
+                if not wait:
+                    wait = windows['tokens'].admit(prompt_tokens, now)
+                failed = not wait and rng.random() < error_rate
+                if wait:
+                    stats['rate_limited'] += 1
+                elif failed:
+                    stats['errors'] += 1
+            if wait:
+                self.send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                               {'Retry-After': f'{wait:.2f}'})
+                return
+            if failed:
+                self.send_json(500, {'error': {'message': 'The server had an error'}})
+                return
+
+            if latency:
+                time.sleep(latency)
+            content = answer(messages)
+            with lock:
+                number = stats['requests']
+            self.send_json(200, {
+                'id': f'chatcmpl-fake-{number}',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': request.get('model', 'fake'),
+                'choices': [{'index': 0,
+                             'message': {'role': 'assistant', 'content': content},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': 1,
+                          'total_tokens': prompt_tokens + 1}})
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeLLMHandler
+
+@contextmanager
+def serve_llm(latency=0.0, requests_per_minute=None, tokens_per_minute=None,
+              error_rate=0.0, port=0, stats=None):
+    '''
+    Serve a fake chat completions endpoint from a background thread for the
+    duration of a `with` block.
+
+    Inputs: see make_handler; port 0 picks a free port.
+
+    Returns: API url to hand to LLMLabeler, e.g. 'http://127.0.0.1:5000/v1'.
+    '''
+    server = ThreadingHTTPServer(('127.0.0.1', port),
+                                 make_handler(latency, requests_per_minute, tokens_per_minute,
+                                              error_rate, stats=stats))
+    server.daemon_threads = True
+    worker = threading.Thread(target=server.serve_forever, daemon=True)
+    worker.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}/v1'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a fake chat completions endpoint locally.')
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--rpm', type=int, default=None, help='requests per minute allowed.')
+    parser.add_argument('--tpm', type=int, default=None, help='tokens per minute allowed.')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--port', type=int, default=8001)
+    args = parser.parse_args()
+
+    with serve_llm(args.latency, args.rpm, args.tpm, args.error_rate, args.port) as url:
+        print(f'Serving chat completions at {url}/chat/completions')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -3,6 +3,60 @@
 ### About: This python module contains helper functions for interacting with 
 ###         the OpenAI API.
 
+import json
+
+SYSTEM_ROLE = 'You are a classifier which reads the raw content of posts from 4chan\'s /lgbt/ board, and says whether or not they discuss trans people or trans-related topics. If the post is about trans people, respond "Yes". Otherwise, respond "No".'
+ANSWERS = {1: 'Yes', 0: 'No'}
+
+def user_prompt(content):
+    '''
+    The question asked about each post; exactly the prompt the model was
+    fine-tuned on, indentation and all.
+    '''
+    return ('\n'
+            '        Does the following message discuss trans people or trans-related topics? Yes or No.\n'
+            '        \n'
+            f'        MESSAGE: {content}\n'
+            '        ')
+
+def prompt_messages(content, system_role=None):
+    '''
+    Chat messages asking whether one post is trans related.
+
+    Inputs:
+      content (str): content of the post.
+      system_role (str): Description of the role the system should play; defaults to SYSTEM_ROLE.
+
+    Returns: list of message dictionaries.
+    '''
+    return [
+        {'role': 'system', 'content': system_role or SYSTEM_ROLE},
+        {'role': 'user', 'content': user_prompt(content)}
+    ]
+
+def parse_answer(response):
+    '''
+    Turn a model's answer into a classification: 1 for "Yes", 0 for "No",
+    None for anything else.
+    '''
+    answer = str(response).strip().strip('.').lower()
+    for classification, expected in ANSWERS.items():
+        if answer == expected.lower():
+            return classification
+    return None
+
+def iter_example_messages(train_posts, content_col='content', classification_col='classification', system_role=None):
+    '''
+    Generator version of create_example_messages, making one example at a
+    time rather than holding them all.
+
+    Yields: dictionary for fine tuning, per post.
+    '''
+    for content, classification in zip(train_posts[content_col], train_posts[classification_col]):
+        yield {'messages':
+                  prompt_messages(content, system_role) +
+                  [{'role': 'assistant', 'content': ANSWERS[1] if classification == 1 else ANSWERS[0]}]}
+
 def create_example_messages(train_posts, content_col='content', classification_col='classification', system_role=None):
     '''
     Given a DataFrame of 4chan posts, creates example messages for fine-tuning gpt3.5-turbo. 
@@ -17,29 +71,18 @@ def create_example_messages(train_posts, content_col='content', classification_c
        
     Returns: list of dictionaries for fine tuning.  
     '''
-    examples = []
-
-    system_role = 'You are a classifier which reads the raw content of posts from 4chan\'s /lgbt/ board, and says whether or not they discuss trans people or trans-related topics. If the post is about trans people, respond "Yes". Otherwise, respond "No".'    
-    for _, post in train_posts.iterrows():
-        
-        user_prompt = \
-        f'''
-        Does the following message discuss trans people or trans-related topics? Yes or No.
-        
-        MESSAGE: {post[content_col]}
-        '''
-
-        assistant_content = 'Yes' if post[classification_col] == 1 else 'No'
-
-        new_example = \
-            {'messages':
-                [
-                    {'role': 'system', 'content': system_role},
-                    {'role': 'user', 'content':user_prompt},
-                    {'role':'assistant', 'content':assistant_content}
-                ]
-            }
-        
-        examples.append(new_example)
-
-    return examples
\ No newline at end of file
+    return list(iter_example_messages(train_posts, content_col, classification_col, system_role))
+
+def write_example_messages(train_posts, path, content_col='content', classification_col='classification', system_role=None):
+    '''
+    Write fine-tuning examples straight to a JSONL file, one line per post,
+    without building them all in memory first.
+
+    Returns: number of examples written.
+    '''
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for example in iter_example_messages(train_posts, content_col, classification_col, system_role):
+            f.write(json.dumps(example) + '\n')
+            written += 1
+    return written
@@ -1,16 +1,47 @@
 ### Author: Ashlynn Wimer
-### Last Modified: 2/16/2024
+### Last Modified: 10/18/2026
 ### About: Module containing helper functions for working with 
 ###        4chan data.
 import warnings 
 import pandas as pd
 import regex as re
 import networkx as nx
+import numpy as np
+import scipy.sparse
 import ast
 
 ### Constants
-URL_REGEX = r'[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*)'
+# Top level domains a URL without a scheme (or www.) may end in. Without one,
+# any word.word would count as a URL; on the board those are almost always
+# sentences run together ('narrative.It', 'know...I', 'fuck.Is'), abbreviations
+# ('e.g.') or version numbers ('1.2.3'). Country codes which are also common
+# words ('is', 'it', 'me', 'to', 'us', ...) are left out for the same reason.
+URL_TLDS = ['com', 'org', 'net', 'edu', 'gov', 'info', 'biz', 'io', 'co', 'tv', 'gg',
+            'ly', 'fm', 'xyz', 'app', 'dev', 'wiki', 'zone', 'moe', 'lgbt', 'uk', 'ca',
+            'au', 'nz', 'ie', 'de', 'fr', 'nl', 'se', 'ch', 'eu', 'ru', 'jp']
+# A path may not end in punctuation, which is more likely to end the sentence.
+URL_PATH_REGEX = r'(?:[-a-zA-Z0-9()@:%_\+.~#?&//=]*(?<![.,:;?!]))'
+# A URL is either anything starting with http(s):// or www., or a bare
+# domain ending in one of URL_TLDS (in lower case, as a whole word, and not
+# straight after a '.', so that 'tranny...alas' is left alone), with an
+# optional port and path.
+URL_REGEX = (r'(?:https?://|(?<![\w.])www\.)[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b'
+             + URL_PATH_REGEX +
+             r'|(?<![-\w@.])(?:[a-zA-Z0-9](?:[-a-zA-Z0-9]{0,61}[a-zA-Z0-9])?\.)+'
+             r'(?:' + '|'.join(URL_TLDS) + r')\b(?![-.]?\w)(?::[0-9]{1,5})?(?:[/?#]'
+             + URL_PATH_REGEX + ')?')
 POST_REF_REGEX = r'>>[0-9]{8}'
+URL_PATTERN = re.compile(URL_REGEX)
+POST_REF_PATTERN = re.compile(POST_REF_REGEX)
+# Columns of a scraped post, as produced by every scraping backend. thread is
+# the post number of the thread's OP; datetime is date and time parsed
+# together (see make_datetime).
+POST_COLUMNS = ['subject', 'thread', 'id', 'author', 'date', 'time',
+                'content', 'clean_content', 'refs', 'urls', 'datetime']
+# Scraped dates come as MM/DD/YY, older archives have M/D/YYYY; two digit
+# years get their century prepended so that a single format parses both.
+SHORT_YEAR_PATTERN = r'/([0-9]{2})$'
+DATE_FORMAT = '%m/%d/%Y'
 
 
 ### Basic content wrangling functions
@@ -19,13 +50,20 @@ def get_urls(content):
     '''
     Retrieve all URLS in a post.
     '''
-    return re.findall(URL_REGEX, content)
+    return URL_PATTERN.findall(content)
 
 def get_references(content):
     '''
     Retrieve all post ids referenced by this post.
     '''
-    return re.findall(POST_REF_REGEX, content)
+    return POST_REF_PATTERN.findall(content)
+
+def reference_ids(contents):
+    '''
+    Integer ids referenced by each post of contents, e.g. [[34664894], []].
+    '''
+    return [[int(ref.strip('>>')) for ref in POST_REF_PATTERN.findall(str(content))]
+            for content in contents]
 
 def remove_links(content):
     '''
@@ -35,53 +73,152 @@ def remove_links(content):
 
     Returns: (str) content without links 
     '''
-    rv = re.sub(URL_REGEX, ' ', content)
-    rv = re.sub(POST_REF_REGEX, '\n', content)
-    
-    return rv
+    return process_content(content)[2]
+
+def process_content(content):
+    '''
+    Pull the references and URLs out of a post and clean it, extracting and
+    replacing in the same pass of each (precompiled) pattern. References are
+    replaced with a newline first, then URLs with a space.
+
+    Inputs: (str) content
+
+    Returns: tuple of (list of references, list of URLs, cleaned content).
+    '''
+    refs, urls = [], []
+
+    def strip_ref(match):
+        refs.append(match.group())
+        return '\n'
+
+    def strip_url(match):
+        urls.append(match.group())
+        return ' '
+
+    clean = URL_PATTERN.sub(strip_url, POST_REF_PATTERN.sub(strip_ref, content))
+    return refs, urls, clean
+
+def process_series(contents):
+    '''
+    process_content for a whole Series of content at once. (pandas' own .str
+    regex methods are pure Python loops too, and can't use the precompiled
+    patterns, so this is the faster way to do a whole corpus.)
+
+    Inputs: (Series of str) contents
+
+    Returns: DataFrame, on the same index, with refs, urls and clean_content
+      columns.
+    '''
+    return pd.DataFrame([process_content(content) for content in contents],
+                        columns=['refs', 'urls', 'clean_content'],
+                        index=contents.index)
+
+def remove_links_series(contents):
+    '''
+    remove_links for a whole Series of content at once.
+    '''
+    return process_series(contents)['clean_content']
 
 
 ### Presentation-ish functions
 
-# TODO: Consider making this recursive just for the lol's.
-def content_with_back_reference(post, posts):
+class BackReferencer:
+
+    def __init__(self, posts):
+        '''
+        Index a DataFrame of 4chan posts by id, so that the references in any
+        number of posts can be expanded without rescanning the DataFrame for
+        every reference.
+
+        Inputs:
+          posts (DataFrame): DataFrame containing 4chan posts, with 'id' and
+            'content' columns.
+        '''
+        ids = pd.to_numeric(posts['id'])
+        counts = ids.value_counts()
+        self.duplicates = set(counts[counts > 1].index)
+        self.index = dict(zip(ids, posts['content']))
+
+    def lookup(self, ref):
+        '''
+        Find the content of the post a reference (e.g. '>>34664894') points to.
+
+        Returns: the referenced post's content, or None if it is not in the
+          posts this BackReferencer was built from.
+        '''
+        post_id = int(ref.strip('>>'))
+        if post_id in self.duplicates:
+            raise ValueError('Posts DataFrame has duplicate entries.')
+        if post_id not in self.index:
+            warnings.warn(f'WARNING: {ref.strip(">>")} not found in posts DataFrame.')
+            return None
+        return self.index[post_id]
+
+    def expand(self, post, depth=1):
+        '''
+        Replace the reference tags in a post with a copy of the referenced post.
+        Behaves exactly like content_with_back_reference.
+
+        Inputs:
+          post (str): content of the post to be expanded upon.
+          depth (int): how many levels of references to follow; with depth 2
+            the referenced posts have their own references expanded too,
+            and so on.
+
+        Returns (str): Content of the post with all references replaced with
+          the referenced post, iff available.
+        '''
+        references = get_references(post)
+
+        found_refs = []
+        for ref in references:
+            found = self.lookup(ref)
+            if found is None:
+                found_refs.append(ref)
+            elif depth > 1:
+                found_refs.append(self.expand(str(found), depth - 1))
+            else:
+                found_refs.append(found)
+
+        for old, new in zip(references, found_refs):
+            post = re.sub(old, f"<ref>{repr(new)}</ref>\n", post)
+
+        return post
+
+    def expand_all(self, posts, depth=1):
+        '''
+        Expand the references in every post of an iterable (e.g. a Series of
+        content). Posts which aren't strings (i.e. NaN) are expanded as str(post).
+
+        Returns: list of expanded posts, in order.
+        '''
+        return [self.expand(str(post), depth) for post in posts]
+
+def content_with_back_reference(post, posts, depth=1):
     '''
     Given a post from 4chan (row from posts DataFrame), replace the reference 
     tags in the post with an actual copy of that post from the posts DataFrame.
     If the post is not in the posts DataFrame, throw a warning and return
     the initial post.
 
+    Indexing a DataFrame takes a pass over all of it, so to expand many
+    posts (e.g. with Series.apply), index it once with BackReferencer and
+    pass that in as posts instead. Posts without references are returned
+    as they are, without touching posts at all.
+
     Inputs:
       post (str): content of the post to be expanded upon.
-      posts (DataFrame): DataFrame containing 4chan posts to weed through.
+      posts (DataFrame or BackReferencer): 4chan posts to weed through.
+      depth (int): levels of references to follow; see BackReferencer.expand.
 
     Returns (str): Content of the post to be expanded upon with all instances
       of prior posts reference replaced with the referenced post, iff available.
     '''
-    # Find references
-    references = get_references(post)
-    
-    # Find the referenced posts
-    found_refs = []
-    content_col = posts.columns.tolist().index('content')
-    for ref in references:
-        matches = posts['id'] == int(ref.strip('>>'))     
-        if sum(matches) == 1:
-            # index of the content row
-            # anything else returns a Series, for some reason
-            mtch = posts[matches].iloc[0, content_col]
-            found_refs.append(mtch)
-        elif sum(matches) == 0:
-            warnings.warn(f'WARNING: {ref.strip(">>")} not found in posts DataFrame.')
-            found_refs.append(ref)
-        elif sum(matches) >= 1:
-            raise ValueError('Posts DataFrame has duplicate entries.')
-
-    # Replace references
-    for old, new in zip(references, found_refs):
-        post = re.sub(old, f"<ref>{repr(new)}</ref>\n", post)
-
-    return post
+    if POST_REF_PATTERN.search(post) is None:
+        return post
+    if not isinstance(posts, BackReferencer):
+        posts = BackReferencer(posts)
+    return posts.expand(post, depth)
 
 def standardize_date(date):
     '''
@@ -92,35 +229,63 @@ def standardize_date(date):
     #return f"{m.rjust(2, '0')}/{d.rjust(2, '0')}/{y[-2:]}"
 
 
+def parse_datetime(dates, times):
+    '''
+    Parse scraped dates (MM/DD/YY or M/D/YYYY) and times (HH:MM:SS) into
+    timestamps, all at once. Unparseable ones become NaT.
+
+    A board only spans a handful of days, so each distinct date is parsed
+    once and the times added on as offsets.
+
+    Inputs:
+      dates, times (Series of str): date and time of each post.
+
+    Returns: datetime64 Series.
+    '''
+    codes, distinct = pd.factorize(dates, use_na_sentinel=False)
+    distinct = pd.Series(distinct, dtype=object).astype(str)\
+        .str.replace(SHORT_YEAR_PATTERN, r'/20\1', regex=True)
+    days = pd.to_datetime(distinct, format=DATE_FORMAT, errors='coerce').to_numpy()
+    offsets = pd.to_timedelta(times.astype(str), errors='coerce').to_numpy()
+    return pd.Series(days[codes] + offsets, index=dates.index)
+
 def make_datetime(posts):
     '''
     Given a set of 4chan posts, fix the dates.
 
     Assumes that date is stored in "date" and time in "time", following
-    the %m/%d/%y and %H:%M:%S formats, respectively.
+    the %m/%d/%y (or %m/%d/%Y) and %H:%M:%S formats, respectively.
     
-    Returns: datetime column for posts.
+    Returns: datetime64 column for posts.
     '''
-    datetime = posts['date'].apply(standardize_date) + ' ' + posts['time']
-    
-    datetime.apply(lambda x: pd.to_datetime(x, format='%Y-%m-%d %H:%M:%S'))
-    return datetime    
+    return parse_datetime(posts['date'], posts['time'])
 
-def label_heads(posts):
+def add_datetime(posts):
     '''
-    Returns a column with 1 for the head posts and 0 for replies.
+    Set the datetime column of freshly scraped posts from their date and
+    time, so they are stored with real timestamps from the start.
+
+    Returns: posts.
     '''
-    is_head = []
+    posts['datetime'] = make_datetime(posts)
+    return posts
 
-    threads = set()
-    for _, post in posts.iterrows():
-        if post['subject'] in threads:
-            is_head.append(0)
-        else:
-            threads.add(post['subject'])
-            is_head.append(1)
+def thread_column(posts):
+    '''
+    Column to tell posts' threads apart by: 'thread' (the OP's post number)
+    when every post has one, otherwise 'subject', for archives scraped
+    before thread numbers were recorded. Subjects are not unique, so
+    threads sharing one get merged.
+    '''
+    if 'thread' in posts and posts['thread'].notna().all():
+        return 'thread'
+    return 'subject'
 
-    return is_head
+def label_heads(posts):
+    '''
+    Returns a column with 1 for the head posts and 0 for replies.
+    '''
+    return (~posts[thread_column(posts)].duplicated()).astype(int).tolist()
     
 
 class NetworkChan:
@@ -130,57 +295,104 @@ class NetworkChan:
         Creates a network view of all thread in posts.
         '''
         self.posts = posts
+        self.posts['id'] = pd.to_numeric(self.posts['id']).astype(np.int64)
+        self.thread_column = thread_column(self.posts)
+        if self.thread_column == 'thread':
+            self.posts['thread'] = pd.to_numeric(self.posts['thread']).astype(np.int64)
         self.posts['datetime'] = make_datetime(self.posts)
-        self.posts = self.posts.sort_values(['subject', 'datetime']).reset_index(drop=True)
+        self.posts = self.posts.sort_values([self.thread_column, 'datetime']).reset_index(drop=True)
         self.posts['is_head'] = label_heads(self.posts)
 
         
-    def make_graphs(self):
+    def make_graphs(self, compact=False):
         '''
         Actually make the graphs this class is here to get.
+
+        With compact, rather than a networkx graph per thread, only make
+        self.edges (edge list of the whole board; see edge_list) and
+        self.adjacency (see adjacency_matrix).
         '''
-        self.graphs = self.__build_networks()
+        if compact:
+            self.edges = self.edge_list()
+            self.adjacency = self.adjacency_matrix()
+        else:
+            self.graphs = self.__build_networks()
 
+    def reply_edges(self):
+        '''
+        Every reply on the board, found in a single pass over the posts
+        (which are sorted by thread). A reply links to every post earlier
+        in its thread it references, or to the thread's head if it
+        references none of them.
+
+        Returns: (sources, targets, post_offsets, edge_offsets). sources
+          and targets are int arrays of row numbers in self.posts. Thread i
+          is made of posts post_offsets[i]:post_offsets[i + 1], and its
+          replies are edges edge_offsets[i]:edge_offsets[i + 1].
+        '''
+        if not hasattr(self, '_reply_edges'):
+            ids = self.posts['id'].tolist()
+            refs = reference_ids(self.posts['content'])
+            post_offsets = np.append(np.flatnonzero(self.posts['is_head'].to_numpy()), len(ids))
+
+            sources, targets, edge_offsets = [], [], [0]
+            for start, end in zip(post_offsets[:-1].tolist(), post_offsets[1:].tolist()):
+                seen = {ids[start]: start}
+                for row in range(start + 1, end):
+                    seen.setdefault(ids[row], row)
+                    found = [seen[ref] for ref in dict.fromkeys(refs[row]) if ref in seen]
+                    if not found:
+                        found = [start]
+                    sources.extend([row] * len(found))
+                    targets.extend(found)
+                edge_offsets.append(len(sources))
+
+            self._reply_edges = (np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64),
+                                 post_offsets, np.array(edge_offsets, dtype=np.int64))
+        return self._reply_edges
+
+    def edge_list(self):
+        '''
+        Returns: DataFrame with one row per reply on the board: the source
+          (replying) post id, the target post id, and the thread (its OP's
+          number, or its subject; see thread_column).
+        '''
+        sources, targets, _, _ = self.reply_edges()
+        return pd.DataFrame({'source': self.posts['id'].to_numpy()[sources],
+                             'target': self.posts['id'].to_numpy()[targets],
+                             self.thread_column: self.posts[self.thread_column].to_numpy()[sources]})
+
+    def adjacency_matrix(self):
+        '''
+        Returns: CSR matrix of the replies on the board, with a 1 at (i, j)
+          if the post in row i of self.posts replies to the one in row j.
+        '''
+        sources, targets, _, _ = self.reply_edges()
+        return scipy.sparse.csr_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)),
+                                       shape=(len(self.posts), len(self.posts)))
 
     def __make_network_from_thread(self, thread):
         '''
         Given a specific thread, make a network from that thread.
         
-        Takes in a set of posts from the same thread, returns a  
+        Takes in the number of a thread (in order of thread_column), returns a
+        networkx DiGraph of its replies.
         '''
-        graph = nx.DiGraph()
-
-        head = None
-        for _, post in thread.iterrows():
-            graph.add_node(post['id'])
-
-            if post['is_head']:
-                head = post['id']
-                continue
-            
-            references = get_references(str(post['content']))
+        sources, targets, post_offsets, edge_offsets = self.reply_edges()
+        ids = self.posts['id']
+        edges = slice(edge_offsets[thread], edge_offsets[thread + 1])
 
-            makes_reference = any([(int(ref.strip('>>')) in graph.nodes)\
-                                   for ref in references])
-
-            if not makes_reference:
-                graph.add_edge(post['id'], head)
-                continue
-
-            for ref in references:
-                if int(ref.strip('>>')) in graph.nodes:
-                    graph.add_edge(post['id'], int(ref.strip('>>')))
-        
+        graph = nx.DiGraph()
+        graph.add_nodes_from(ids.iloc[post_offsets[thread]:post_offsets[thread + 1]].tolist())
+        graph.add_edges_from(zip(ids.iloc[sources[edges]].tolist(), ids.iloc[targets[edges]].tolist()))
         return graph
 
     def __build_networks(self):
         '''
         Build a graph for every thread
         '''
-        threads = [self.posts[self.posts['subject'] == thread]\
-                   for thread in self.posts['subject'].unique()]
-
-        graphs = [self.__make_network_from_thread(thread) for thread in threads]
+        _, _, post_offsets, _ = self.reply_edges()
+        graphs = [self.__make_network_from_thread(thread) for thread in range(len(post_offsets) - 1)]
         
         return graphs
 
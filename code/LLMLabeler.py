@@ -0,0 +1,369 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Labels posts with a chat completions model: OpenAI's API, or
+###        anything that speaks the same protocol (e.g. FakeLLM, for running
+###        offline). Labeling the whole dataset one blocking request at a
+###        time ran into rate limits; this instead:
+###          - streams posts through in batches, with many requests in
+###            flight at once over aiohttp;
+###          - keeps under requests and tokens per minute budgets, so the
+###            API has no reason to refuse us, and backs off and retries
+###            when it does anyway;
+###          - caches every response on disk, keyed on a hash of the exact
+###            prompt, so a rerun (or a crash halfway) never pays for the
+###            same prompt twice;
+###          - writes labels to a CSV as each batch comes back.
+
+from PostStore import iter_posts
+from TokenCache import text_hash
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import GPTHelper
+import HelperChan
+import pandas as pd
+import warnings
+import aiohttp
+import asyncio
+import logging
+import sqlite3
+import json
+import time
+import os
+
+API_URL = 'https://api.openai.com/v1'
+MODEL = 'gpt-3.5-turbo-0125'
+CACHE_PATH = '../data/llm_cache.sqlite'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    prompt_hash TEXT PRIMARY KEY,
+    response TEXT NOT NULL
+)
+'''
+# SQLite caps the number of ? parameters in a query.
+CHUNK = 900
+
+
+def estimate_tokens(messages, max_tokens=1):
+    '''
+    Rough number of tokens a request will count for against a tokens per
+    minute budget: about 4 characters a token of prompt, plus the answer.
+    '''
+    return sum(len(str(message['content'])) // 4 + 4 for message in messages) + max_tokens
+
+def retry_after(value, default):
+    '''
+    Seconds to wait, from a Retry-After header: either a number of seconds
+    or an HTTP date. Returns default if there is no (readable) header.
+    '''
+    if value is None:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+def prompt_hash(payload):
+    '''
+    Hash of everything that determines a response: model, messages and
+    sampling parameters.
+    '''
+    return text_hash(json.dumps(payload, sort_keys=True))
+
+
+class MinuteBudget:
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, burst=1.0):
+        '''
+        Token bucket pacing requests so that neither requests per minute
+        nor tokens per minute go over budget. None means unlimited.
+
+        Inputs:
+          requests_per_minute, tokens_per_minute (int): budgets.
+          burst (float): seconds' worth of budget that may be spent at once.
+        '''
+        self.rates = {name: limit / 60 for name, limit in
+                      [('requests', requests_per_minute), ('tokens', tokens_per_minute)] if limit}
+        self.capacity = {name: rate * max(burst, 1) for name, rate in self.rates.items()}
+        self.available = dict(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        for name, rate in self.rates.items():
+            self.available[name] = min(self.capacity[name],
+                                       self.available[name] + (now - self.updated) * rate)
+        self.updated = now
+
+    async def acquire(self, tokens):
+        '''
+        Wait until a request of (about) tokens tokens fits in the budget,
+        and spend it.
+        '''
+        need = {'requests': 1, 'tokens': tokens}
+        async with self.lock:
+            while True:
+                self._refill()
+                # A request bigger than the bucket waits for a full bucket.
+                short = max([(min(need[name], self.capacity[name]) - self.available[name]) / rate
+                             for name, rate in self.rates.items()] + [0])
+                if short <= 0:
+                    for name in self.rates:
+                        self.available[name] -= need[name]
+                    return
+                await asyncio.sleep(short)
+
+
+class ResponseCache:
+
+    def __init__(self, path):
+        '''
+        Opens (creating if need be) the on-disk response cache at path.
+        '''
+        self.path = path
+        self.hits, self.misses = 0, 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    def lookup(self, hashes):
+        '''
+        Returns: dict mapping prompt hash to cached response, for those cached.
+        '''
+        found = {}
+        hashes = list(dict.fromkeys(hashes))
+        for start in range(0, len(hashes), CHUNK):
+            chunk = hashes[start:start + CHUNK]
+            found.update(self.conn.execute(
+                f'SELECT prompt_hash, response FROM responses '
+                f'WHERE prompt_hash IN ({", ".join("?" * len(chunk))})', chunk))
+        return found
+
+    def store(self, responses):
+        '''
+        Save responses, a dict mapping prompt hash to response.
+        '''
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO responses VALUES (?, ?)', responses.items())
+
+    def close(self):
+        self.conn.close()
+
+
+class LabelClient:
+
+    def __init__(self, api_url=API_URL, api_key=None, model=MODEL, cache=None,
+                 requests_per_minute=500, tokens_per_minute=60000, concurrency=16,
+                 max_tokens=1, retries=5, backoff=1.0, timeout=60):
+        '''
+        Inputs:
+          api_url (str): root of the API, e.g. FakeLLM's url.
+          api_key (str): API key; defaults to $OPENAI_API_KEY.
+          model (str): model to ask, e.g. a fine-tuned one.
+          cache (ResponseCache): responses to reuse and to save new ones to.
+          requests_per_minute, tokens_per_minute (int): budgets to keep
+            under; see MinuteBudget.
+          concurrency (int): most requests in flight at once.
+          max_tokens (int): longest answer allowed ("Yes" / "No" is one).
+          retries (int): how many times to retry a request before giving up.
+          backoff (float): seconds to wait before the first retry, doubling
+            after each (unless the API says how long with Retry-After).
+          timeout (float): total seconds allowed per request.
+        '''
+        self.url = f'{api_url.rstrip("/")}/chat/completions'
+        self.api_key = api_key if api_key is not None else os.environ.get('OPENAI_API_KEY', '')
+        self.model = model
+        self.cache = cache
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.concurrency = concurrency
+        self.max_tokens = max_tokens
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.requests = 0
+
+    def payload(self, messages):
+        return {'model': self.model, 'messages': messages,
+                'max_tokens': self.max_tokens, 'temperature': 0}
+
+    async def complete(self, session, payload, budget, slots):
+        '''
+        Make one request, retrying on connection trouble and on the
+        statuses the API hands out when rate limited or overloaded.
+
+        Returns: the model's answer.
+        '''
+        tokens = estimate_tokens(payload['messages'], self.max_tokens)
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * 2 ** attempt
+            await budget.acquire(tokens)
+            try:
+                async with slots, session.post(self.url, json=payload) as resp:
+                    self.requests += 1
+                    if resp.status in RETRY_STATUSES and attempt < self.retries:
+                        delay = retry_after(resp.headers.get('Retry-After'), delay)
+                        logging.warning(f'Got {resp.status} from {self.url}, retrying in {delay:.1f}s...')
+                    else:
+                        resp.raise_for_status()
+                        body = await resp.json()
+                        return body['choices'][0]['message']['content']
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+                if attempt == self.retries:
+                    raise
+                logging.warning(f'{type(err).__name__} on {self.url}, retrying...')
+            await asyncio.sleep(delay)
+
+    async def stream(self, prompts, batch_size=200):
+        '''
+        Ask the model about every prompt, a batch at a time, taking cached
+        answers from the cache and caching new ones.
+
+        Inputs:
+          prompts (iterable): chat messages per prompt, e.g. from
+            GPTHelper.prompt_messages. Consumed a batch at a time, so it can
+            be a generator over more prompts than fit in memory.
+          batch_size (int): prompts per batch.
+
+        Yields: list of answers per batch of prompts, in order.
+        '''
+        budget = MinuteBudget(self.requests_per_minute, self.tokens_per_minute)
+        slots = asyncio.Semaphore(self.concurrency)
+        headers = {'Authorization': f'Bearer {self.api_key}'} if self.api_key else {}
+        async with aiohttp.ClientSession(headers=headers,
+                                         timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+            batch = []
+            for messages in prompts:
+                batch.append(self.payload(messages))
+                if len(batch) == batch_size:
+                    yield await self._answer(session, batch, budget, slots)
+                    batch = []
+            if batch:
+                yield await self._answer(session, batch, budget, slots)
+
+    async def _complete_and_cache(self, session, key, payload, budget, slots):
+        '''
+        complete, caching the answer as soon as it comes back, so that it is
+        kept even if another request in its batch fails.
+        '''
+        answer = await self.complete(session, payload, budget, slots)
+        if self.cache is not None:
+            self.cache.store({key: answer})
+        return answer
+
+    async def _answer(self, session, payloads, budget, slots):
+        hashes = [prompt_hash(payload) for payload in payloads]
+        found = self.cache.lookup(hashes) if self.cache is not None else {}
+        missing = {key: payload for key, payload in zip(hashes, payloads) if key not in found}
+        # Let every request finish (and be cached) before giving up on the
+        # batch over one that failed.
+        answers = await asyncio.gather(*[self._complete_and_cache(session, key, payload, budget, slots)
+                                         for key, payload in missing.items()],
+                                       return_exceptions=True)
+        if self.cache is not None:
+            self.cache.hits += len(payloads) - len(missing)
+            self.cache.misses += len(missing)
+        failed = [answer for answer in answers if isinstance(answer, BaseException)]
+        if failed:
+            logging.error(f'{len(failed)} of {len(missing)} requests failed; '
+                          f'the answers that came back are cached.')
+            raise failed[0]
+        found.update(zip(missing, answers))
+        return [found[key] for key in hashes]
+
+
+def post_prompts(chunk, backref_depth=0, system_role=None):
+    '''
+    Prompts for a chunk of posts, with references expanded (among the posts
+    in the chunk) if backref_depth is positive.
+    '''
+    contents = chunk['content'].map(str)
+    if backref_depth:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            contents = HelperChan.BackReferencer(chunk).expand_all(contents, backref_depth)
+    return [GPTHelper.prompt_messages(content, system_role) for content in contents]
+
+async def label_sources(client, sources, out, chunksize=1000, backref_depth=0):
+    '''
+    Label every post in some CSVs / PostStores, writing id, the model's
+    answer and the classification it means for each to the CSV out as
+    each batch comes back. Posts already in out are skipped, so an
+    interrupted run picks up where it stopped.
+
+    Returns: number of posts labeled.
+    '''
+    done = set(pd.read_csv(out, usecols=['id'])['id'].tolist()) if os.path.exists(out) else set()
+    ids = deque()
+
+    def prompts():
+        for source in sources:
+            for chunk in iter_posts(source, chunksize, ['id', 'content']):
+                chunk = chunk[~chunk['id'].isin(done)]
+                ids.extend(chunk['id'].tolist())
+                yield from post_prompts(chunk, backref_depth)
+
+    labeled = 0
+    async for answers in client.stream(prompts(), chunksize):
+        pd.DataFrame({'id': [ids.popleft() for _ in answers],
+                      'response': answers,
+                      'classification': pd.array([GPTHelper.parse_answer(a) for a in answers],
+                                                 dtype='Int64')})\
+            .to_csv(out, mode='a', header=not os.path.exists(out), index=False)
+        labeled += len(answers)
+        logging.info(f'Labeled {labeled} posts ({client.requests} requests made).')
+    return labeled
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Label posts (or write fine-tuning examples) for a chat model.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    label = commands.add_parser('label', help='label CSVs / PostStores of posts.')
+    label.add_argument('posts', nargs='+', help='CSVs / PostStores of posts to label.')
+    label.add_argument('--out', default='../data/llm_labels.csv',
+                       help='CSV to append id, response and classification to.')
+    label.add_argument('--api-url', default=API_URL,
+                       help='root of the API, e.g. a FakeLLM url.')
+    label.add_argument('--model', default=MODEL)
+    label.add_argument('--rpm', type=int, default=500, help='requests per minute budget.')
+    label.add_argument('--tpm', type=int, default=60000, help='tokens per minute budget.')
+    label.add_argument('--concurrency', type=int, default=16, help='most requests in flight.')
+    label.add_argument('--chunksize', type=int, default=1000, help='posts read (and asked about) at a time.')
+    label.add_argument('--backref-depth', type=int, default=0,
+                       help='levels of references to expand into each prompt.')
+    label.add_argument('--cache', default=CACHE_PATH, help='response cache file.')
+
+    examples = commands.add_parser('examples', help='write fine-tuning examples from labeled posts.')
+    examples.add_argument('labels', nargs='+', help='CSVs of labeled posts (with a classification column).')
+    examples.add_argument('--out', default='../data/fine_tuning/output.jsonl')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)-15s %(levelname)-8s %(message)s')
+    if args.command == 'label':
+        cache = ResponseCache(args.cache)
+        client = LabelClient(args.api_url, model=args.model, cache=cache,
+                             requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                             concurrency=args.concurrency)
+        labeled = asyncio.run(label_sources(client, args.posts, args.out, args.chunksize,
+                                            args.backref_depth))
+        print(f'Labeled {labeled} posts with {client.requests} requests '
+              f'({cache.hits} answers from the cache).')
+        cache.close()
+    else:
+        posts = pd.concat([pd.read_csv(path, usecols=['content', 'classification'])
+                           for path in args.labels], ignore_index=True)
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        print(f'Wrote {GPTHelper.write_example_messages(posts, args.out)} examples to {args.out}.')
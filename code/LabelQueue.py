@@ -0,0 +1,247 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Active learning for l4beler. Rather than labeling a uniform sample
+###        of a week's posts (mostly easy negatives), posts are queued up
+###        most uncertain first, by the classifier's probabilities over the
+###        docvecs: the ones it can least tell apart are the ones a label
+###        teaches it the most about.
+###        The queue is built once, ahead of time. A labeling session then
+###        only reads the queue and fetches the next few posts (and the
+###        posts they reference, for context) by id, so it starts instantly,
+###        and every label is appended to a CSV as it is given, so a session
+###        can be stopped at any point and picked up again later.
+
+from PostStore import PostStore, is_store, load_posts
+import HelperChan
+import pandas as pd
+import numpy as np
+import warnings
+import os
+
+QUEUE_PATH = '../data/label_queue.npz'
+LABELS_PATH = '../data/active_labels.csv'
+
+
+def uncertainty(probabilities):
+    '''
+    How unsure the classifier is of each post: 1 at a probability of .5,
+    down to 0 at probabilities of 0 or 1.
+    '''
+    return 1 - np.abs(2 * np.asarray(probabilities, dtype=np.float64) - 1)
+
+def rank_queue(ids, probabilities, labeled=()):
+    '''
+    Order posts most uncertain first, leaving out those already labeled.
+
+    Returns: (ids, probabilities) arrays.
+    '''
+    ids = np.asarray(ids, dtype=np.int64)
+    probabilities = np.asarray(probabilities)
+    keep = ~np.isin(ids, np.fromiter(labeled, dtype=np.int64))
+    ids, probabilities = ids[keep], probabilities[keep]
+    order = np.argsort(-uncertainty(probabilities), kind='stable')
+    return ids[order], probabilities[order]
+
+def build_queue(ensemble, ids, vectors, labeled=(), batch_size=50000):
+    '''
+    Rank every unlabeled post by how uncertain the classifier is of it.
+
+    Inputs:
+      ensemble: fitted classifier over docvecs, with predict_proba and classes_.
+      ids (array of int): post id of each row of vectors.
+      vectors (2d array): docvecs, e.g. from VectorStore.load_vectors (read
+        batch_size rows at a time, so a memory map is fine).
+      labeled (iterable of int): ids of posts already labeled, left out.
+      batch_size (int): rows scored at once.
+
+    Returns: (ids, probabilities) arrays, most uncertain post first.
+    '''
+    positive = list(ensemble.classes_).index(1)
+    probabilities = np.concatenate(
+        [ensemble.predict_proba(np.asarray(vectors[i:i + batch_size], dtype=np.float32))[:, positive]
+         for i in range(0, len(ids), batch_size)]) if len(ids) else np.zeros(0)
+    return rank_queue(ids, probabilities, labeled)
+
+def save_queue(path, ids, probabilities):
+    '''
+    Save a queue from build_queue, e.g. to '../data/label_queue.npz'.
+    '''
+    np.savez(path, ids=np.asarray(ids, dtype=np.int64),
+             probabilities=np.asarray(probabilities, dtype=np.float32))
+
+def load_queue(path):
+    '''
+    Load a queue saved with save_queue.
+
+    Returns: (ids, probabilities) arrays.
+    '''
+    with np.load(path) as archive:
+        return archive['ids'], archive['probabilities']
+
+def labeled_ids(paths):
+    '''
+    Ids of the posts in some label CSVs (those that exist).
+    '''
+    found = set()
+    for path in paths:
+        if os.path.exists(path):
+            found.update(pd.read_csv(path, usecols=['id'])['id'].astype(np.int64).tolist())
+    return found
+
+
+class ContextFetcher:
+
+    def __init__(self, source):
+        '''
+        Look posts up by id, along with the posts they reference, so they
+        can be shown with context as l4beler does. A PostStore is looked up
+        through its id index; a CSV has to be read in (once) and indexed.
+
+        Inputs:
+          source (str): path of a PostStore or of a CSV of posts.
+        '''
+        if is_store(source):
+            self.store = PostStore(source)
+            self.posts = None
+        else:
+            self.store = None
+            posts = load_posts(source)
+            posts['id'] = pd.to_numeric(posts['id']).astype(np.int64)
+            self.posts = posts.drop_duplicates('id').set_index('id', drop=False)
+
+    def lookup(self, ids):
+        '''
+        Returns: DataFrame of the posts with these ids that exist, indexed by id.
+        '''
+        if self.store is not None:
+            return self.store.lookup(ids).set_index('id', drop=False)
+        return self.posts.loc[self.posts.index.intersection(pd.Index(ids, dtype=np.int64))]
+
+    def fetch(self, ids, depth=1):
+        '''
+        Fetch posts and the content they reference, in one lookup per
+        level of references.
+
+        Inputs:
+          ids (list of int): posts to fetch.
+          depth (int): levels of references to follow; see
+            HelperChan.BackReferencer.expand.
+
+        Returns: (posts, contexts): DataFrame of the posts found, indexed by
+          id, and a dict from their ids to their back-referenced content.
+        '''
+        posts = self.lookup(ids)
+        known = posts
+        wanted = set(posts.index)
+        for _ in range(depth):
+            refs = set(ref for refs in HelperChan.reference_ids(known['content'].map(str))
+                       for ref in refs) - wanted
+            if not refs:
+                break
+            wanted |= refs
+            known = pd.concat([known, self.lookup(sorted(refs))])
+
+        referencer = HelperChan.BackReferencer(known)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            contexts = {post_id: referencer.expand(str(content), depth)
+                        for post_id, content in zip(posts.index, posts['content'])}
+        return posts, contexts
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+
+class LabelSession:
+
+    def __init__(self, source, queue=QUEUE_PATH, labels=LABELS_PATH, prefetch=20, depth=1):
+        '''
+        Hand out queued posts for labeling and save labels as they come in.
+        Posts already in the labels CSV (from an earlier session) are
+        skipped, so a session resumes wherever the last one stopped.
+
+        Inputs:
+          source (str): PostStore or CSV the queued posts are in.
+          queue (str): queue saved with save_queue.
+          labels (str): CSV labels are appended to.
+          prefetch (int): posts (and their context) fetched at a time.
+          depth (int): levels of references to show as context.
+        '''
+        self.fetcher = ContextFetcher(source)
+        self.ids, self.probabilities = load_queue(queue)
+        self.labels = labels
+        self.prefetch = prefetch
+        self.depth = depth
+        self.done = labeled_ids([labels])
+        self.count = len(self.done)
+
+    def __iter__(self):
+        '''
+        Yields: (post, probability, context) for each unlabeled queued post,
+          most uncertain first. post is a Series of the post's columns.
+        '''
+        todo = ~np.isin(self.ids, np.fromiter(self.done, dtype=np.int64))
+        ids, probabilities = self.ids[todo], self.probabilities[todo]
+        for start in range(0, len(ids), self.prefetch):
+            batch = ids[start:start + self.prefetch].tolist()
+            posts, contexts = self.fetcher.fetch(batch, self.depth)
+            for post_id, probability in zip(batch, probabilities[start:start + self.prefetch]):
+                # Labeled since the batch was fetched, or missing from the source.
+                if post_id in self.done or post_id not in contexts:
+                    continue
+                yield posts.loc[post_id], float(probability), contexts[post_id]
+
+    def record(self, post, probability, label):
+        '''
+        Append a label for post to the labels CSV straight away. Rows are
+        written with an index, like the other label CSVs.
+        '''
+        row = post.to_frame().T.assign(probability=probability, classification=int(label))
+        row.index = [self.count]
+        row.to_csv(self.labels, mode='a', header=not os.path.exists(self.labels))
+        self.done.add(int(post['id']))
+        self.count += 1
+
+    def close(self):
+        self.fetcher.close()
+
+def make_queue(model, vectors_path='../data/docvecs.npy', out=QUEUE_PATH, labeled=()):
+    '''
+    Build the queue from a model artifact and saved docvecs, and save it.
+
+    Inputs:
+      model (str): model artifact directory (see Scorer).
+      vectors_path (str): docvecs of the posts to queue, saved by embedder.
+      out (str): where to save the queue.
+      labeled (list of str): label CSVs whose posts are left out of the queue.
+
+    Returns: (ids, probabilities) arrays, as saved.
+    '''
+    from Scorer import load_artifact
+    from VectorStore import load_vectors
+
+    ids, vectors = load_vectors(vectors_path)
+    ids, probabilities = build_queue(load_artifact(model).ensemble, ids, vectors,
+                                     labeled_ids(labeled))
+    save_queue(out, ids, probabilities)
+    print(f'Queued {len(ids)} posts; the first 100 have probabilities between '
+          f'{probabilities[:100].min(initial=.5):.3f} and {probabilities[:100].max(initial=.5):.3f}.')
+    return ids, probabilities
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build the active learning queue l4beler labels from.')
+    parser.add_argument('model', help='model artifact directory (see Scorer).')
+    parser.add_argument('--vectors', default='../data/docvecs.npy',
+                        help='docvecs of the posts to queue, saved by embedder.')
+    parser.add_argument('--out', default=QUEUE_PATH, help='where to save the queue.')
+    parser.add_argument('--labeled', nargs='*',
+                        default=['../data/first_pass_labels.csv', '../data/lgbt_week_2_classified.csv',
+                                 '../data/lgbt_week_3_classified.csv', LABELS_PATH],
+                        help='label CSVs whose posts are left out of the queue.')
+    args = parser.parse_args()
+
+    make_queue(args.model, args.vectors, args.out, args.labeled)
@@ -0,0 +1,372 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: One entry point for the whole pipeline: scrape -> clean -> embed ->
+###        classify, along with the reply graph, ANN index and label queue
+###        built off of them. Each stage declares the files it reads and
+###        writes. Before a stage runs, its inputs are fingerprinted by
+###        content and its settings by value; if neither changed since it
+###        last ran, and its outputs are still the ones it wrote, it is
+###        skipped. Stages whose inputs are ready run at the same time, in
+###        separate processes, so e.g. the reply graph is built while the
+###        corpus is tokenized.
+###        Fingerprints are kept in a JSON manifest next to the data. File
+###        hashes are remembered along with the file's size and modification
+###        time, so checking an unchanged archive costs a stat, not a read.
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from TokenCache import config_hash
+import importlib
+import hashlib
+import logging
+import json
+import time
+import os
+
+MANIFEST_PATH = '../data/pipeline.json'
+BLOCK_SIZE = 1 << 20
+
+
+def companions(path):
+    '''
+    Every file that makes up the artifact at path: the file itself, any
+    files saved alongside it under its name (gensim saves a model's big
+    arrays as path.*.npy), or everything under it if it is a directory.
+
+    Returns: sorted list of file paths.
+    '''
+    if os.path.isdir(path):
+        return sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+    directory, name = os.path.split(path)
+    found = [path] if os.path.isfile(path) else []
+    if os.path.isdir(directory or '.'):
+        found += [os.path.join(directory, other) for other in os.listdir(directory or '.')
+                  if other.startswith(name + '.')]
+    return sorted(found)
+
+
+class FileHasher:
+
+    def __init__(self, known=None):
+        '''
+        Hashes files by content, remembering each hash with the size and
+        modification time it was taken at, so unchanged files are not read
+        again.
+
+        Inputs:
+          known (dict): path -> [size, mtime_ns, hash], as in self.known
+            after an earlier run.
+        '''
+        self.known = dict(known or {})
+        self.read = 0
+
+    def file_hash(self, path):
+        '''
+        Returns: hash of the file's contents.
+        '''
+        stat = os.stat(path)
+        size, mtime, digest = self.known.get(path, (None, None, None))
+        if (size, mtime) == (stat.st_size, stat.st_mtime_ns):
+            return digest
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+                hasher.update(block)
+        self.read += stat.st_size
+        self.known[path] = [stat.st_size, stat.st_mtime_ns, hasher.hexdigest()]
+        return self.known[path][2]
+
+    def fingerprint(self, path):
+        '''
+        Returns: hash of everything making up the artifact at path (see
+          companions), or None if there is nothing there.
+        '''
+        files = companions(path)
+        if not files:
+            return None
+        if files == [path]:
+            return self.file_hash(path)
+        return config_hash({os.path.relpath(name, path if os.path.isdir(path) else os.path.dirname(path)):
+                            self.file_hash(name) for name in files})
+
+
+class Stage:
+
+    def __init__(self, name, run, kwargs=None, inputs=(), outputs=(), untracked=(), always=False):
+        '''
+        A step of the pipeline.
+
+        Inputs:
+          name (str): name of the stage.
+          run (str): 'module:function' to call, in a worker process, with
+            kwargs. Named rather than passed so that the pipeline does not
+            import every stage's dependencies (spaCy, gensim, ...) itself.
+          kwargs (dict): keyword arguments of run.
+          inputs (list of str): files (or directories) the stage reads.
+          outputs (list of str): files (or directories) the stage writes.
+          untracked (list of str): kwargs that change how a stage runs but
+            not what it makes (e.g. worker counts), left out of its fingerprint.
+          always (bool): run the stage every time, e.g. scraping, whose
+            input is the board itself.
+        '''
+        self.name = name
+        self.run = run
+        self.kwargs = dict(kwargs or {})
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.untracked = set(untracked)
+        self.always = always
+
+    def fingerprint(self, hasher):
+        '''
+        Hash of the stage's settings and the contents of its inputs.
+        '''
+        return config_hash({'run': self.run,
+                            'kwargs': {key: value for key, value in self.kwargs.items()
+                                       if key not in self.untracked},
+                            'inputs': {path: hasher.fingerprint(path) for path in self.inputs}})
+
+    def outputs_fingerprint(self, hasher):
+        return {path: hasher.fingerprint(path) for path in self.outputs}
+
+    def __repr__(self):
+        return f'Stage({self.name!r}, {self.run!r})'
+
+
+def run_stage(run, kwargs):
+    '''
+    Call a stage's function; this is what runs in the worker processes.
+    '''
+    module, function = run.split(':')
+    getattr(importlib.import_module(module), function)(**kwargs)
+
+def dependencies(stages):
+    '''
+    Returns: dict from each stage's name to the names of the stages that
+      write its inputs.
+    '''
+    writers = {path: stage.name for stage in stages for path in stage.outputs}
+    return {stage.name: {writers[path] for path in stage.inputs if path in writers} - {stage.name}
+            for stage in stages}
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {'files': {}, 'stages': {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(path, manifest):
+    # Written to the side and moved into place, so a crash mid-write
+    # cannot leave a corrupt manifest behind.
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+def run_pipeline(stages, manifest_path=MANIFEST_PATH, jobs=None, force=(), dry_run=False):
+    '''
+    Run every stage that is out of date, each as soon as the stages it
+    depends on are done, up to jobs at a time.
+
+    Inputs:
+      stages (list of Stage): the pipeline.
+      manifest_path (str): where fingerprints are kept between runs.
+      jobs (int): stages run at once; defaults to one per core.
+      force (list of str): names of stages to run even if up to date.
+      dry_run (bool): only report what would run.
+
+    Returns: dict from stage name to 'ran', 'skipped', 'failed' or
+      'blocked' (by a failed stage), or, on a dry run, 'run' or 'skip'.
+    '''
+    manifest = load_manifest(manifest_path)
+    hasher = FileHasher(manifest['files'])
+    needs = dependencies(stages)
+    pending = {stage.name: stage for stage in stages}
+    status = {}
+    running = {}
+
+    def up_to_date(stage, key):
+        record = manifest['stages'].get(stage.name)
+        return (not stage.always and stage.name not in force and record is not None
+                and record['fingerprint'] == key
+                and record['outputs'] == stage.outputs_fingerprint(hasher))
+
+    with ProcessPoolExecutor(jobs) as pool:
+        while pending or running:
+            ready = [stage for name, stage in pending.items() if needs[name] <= set(status)]
+            for stage in ready:
+                del pending[stage.name]
+                if any(status[name] in ('failed', 'blocked') for name in needs[stage.name]):
+                    status[stage.name] = 'blocked'
+                    continue
+                if dry_run:
+                    # Anything downstream of a stage that runs is assumed to change.
+                    stale = any(status[name] == 'run' for name in needs[stage.name])
+                    status[stage.name] = 'run' if stale or not up_to_date(
+                        stage, stage.fingerprint(hasher)) else 'skip'
+                    continue
+                key = stage.fingerprint(hasher)
+                if up_to_date(stage, key):
+                    logging.info(f'{stage.name}: up to date, skipped')
+                    status[stage.name] = 'skipped'
+                    continue
+                logging.info(f'{stage.name}: running')
+                running[pool.submit(run_stage, stage.run, stage.kwargs)] = (stage, key, time.time())
+            if ready:
+                continue
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, key, start = running.pop(future)
+                try:
+                    future.result()
+                except Exception:
+                    logging.exception(f'{stage.name}: failed after {time.time() - start:.1f}s')
+                    status[stage.name] = 'failed'
+                    manifest['stages'].pop(stage.name, None)
+                    continue
+                logging.info(f'{stage.name}: done in {time.time() - start:.1f}s')
+                status[stage.name] = 'ran'
+                manifest['stages'][stage.name] = {'fingerprint': key,
+                                                  'outputs': stage.outputs_fingerprint(hasher),
+                                                  'finished': time.time()}
+            if not dry_run:
+                manifest['files'] = hasher.known
+                save_manifest(manifest_path, manifest)
+
+    if not dry_run:
+        manifest['files'] = hasher.known
+        save_manifest(manifest_path, manifest)
+    return status
+
+def make_stages(posts, scrape=False, board='/lgbt/', engine='render', backend='html', state=None,
+                depth=1, n_process=1, token_cache='../data/token_cache.sqlite',
+                vector_size=100, epochs=10, workers=None, estimators=None, k=100, max_iter=10,
+                n_jobs=None, model='../models/classifier', labels=None,
+                active_labels='../data/active_labels.csv', data='../data'):
+    '''
+    The stages of the pipeline, writing to the usual files under data.
+
+    Inputs:
+      posts (list of str): CSVs / PostStores of posts. With scrape, the
+        last of them is the archive scraped into.
+      scrape (bool): whether to scrape the board first (see 4chan_scrape.scrape
+        for board, engine, backend and state).
+      depth, n_process, token_cache: see CorpusCleaner.clean_corpus.
+      vector_size, epochs, workers: see embedder.embed.
+      estimators, k, max_iter, n_jobs, labels, active_labels: see
+        SemiSupervisedClassifier.train_classifier.
+      model (str): where the classifier's model artifact is saved.
+      data (str): directory everything else is saved in.
+
+    Returns: list of Stage.
+    '''
+    path = lambda name: os.path.join(data, name)
+    tokens, preprocessed = path('tokens.npz'), path('preprocessed.csv')
+    docvecs, doc2vec = path('docvecs.npy'), path('doc2vec.model')
+    # The ids saved alongside the docvecs; see VectorStore.ids_path.
+    docvec_ids = path('docvecs.ids.npy')
+    labels = list(labels if labels is not None else [path('first_pass_labels.csv'),
+                                                     path('lgbt_week_2_classified.csv'),
+                                                     path('lgbt_week_3_classified.csv')])
+
+    stages = []
+    if scrape:
+        stages.append(Stage('scrape', '4chan_scrape:scrape',
+                            {'board': board, 'save_path': posts[-1], 'engine': engine,
+                             'backend': backend, 'state_path': state},
+                            outputs=[posts[-1]], always=True))
+    stages += [
+        Stage('clean', 'CorpusCleaner:clean_corpus',
+              {'sources': posts, 'tokens_path': tokens, 'preprocessed_path': preprocessed,
+               'depth': depth, 'n_process': n_process, 'cache_path': token_cache},
+              inputs=posts, outputs=[tokens, preprocessed],
+              untracked=['n_process', 'cache_path']),
+        Stage('reply_graph', 'ReplyGraph:build_reply_graph',
+              {'sources': posts, 'out': path('reply_graph.npz'),
+               'metrics': path('thread_metrics.csv')},
+              inputs=posts, outputs=[path('reply_graph.npz'), path('thread_metrics.csv')]),
+        Stage('embed', 'embedder:embed',
+              {'tokens_path': tokens, 'vectors_path': docvecs, 'model_path': doc2vec,
+               'vector_size': vector_size, 'epochs': epochs, 'workers': workers},
+              inputs=[tokens], outputs=[docvecs, docvec_ids, doc2vec], untracked=['workers']),
+        Stage('index', 'ANNIndex:build_index',
+              {'vectors_path': docvecs, 'index_path': path('docvecs.ivf.npz')},
+              inputs=[docvecs, docvec_ids], outputs=[path('docvecs.ivf.npz')]),
+        Stage('classify', 'SemiSupervisedClassifier:train_classifier',
+              {'label_paths': labels, 'active_labels': active_labels, 'vectors_path': docvecs,
+               'preprocessed_path': preprocessed, 'k': k, 'max_iter': max_iter,
+               'n_jobs': n_jobs, 'save': model, 'doc2vec': doc2vec,
+               **({'estimators': estimators} if estimators else {})},
+              inputs=labels + [active_labels, docvecs, docvec_ids, preprocessed, doc2vec],
+              outputs=[model], untracked=['n_jobs']),
+        Stage('queue', 'LabelQueue:make_queue',
+              {'model': model, 'vectors_path': docvecs, 'out': path('label_queue.npz'),
+               'labeled': labels + [active_labels]},
+              inputs=[model, docvecs, docvec_ids] + labels + [active_labels],
+              outputs=[path('label_queue.npz')]),
+    ]
+    return stages
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run whichever stages of the pipeline are out of date.')
+    parser.add_argument('--posts', nargs='+',
+                        default=['../data/lgbt_week_1.csv',
+                                 '../data/lgbt_week_2.csv',
+                                 '../data/lgbt_week_3.csv'],
+                        help='CSVs and/or PostStores of posts.')
+    parser.add_argument('--scrape', action='store_true',
+                        help='scrape the board in constants.txt into its archive first; '
+                             'the archive is added to --posts.')
+    parser.add_argument('--engine', choices=['render', 'async'], default='render')
+    parser.add_argument('--backend', choices=['html', 'json'], default='html')
+    parser.add_argument('--state', default=None, help='scrape state file; see 4chan_scrape.')
+    parser.add_argument('--depth', type=int, default=1, help='levels of back references to expand.')
+    parser.add_argument('--vector-size', type=int, default=100)
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--fast', action='store_true',
+                        help='classify with the scalable estimators; see SemiSupervisedClassifier.')
+    parser.add_argument('--model', default='../models/classifier',
+                        help='where to save the classifier\'s model artifact.')
+    parser.add_argument('--only', nargs='+', default=None,
+                        help='run only these stages (and whatever they need).')
+    parser.add_argument('--force', nargs='*', default=[], help='stages to run even if up to date.')
+    parser.add_argument('--jobs', type=int, default=None, help='stages run at once.')
+    parser.add_argument('--manifest', default=MANIFEST_PATH)
+    parser.add_argument('--dry-run', action='store_true', help='only list what would run.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)-15s %(levelname)-8s %(message)s')
+    posts = list(args.posts)
+    board = None
+    if args.scrape:
+        with open('constants.txt', 'r') as f:
+            board = f.readline().strip()
+            save_path = f.readline().strip()
+        posts = [path for path in posts if path != save_path] + [save_path]
+
+    estimators = None
+    if args.fast:
+        from Ensemble import FAST_ESTIMATORS
+        estimators = FAST_ESTIMATORS
+    stages = make_stages(posts, args.scrape, board, args.engine, args.backend, args.state,
+                         depth=args.depth, vector_size=args.vector_size, epochs=args.epochs,
+                         estimators=estimators, model=args.model)
+    if args.only:
+        needs = dependencies(stages)
+        wanted, todo = set(), list(args.only)
+        while todo:
+            name = todo.pop()
+            if name not in wanted:
+                wanted.add(name)
+                todo.extend(needs[name])
+        stages = [stage for stage in stages if stage.name in wanted]
+
+    status = run_pipeline(stages, args.manifest, args.jobs, args.force, args.dry_run)
+    for name, result in status.items():
+        print(f'{name:12} {result}')
+    if any(result in ('failed', 'blocked') for result in status.values()):
+        raise SystemExit(1)
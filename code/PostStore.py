@@ -0,0 +1,283 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Append-only store for scraped posts, kept in SQLite rather than one
+###        ever-growing CSV. Posts are keyed on their id, so deduplication is
+###        an index lookup at insert time and a scraping run only pays for the
+###        posts it adds, not for re-reading and re-writing the archive.
+###        Posts are also indexed on date so a week (or a day) can be pulled
+###        out without scanning everything.
+
+import HelperChan
+import pandas as pd
+import sqlite3
+import os
+
+COLUMNS = HelperChan.POST_COLUMNS
+STORE_EXTENSIONS = ('.sqlite', '.sqlite3', '.db')
+# SQLite has no datetime type; timestamps are kept as sortable text.
+STORED_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY,
+    subject TEXT,
+    thread INTEGER,
+    author TEXT,
+    date TEXT,
+    time TEXT,
+    content TEXT,
+    clean_content TEXT,
+    refs TEXT,
+    urls TEXT,
+    datetime TEXT
+);
+CREATE INDEX IF NOT EXISTS posts_date ON posts (date);
+'''
+# Made after _add_threads, since older stores lack the column until then.
+THREAD_INDEX = 'CREATE INDEX IF NOT EXISTS posts_thread ON posts (thread)'
+
+
+def is_store(path):
+    '''
+    Whether path names a PostStore (as opposed to a CSV of posts).
+    '''
+    return str(path).lower().endswith(STORE_EXTENSIONS)
+
+
+class PostStore:
+
+    def __init__(self, path):
+        '''
+        Opens (creating if need be) the post store at path.
+        '''
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self._add_datetimes()
+        self._add_threads()
+
+    def _columns(self):
+        return [row[1] for row in self.conn.execute('PRAGMA table_info(posts)')]
+
+    def _add_threads(self):
+        '''
+        Stores made before thread numbers were scraped get a thread column,
+        left empty for the posts already in them.
+        '''
+        with self.conn:
+            if 'thread' not in self._columns():
+                self.conn.execute('ALTER TABLE posts ADD COLUMN thread INTEGER')
+            self.conn.execute(THREAD_INDEX)
+
+    def _add_datetimes(self, chunksize=50000):
+        '''
+        Stores made before posts had a datetime column get one, filled in
+        from their date and time.
+        '''
+        if 'datetime' in self._columns():
+            return
+        with self.conn:
+            self.conn.execute('ALTER TABLE posts ADD COLUMN datetime TEXT')
+            chunks = pd.read_sql_query('SELECT id, date, time FROM posts', self.conn,
+                                       chunksize=chunksize)
+            for chunk in chunks:
+                stamps = HelperChan.make_datetime(chunk).dt.strftime(STORED_DATETIME_FORMAT)
+                self.conn.executemany('UPDATE posts SET datetime = ? WHERE id = ?',
+                                      zip(stamps.astype(object).where(stamps.notna(), None),
+                                          chunk['id'].tolist()))
+
+    def append(self, posts):
+        '''
+        Add posts to the store, skipping any whose id is already in it.
+
+        Inputs:
+          posts (DataFrame): posts with (at least) the columns of
+            `4chan_scrape.scrape_thread`. List columns (refs, urls) are
+            stored as their repr, just as to_csv would write them; datetime
+            is (re)derived from date and time.
+
+        Returns: number of posts actually added.
+        '''
+        rows = posts.reindex(columns=COLUMNS)
+        rows['datetime'] = HelperChan.make_datetime(rows).dt.strftime(STORED_DATETIME_FORMAT)
+        rows = rows.astype(object).where(rows.notna(), None)
+        for col in ['refs', 'urls']:
+            rows[col] = rows[col].map(lambda x: x if x is None or isinstance(x, str) else str(x))
+        rows['id'] = rows['id'].map(int)
+        rows['thread'] = rows['thread'].map(lambda x: x if x is None else int(x))
+
+        before = self.conn.total_changes
+        with self.conn:
+            self.conn.executemany(
+                f'INSERT OR IGNORE INTO posts ({", ".join(COLUMNS)}) '
+                f'VALUES ({", ".join("?" * len(COLUMNS))})',
+                rows.itertuples(index=False, name=None))
+        return self.conn.total_changes - before
+
+    def read(self, columns=None, dates=None, chunksize=None):
+        '''
+        Read posts back out of the store, in id order.
+
+        Inputs:
+          columns (list of str): columns to read; defaults to all of them.
+          dates (list of str): if given, only posts made on these dates
+            (as stored, e.g. '02/14/24') are read.
+          chunksize (int): if given, return an iterator of DataFrames of at
+            most this many posts instead of a single DataFrame.
+
+        Returns: DataFrame of posts (or iterator of them), with datetime
+          as datetime64 and thread as (nullable) integers.
+        '''
+        columns = columns or COLUMNS
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f'Unknown post columns: {sorted(unknown)}')
+
+        query = f'SELECT {", ".join(columns)} FROM posts'
+        params = []
+        if dates is not None:
+            query += f' WHERE date IN ({", ".join("?" * len(dates))})'
+            params = list(dates)
+        query += ' ORDER BY id'
+        return pd.read_sql_query(query, self.conn, params=params, chunksize=chunksize,
+                                 parse_dates={'datetime': STORED_DATETIME_FORMAT},
+                                 dtype={'thread': 'Int64'} if 'thread' in columns else None)
+
+    def lookup(self, ids, columns=None, batch_size=500):
+        '''
+        Fetch particular posts by id, through the primary key index rather
+        than reading the store.
+
+        Inputs:
+          ids (list of int): post ids to fetch.
+          columns (list of str): columns to read; defaults to all of them.
+          batch_size (int): ids per query (SQLite caps query parameters).
+
+        Returns: DataFrame of the posts found, in no particular order.
+        '''
+        columns = list(dict.fromkeys(['id'] + list(columns or COLUMNS)))
+        ids = [int(post_id) for post_id in ids]
+        chunks = [pd.read_sql_query(f'SELECT {", ".join(columns)} FROM posts '
+                                    f'WHERE id IN ({", ".join("?" * len(batch))})',
+                                    self.conn, params=batch,
+                                    parse_dates={'datetime': STORED_DATETIME_FORMAT},
+                                    dtype={'thread': 'Int64'} if 'thread' in columns else None)
+                  for batch in [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]]
+        if not chunks:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(chunks, ignore_index=True)
+
+    def ids(self):
+        '''
+        Returns: set of every post id in the store.
+        '''
+        return {row[0] for row in self.conn.execute('SELECT id FROM posts')}
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM posts').fetchone()[0]
+
+    def thread_count(self):
+        '''
+        Returns: number of distinct threads in the store (by subject, for
+          posts scraped without a thread number).
+        '''
+        return self.conn.execute('SELECT COUNT(DISTINCT COALESCE(thread, subject)) FROM posts')\
+            .fetchone()[0]
+
+    def import_csv(self, path, chunksize=50000):
+        '''
+        Load an existing CSV archive of posts into the store, a chunk at a time.
+
+        Returns: number of posts added.
+        '''
+        added = 0
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            added += self.append(chunk)
+        return added
+
+    def close(self):
+        self.conn.close()
+
+
+def _csv_columns(columns):
+    '''
+    usecols for reading columns from a CSV, tolerating ones it lacks.
+    '''
+    return (lambda column: column in columns) if columns else None
+
+def _tidy_csv_posts(posts, columns=None):
+    '''
+    Give posts read from a CSV the columns and types a PostStore returns:
+    columns older CSVs lack (e.g. thread) come back empty, datetimes are
+    parsed and thread numbers are integers.
+
+    Returns: posts.
+    '''
+    if columns:
+        posts = posts.reindex(columns=columns)
+    if 'datetime' in posts:
+        posts['datetime'] = pd.to_datetime(posts['datetime'], format=STORED_DATETIME_FORMAT,
+                                           errors='coerce')
+    if 'thread' in posts:
+        posts['thread'] = posts['thread'].astype('Int64')
+    return posts
+
+def _open_store(source):
+    '''
+    Open an existing PostStore, rather than quietly creating an empty one.
+    '''
+    if not os.path.exists(source):
+        raise FileNotFoundError(source)
+    return PostStore(source)
+
+def load_posts(source, columns=None):
+    '''
+    Read posts from either a PostStore or a CSV, so that scripts can be
+    pointed at whichever one they are given.
+
+    Inputs:
+      source (str): path of a PostStore (.sqlite/.db) or of a CSV of posts.
+      columns (list of str): columns to read; defaults to all of them.
+
+    Returns: DataFrame of posts.
+    '''
+    if is_store(source):
+        store = _open_store(source)
+        try:
+            return store.read(columns)
+        finally:
+            store.close()
+
+    return _tidy_csv_posts(pd.read_csv(source, usecols=_csv_columns(columns)), columns)
+
+def iter_posts(source, chunksize, columns=None):
+    '''
+    Read posts from either a PostStore or a CSV a chunk at a time, in
+    bounded memory. Chunks come back as load_posts would return them.
+
+    Yields: DataFrames of at most chunksize posts.
+    '''
+    if is_store(source):
+        store = _open_store(source)
+        try:
+            yield from store.read(columns, chunksize=chunksize)
+        finally:
+            store.close()
+    else:
+        for chunk in pd.read_csv(source, usecols=_csv_columns(columns), chunksize=chunksize):
+            yield _tidy_csv_posts(chunk, columns)
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Import CSVs of scraped posts into a PostStore.')
+    parser.add_argument('store', help='path of the store, e.g. ../data/posts.sqlite')
+    parser.add_argument('csvs', nargs='+', help='CSVs of posts to import')
+    args = parser.parse_args()
+
+    store = PostStore(args.store)
+    for path in args.csvs:
+        print(f'Imported {store.import_csv(path)} new posts from {path}')
+    print(f'Store has {len(store)} posts.')
+    store.close()
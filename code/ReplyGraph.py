@@ -0,0 +1,302 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: The reply network of a whole archive, kept as a handful of flat
+###        integer arrays rather than a networkx graph per thread: post ids
+###        and post times in thread order, the offset each thread starts at,
+###        and the (source, target) rows of every reply. A few tens of bytes
+###        per post, so millions of posts fit in well under a GB.
+###        Thread graphs are only built, as networkx DiGraphs identical to
+###        NetworkChan's, when asked for. Thread depth, fan-out, reply
+###        latency and centrality are computed over the arrays directly.
+
+from HelperChan import NetworkChan
+from PostStore import load_posts
+from VectorStore import rows_for
+import networkx as nx
+import scipy.sparse
+import pandas as pd
+import numpy as np
+
+
+class ReplyGraph:
+
+    def __init__(self, ids, times, subjects, post_offsets, sources, targets, edge_offsets,
+                 threads=None):
+        '''
+        Usually made with from_posts or load rather than directly.
+
+        Inputs:
+          ids (int array): post ids, grouped by thread.
+          times (int array): when each post was made, in seconds since epoch.
+          subjects (array): subject of each thread.
+          post_offsets (int array): thread i is posts post_offsets[i]:post_offsets[i + 1].
+          sources, targets (int arrays): row of the replying post and of the
+            post it replies to, for every reply.
+          edge_offsets (int array): thread i's replies are
+            edges edge_offsets[i]:edge_offsets[i + 1].
+          threads (int array): post number of each thread's OP; -1 where
+            unknown (the default).
+        '''
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.times = np.asarray(times, dtype=np.int64)
+        self.subjects = np.asarray(subjects)
+        self.post_offsets = np.asarray(post_offsets, dtype=np.int64)
+        self.sources = np.asarray(sources, dtype=np.int32)
+        self.targets = np.asarray(targets, dtype=np.int32)
+        self.edge_offsets = np.asarray(edge_offsets, dtype=np.int64)
+        self.threads = np.full(len(self.post_offsets) - 1, -1, dtype=np.int64) if threads is None \
+            else np.asarray(threads, dtype=np.int64)
+
+    @classmethod
+    def from_network(cls, network):
+        '''
+        Make a ReplyGraph from a NetworkChan.
+        '''
+        sources, targets, post_offsets, edge_offsets = network.reply_edges()
+        heads = post_offsets[:-1]
+        threads = network.posts['thread'].to_numpy()[heads] if network.thread_column == 'thread' \
+            else None
+        return cls(network.posts['id'].to_numpy(),
+                   network.posts['datetime'].to_numpy('datetime64[s]').astype(np.int64),
+                   network.posts['subject'].to_numpy()[heads],
+                   post_offsets, sources, targets, edge_offsets, threads)
+
+    @classmethod
+    def from_posts(cls, posts):
+        '''
+        Make a ReplyGraph from a DataFrame of posts (with subject, id, date,
+        time and content columns, and thread if known).
+        '''
+        return cls.from_network(NetworkChan(posts.copy()))
+
+    def save(self, path):
+        '''
+        Save the graph, e.g. to '../data/reply_graph.npz'.
+        '''
+        np.savez(path, ids=self.ids, times=self.times, subjects=self.subjects.astype(str),
+                 post_offsets=self.post_offsets, sources=self.sources, targets=self.targets,
+                 edge_offsets=self.edge_offsets, threads=self.threads)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Load a graph saved with save.
+        '''
+        with np.load(path) as archive:
+            return cls(archive['ids'], archive['times'], archive['subjects'],
+                       archive['post_offsets'], archive['sources'], archive['targets'],
+                       archive['edge_offsets'],
+                       archive['threads'] if 'threads' in archive else None)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def n_threads(self):
+        return len(self.post_offsets) - 1
+
+    @property
+    def nbytes(self):
+        return sum(arr.nbytes for arr in [self.ids, self.times, self.subjects, self.post_offsets,
+                                          self.sources, self.targets, self.edge_offsets,
+                                          self.threads])
+
+    def thread_of_rows(self, rows):
+        '''
+        Thread number of each of the given rows.
+        '''
+        return np.searchsorted(self.post_offsets, rows, side='right') - 1
+
+    def thread_of(self, post_id):
+        '''
+        Thread number a post is in, or -1 if it isn't in the graph.
+        '''
+        row = rows_for(self.ids, [post_id])[0]
+        return int(self.thread_of_rows(row)) if row >= 0 else -1
+
+    def graph(self, thread):
+        '''
+        Build the networkx DiGraph of one thread, exactly as
+        NetworkChan.make_graphs would.
+        '''
+        posts = slice(self.post_offsets[thread], self.post_offsets[thread + 1])
+        edges = slice(self.edge_offsets[thread], self.edge_offsets[thread + 1])
+        graph = nx.DiGraph()
+        graph.add_nodes_from(self.ids[posts].tolist())
+        graph.add_edges_from(zip(self.ids[self.sources[edges]].tolist(),
+                                 self.ids[self.targets[edges]].tolist()))
+        return graph
+
+    def graphs(self):
+        '''
+        Yields: every thread's DiGraph, one at a time.
+        '''
+        for thread in range(self.n_threads):
+            yield self.graph(thread)
+
+    def _per_thread(self, ufunc, values, offsets):
+        '''
+        ufunc.reduceat over each thread's segment of values, with 0 for
+        threads whose segment is empty.
+        '''
+        counts = np.diff(offsets)
+        out = np.zeros(len(counts), dtype=np.result_type(values, np.int64))
+        nonempty = counts > 0
+        if len(values):
+            out[nonempty] = ufunc.reduceat(values, offsets[:-1][nonempty])
+        return out
+
+    def fan_in(self):
+        '''
+        Replies each post received.
+        '''
+        return np.bincount(self.targets, minlength=len(self))
+
+    def fan_out(self):
+        '''
+        Posts each post replies to.
+        '''
+        return np.bincount(self.sources, minlength=len(self))
+
+    def depth(self):
+        '''
+        Length of the longest chain of replies from each post back to its
+        thread's head (0 for heads).
+
+        Replies only ever point at earlier posts, so this settles after as
+        many rounds as the longest chain, each only touching replies to posts
+        whose depth just changed.
+        '''
+        keep = self.sources != self.targets
+        sources, targets = self.sources[keep], self.targets[keep]
+        depth = np.zeros(len(self), dtype=np.int32)
+        active = np.ones(len(sources), dtype=bool)
+        while active.any():
+            new = depth.copy()
+            np.maximum.at(new, sources[active], depth[targets[active]] + 1)
+            changed = new > depth
+            depth = new
+            active = changed[targets]
+        return depth
+
+    def latency(self):
+        '''
+        Seconds between each reply and the post it replies to (self
+        references excluded), in edge order.
+        '''
+        keep = self.sources != self.targets
+        return self.times[self.sources[keep]] - self.times[self.targets[keep]]
+
+    def in_degree_centrality(self):
+        '''
+        Each post's in-degree centrality within its thread, as
+        nx.in_degree_centrality would give for the thread's graph.
+        '''
+        sizes = np.diff(self.post_offsets)[self.thread_of_rows(np.arange(len(self)))]
+        return self.fan_in() / np.maximum(sizes - 1, 1)
+
+    def pagerank(self, alpha=.85, max_iter=100, tol=1e-8):
+        '''
+        Each post's PageRank within its thread, as nx.pagerank would give for
+        the thread's graph, computed for every thread at once.
+        '''
+        n = len(self)
+        if n == 0:
+            return np.zeros(0)
+        sizes = np.diff(self.post_offsets)
+        thread = self.thread_of_rows(np.arange(n))
+        # Duplicate edges collapse in a DiGraph, so count each pair once.
+        pairs = np.unique(self.sources.astype(np.int64) * n + self.targets)
+        sources, targets = pairs // n, pairs % n
+        out_degree = np.bincount(sources, minlength=n)
+        dangling = out_degree == 0
+        # transition[j, i] is the share of i's rank it passes on to j.
+        transition = scipy.sparse.csr_matrix((1 / out_degree[sources], (targets, sources)),
+                                             shape=(n, n))
+        thread_size = sizes[thread].astype(np.float64)
+
+        rank = 1 / thread_size
+        for _ in range(max_iter):
+            lost = self._per_thread(np.add, np.where(dangling, rank, 0), self.post_offsets)
+            new = alpha * (transition @ rank + lost[thread] / thread_size) + (1 - alpha) / thread_size
+            done = np.abs(new - rank).sum() < tol * n
+            rank = new
+            if done:
+                break
+        return rank
+
+    def post_metrics(self, centrality=True):
+        '''
+        Returns: DataFrame, one row per post: id, thread (its OP's post
+          number, as in the posts, or -1), thread_index (the thread's
+          number in the graph), depth, fan_in, fan_out, and (with
+          centrality) in_degree_centrality and pagerank.
+        '''
+        thread_index = self.thread_of_rows(np.arange(len(self)))
+        metrics = pd.DataFrame({'id': self.ids,
+                                'thread': self.threads[thread_index],
+                                'thread_index': thread_index,
+                                'depth': self.depth(),
+                                'fan_in': self.fan_in(),
+                                'fan_out': self.fan_out()})
+        if centrality:
+            metrics['in_degree_centrality'] = self.in_degree_centrality()
+            metrics['pagerank'] = self.pagerank()
+        return metrics
+
+    def thread_metrics(self):
+        '''
+        Returns: DataFrame, one row per thread: op (its OP's post number,
+          or -1), subject, posts, replies, depth (longest reply chain),
+          max_fan_in (most replies to one post), and mean / median reply
+          latency in seconds.
+        '''
+        keep = self.sources != self.targets
+        edge_threads = self.thread_of_rows(self.sources[keep])
+        latency = pd.Series(self.latency()).groupby(edge_threads)
+
+        metrics = pd.DataFrame({'op': self.threads,
+                                'subject': self.subjects,
+                                'posts': np.diff(self.post_offsets),
+                                'replies': np.diff(self.edge_offsets),
+                                'depth': self._per_thread(np.maximum, self.depth(), self.post_offsets),
+                                'max_fan_in': self._per_thread(np.maximum, self.fan_in(), self.post_offsets)})
+        metrics['mean_latency'] = latency.mean().reindex(metrics.index)
+        metrics['median_latency'] = latency.median().reindex(metrics.index)
+        return metrics
+
+def build_reply_graph(sources, out='../data/reply_graph.npz',
+                      metrics='../data/thread_metrics.csv'):
+    '''
+    Build and save the reply graph of some archives, and the metrics of
+    their threads.
+
+    Inputs:
+      sources (list of str): CSVs / PostStores of posts.
+      out (str): where to save the reply graph.
+      metrics (str): where to save per-thread metrics.
+
+    Returns: the ReplyGraph.
+    '''
+    posts = pd.concat([load_posts(source, ['subject', 'thread', 'id', 'date', 'time', 'content'])
+                       for source in sources], ignore_index=True).drop_duplicates('id')
+    replies = ReplyGraph.from_posts(posts)
+    replies.save(out)
+    print(f'{len(replies)} posts in {replies.n_threads} threads, '
+          f'{len(replies.sources)} replies; {replies.nbytes / 2 ** 20:.1f} MiB')
+    replies.thread_metrics().to_csv(metrics)
+    return replies
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build the reply graph of an archive and measure its threads.')
+    parser.add_argument('posts', nargs='+', help='CSVs / PostStores of posts.')
+    parser.add_argument('--out', default='../data/reply_graph.npz',
+                        help='where to save the reply graph.')
+    parser.add_argument('--metrics', default='../data/thread_metrics.csv',
+                        help='where to save per-thread metrics.')
+    args = parser.parse_args()
+
+    build_reply_graph(args.posts, args.out, args.metrics)
@@ -0,0 +1,268 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Applies a trained classifier to new posts. A model artifact is a
+###        directory holding the stacking ensemble, the Doc2Vec model its
+###        docvecs came from, and the settings used to clean posts before
+###        embedding them, so that new posts go through exactly the steps
+###        the training data did.
+###        Three ways in:
+###          score  - score CSVs / PostStores of posts a chunk at a time,
+###                   writing probabilities to a CSV (bounded memory).
+###          serve  - a small local HTTP service for scoring posts one by one.
+###          stdin  - the same over stdin / stdout, one JSON line per post.
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from CorpusCleaner import load_tokenizer, tokenize_corpus
+from embedder import save_model, load_model, infer_vectors
+from PostStore import iter_posts
+import HelperChan
+import pandas as pd
+import warnings
+import pickle
+import json
+import sys
+import os
+
+ENSEMBLE_FILE = 'ensemble.pkl'
+DOC2VEC_FILE = 'doc2vec.model'
+SETTINGS_FILE = 'settings.json'
+
+# What CorpusCleaner and embedder do by default.
+DEFAULT_SETTINGS = {'tokenizer': None, 'backref_depth': 1, 'threshold': .5}
+
+
+def save_artifact(path, ensemble, doc2vec, settings=None):
+    '''
+    Save everything needed to score new posts.
+
+    Inputs:
+      path (str): directory to save into (created if need be).
+      ensemble: fitted classifier over docvecs, e.g. an Ensemble.StackedEnsemble.
+      doc2vec (Doc2Vec): the model the training docvecs came from.
+      settings (dict): overrides for DEFAULT_SETTINGS.
+    '''
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, ENSEMBLE_FILE), 'wb') as f:
+        pickle.dump(ensemble, f)
+    save_model(doc2vec, os.path.join(path, DOC2VEC_FILE))
+    with open(os.path.join(path, SETTINGS_FILE), 'w') as f:
+        json.dump({**DEFAULT_SETTINGS, **(settings or {})}, f, indent=2)
+
+def load_artifact(path):
+    '''
+    Load a model artifact saved with save_artifact.
+
+    Returns: PostClassifier.
+    '''
+    with open(os.path.join(path, ENSEMBLE_FILE), 'rb') as f:
+        ensemble = pickle.load(f)
+    with open(os.path.join(path, SETTINGS_FILE)) as f:
+        settings = {**DEFAULT_SETTINGS, **json.load(f)}
+    return PostClassifier(ensemble, load_model(os.path.join(path, DOC2VEC_FILE)), settings)
+
+
+class PostClassifier:
+
+    def __init__(self, ensemble, doc2vec, settings=None):
+        '''
+        Everything between a raw post and the probability that it is
+        trans related: back referencing, link removal, tokenizing,
+        embedding and classifying.
+        '''
+        self.ensemble = ensemble
+        self.doc2vec = doc2vec
+        self.settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        self.tokenizer = load_tokenizer(self.settings['tokenizer'])
+        self.positive = list(ensemble.classes_).index(1)
+
+    def clean(self, posts):
+        '''
+        Clean posts as CorpusCleaner does. References are only expanded to
+        posts among the ones given.
+
+        Inputs:
+          posts (DataFrame): posts with id and content columns.
+
+        Returns: list of cleaned texts.
+        '''
+        # A chunk may hold the same post twice, which would make every
+        # reference to it ambiguous; index each post once.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            expanded = HelperChan.BackReferencer(posts.drop_duplicates('id')).expand_all(
+                posts['content'], self.settings['backref_depth'])
+        return [HelperChan.process_content(text)[2] for text in expanded]
+
+    def embed(self, texts, batch_size=1000, workers=None):
+        '''
+        Docvecs of already cleaned texts.
+        '''
+        tokens = list(tokenize_corpus(texts, self.tokenizer, batch_size))
+        return infer_vectors(self.doc2vec, tokens, batch_size, workers)
+
+    def score_posts(self, posts, batch_size=1000, workers=None):
+        '''
+        Returns: array of the probability each post is trans related.
+        '''
+        vectors = self.embed(self.clean(posts), batch_size, workers)
+        return self.ensemble.predict_proba(vectors)[:, self.positive]
+
+    def score_text(self, content):
+        '''
+        Probability a single post is trans related, as quickly as possible.
+        It is scored on its own, so its references are left unexpanded.
+        '''
+        text = HelperChan.process_content(str(content))[2]
+        tokens = next(tokenize_corpus([text], self.tokenizer))
+        vector = self.doc2vec.infer_vector(tokens)
+        return float(self.ensemble.predict_proba(vector.reshape(1, -1))[0, self.positive])
+
+
+def iter_chunks(source, chunksize, columns=['id', 'content']):
+    '''
+    Read posts from a CSV or PostStore a chunk at a time.
+    '''
+    return iter_posts(source, chunksize, columns)
+
+def score_sources(clf, sources, out, chunksize=5000, workers=None, append=False):
+    '''
+    Score every post in some CSVs / PostStores, a chunk at a time, writing
+    id, probability and label for each to the CSV out as it goes.
+
+    Inputs:
+      append (bool): add to out rather than replacing it. Every post is
+        written as scored, so scoring the same posts again adds them twice.
+
+    Returns: number of posts scored.
+    '''
+    if not append and os.path.exists(out):
+        os.remove(out)
+    scored = 0
+    for source in sources:
+        for chunk in iter_chunks(source, chunksize):
+            probs = clf.score_posts(chunk, workers=workers)
+            pd.DataFrame({'id': chunk['id'].to_numpy(),
+                          'probability': probs,
+                          'classification': (probs >= clf.settings['threshold']).astype(int)})\
+                .to_csv(out, mode='a', header=not os.path.exists(out), index=False)
+            scored += len(chunk)
+            print(f'Scored {scored} posts..', file=sys.stderr)
+    return scored
+
+def score_request(clf, request):
+    '''
+    Answer a scoring request, either {"content": ...} for one post or
+    {"posts": [{"id": ..., "content": ...}, ...]} for several (references
+    between which get expanded).
+    '''
+    if 'posts' in request:
+        posts = pd.DataFrame(request['posts'], columns=['id', 'content'])
+        probs = clf.score_posts(posts) if len(posts) else []
+        return {'probabilities': [float(p) for p in probs]}
+    response = {'probability': clf.score_text(request['content'])}
+    if 'id' in request:
+        response['id'] = request['id']
+    return response
+
+def make_handler(clf):
+    '''
+    Request handler scoring POSTs to /score with score_request; GET /health
+    answers once the model is loaded.
+    '''
+    class ScoreHandler(BaseHTTPRequestHandler):
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self.send_json(200, {'status': 'ok'})
+            else:
+                self.send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/score':
+                self.send_json(404, {'error': 'not found'})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                self.send_json(200, score_request(clf, request))
+            except (ValueError, KeyError, TypeError) as err:
+                self.send_json(400, {'error': str(err)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return ScoreHandler
+
+def serve(clf, host='127.0.0.1', port=8000):
+    '''
+    Score posts over HTTP until interrupted.
+    '''
+    server = ThreadingHTTPServer((host, port), make_handler(clf))
+    print(f'Scoring posts on http://{host}:{server.server_port}/score', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def score_stream(clf, infile=sys.stdin, outfile=sys.stdout):
+    '''
+    Score one post per line of infile, writing one JSON line per post to
+    outfile. Lines are either JSON requests (see score_request) or a post's
+    raw text.
+    '''
+    for line in infile:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError:
+            request = None
+        if not isinstance(request, dict):
+            request = {'content': line.rstrip('\n')}
+        outfile.write(json.dumps(score_request(clf, request)) + '\n')
+        outfile.flush()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Classify posts with a saved model artifact.')
+    parser.add_argument('model', help='model artifact directory, e.g. ../models/classifier')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    score = commands.add_parser('score', help='score CSVs / PostStores of posts.')
+    score.add_argument('posts', nargs='+', help='CSVs / PostStores of posts to score.')
+    score.add_argument('--out', default='../data/scores.csv',
+                       help='CSV to write id, probability and classification to.')
+    score.add_argument('--append', action='store_true',
+                       help='append to --out instead of replacing it.')
+    score.add_argument('--chunksize', type=int, default=5000,
+                       help='posts held in memory at once.')
+    score.add_argument('--workers', type=int, default=None,
+                       help='embedding threads; defaults to one per core.')
+
+    service = commands.add_parser('serve', help='score posts over HTTP.')
+    service.add_argument('--host', default='127.0.0.1')
+    service.add_argument('--port', type=int, default=8000)
+
+    commands.add_parser('stdin', help='score posts from stdin, one per line.')
+    args = parser.parse_args()
+
+    clf = load_artifact(args.model)
+    if args.command == 'score':
+        scored = score_sources(clf, args.posts, args.out, args.chunksize, args.workers,
+                               args.append)
+        print(f'Scored {scored} posts.', file=sys.stderr)
+    elif args.command == 'serve':
+        serve(clf, args.host, args.port)
+    else:
+        score_stream(clf)
@@ -0,0 +1,185 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Structured instrumentation for the scrapers. Every request, render,
+###        parse and write is timed, and posts, retries and errors are
+###        counted, by kind (index page, catalog, thread) and outcome. Each
+###        measurement is written as a JSON line as it happens, so a run can
+###        be followed (or picked apart afterwards); at the end of a run a
+###        summary of every series (count, total, mean, max and the QUANTILES:
+###        median, p95, p99) is logged and written as a Prometheus textfile,
+###        for node_exporter's textfile collector to pick up.
+###        A ScrapeMetrics without any paths just keeps the numbers in memory,
+###        so the scrapers can always be handed one.
+
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import threading
+import logging
+import json
+import time
+import os
+
+PREFIX = 'chan_scrape'
+# Reported in the summary (as p50, p95, p99) and the Prometheus textfile alike.
+QUANTILES = (.5, .95, .99)
+
+
+def series_name(name, labels):
+    '''
+    Prometheus style name of a series, e.g. request_seconds{kind="thread"}.
+    '''
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class ScrapeMetrics:
+
+    def __init__(self, events_path=None, run_id=None):
+        '''
+        Collects the measurements of one scraping run.
+
+        Inputs:
+          events_path (str): JSONL file every measurement is appended to as
+            it is made; None to keep them in memory only.
+          run_id (str): tag for this run's events; defaults to its start time.
+        '''
+        self.run_id = run_id or datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.observations = defaultdict(list)
+        self.counters = defaultdict(float)
+        # The async scraper parses in worker threads.
+        self.lock = threading.Lock()
+        self.events = open(events_path, 'a', encoding='utf-8') if events_path else None
+
+    def emit(self, event, **fields):
+        '''
+        Write one JSON line for an event (if there is an events file).
+        '''
+        if self.events is None:
+            return
+        line = json.dumps({'time': round(time.time(), 3), 'run': self.run_id, 'event': event,
+                           **fields}, default=str)
+        with self.lock:
+            self.events.write(line + '\n')
+            self.events.flush()
+
+    def observe(self, name, value, **labels):
+        '''
+        Record a measurement, e.g. observe('thread_posts', 150, kind='thread').
+        '''
+        with self.lock:
+            self.observations[name, tuple(sorted(labels.items()))].append(value)
+        self.emit(name, value=round(value, 6), **labels)
+
+    def increment(self, name, amount=1, **labels):
+        '''
+        Add to a counter, e.g. increment('retries', reason='429').
+        '''
+        with self.lock:
+            self.counters[name, tuple(sorted(labels.items()))] += amount
+        self.emit(name, amount=amount, **labels)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        '''
+        Time the body of a `with` block, in seconds. Yields the labels
+        dict, so that labels only known afterwards (e.g. a response's
+        status) can be added to it; if the block raises, the measurement is
+        labeled with the error instead.
+        '''
+        start = time.perf_counter()
+        try:
+            yield labels
+        except BaseException as err:
+            labels['error'] = type(err).__name__
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def summary(self):
+        '''
+        Returns: dict with the run's duration, every counter, and the count,
+          total, mean, max and QUANTILES (p50, p95, p99) of every observed
+          series.
+        '''
+        with self.lock:
+            counters = {series_name(name, labels): value
+                        for (name, labels), value in sorted(self.counters.items())}
+            observations = {}
+            for (name, labels), values in sorted(self.observations.items()):
+                values = np.asarray(values, dtype=np.float64)
+                observations[series_name(name, labels)] = {
+                    'count': len(values), 'sum': float(values.sum()),
+                    'mean': float(values.mean()),
+                    **{f'p{q * 100:g}': float(np.quantile(values, q)) for q in QUANTILES},
+                    'max': float(values.max())}
+        return {'run': self.run_id, 'seconds': self.elapsed(),
+                'counters': counters, 'observations': observations}
+
+    def prometheus(self, prefix=PREFIX):
+        '''
+        Returns: the run's metrics in Prometheus' text exposition format:
+          counters as counters, observed series as summaries, plus the
+          run's duration and when it finished.
+        '''
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            observations = sorted(self.observations.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f'{prefix}_{name}_total'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} counter')
+                typed.add(metric)
+            lines.append(f'{series_name(metric, labels)} {value:g}')
+        for (name, labels), values in observations:
+            metric = f'{prefix}_{name}'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} summary')
+                typed.add(metric)
+            values = np.asarray(values, dtype=np.float64)
+            for q in QUANTILES:
+                lines.append(f'{series_name(metric, labels + (("quantile", q),))} '
+                             f'{np.quantile(values, q):.6g}')
+            lines.append(f'{series_name(metric + "_sum", labels)} {values.sum():.6g}')
+            lines.append(f'{series_name(metric + "_count", labels)} {len(values)}')
+        lines += [f'# TYPE {prefix}_run_seconds gauge',
+                  f'{prefix}_run_seconds {self.elapsed():.3f}',
+                  f'# TYPE {prefix}_last_run_timestamp_seconds gauge',
+                  f'{prefix}_last_run_timestamp_seconds {time.time():.0f}']
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path, prefix=PREFIX):
+        '''
+        Write the Prometheus textfile. It is written to the side and moved
+        into place, so the collector never reads half a file.
+        '''
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(self.prometheus(prefix))
+        os.replace(path + '.tmp', path)
+
+    def finish(self, prometheus_path=None):
+        '''
+        End the run: log its summary (and emit it as an event), write the
+        Prometheus textfile if given a path, and close the events file.
+
+        Returns: the summary.
+        '''
+        summary = self.summary()
+        logging.info(f'Run summary: {json.dumps(summary)}')
+        self.emit('run_summary', **summary)
+        if prometheus_path:
+            self.write_prometheus(prometheus_path)
+        if self.events is not None:
+            self.events.close()
+            self.events = None
+        return summary
@@ -0,0 +1,126 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Persistent record of what the scraper has already seen, so that a
+###        run only fetches threads that changed since the last one and only
+###        keeps posts newer than the ones already saved. For every thread
+###        we keep the number of the last post we saved, plus whatever the
+###        board gave us to tell if it changed (threads.json's
+###        last_modified, or the ETag / Last-Modified response headers).
+
+import sqlite3
+import time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS threads (
+    no INTEGER PRIMARY KEY,
+    last_post INTEGER NOT NULL DEFAULT 0,
+    last_modified TEXT,
+    etag TEXT,
+    seen_at REAL
+)
+'''
+
+
+def thread_number(url):
+    '''
+    Pull the thread number out of a thread url, e.g.
+    'https://boards.4chan.org/lgbt/thread/34664894/subject' -> 34664894.
+    Works for API urls ('.../thread/34664894.json') too.
+    '''
+    after = url.split('/thread/', 1)[1]
+    return int(after.split('/', 1)[0].split('.', 1)[0])
+
+
+class ScrapeState:
+
+    def __init__(self, path):
+        '''
+        Opens (creating if need be) the scrape state stored at path.
+        Changes made through update() only hit the disk on commit(), so
+        the state never gets ahead of the posts that were actually saved.
+        '''
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    def get(self, no):
+        '''
+        Returns: dict with last_post, last_modified and etag for thread no,
+          or None if we have never seen it.
+        '''
+        row = self.conn.execute('SELECT last_post, last_modified, etag FROM threads WHERE no = ?',
+                                (int(no),)).fetchone()
+        if row is None:
+            return None
+        return {'last_post': row[0], 'last_modified': row[1], 'etag': row[2]}
+
+    def last_post(self, no):
+        '''
+        Number of the newest post saved from thread no, or 0.
+        '''
+        seen = self.get(no)
+        return seen['last_post'] if seen else 0
+
+    def is_changed(self, no, last_modified):
+        '''
+        Whether thread no has changed, given the last_modified value the
+        board currently reports for it.
+        '''
+        seen = self.get(no)
+        return seen is None or seen['last_modified'] != str(last_modified)
+
+    def conditional_headers(self, no):
+        '''
+        Headers asking the server to answer 304 if thread no is unchanged.
+        '''
+        seen = self.get(no)
+        headers = {}
+        if seen and seen['etag']:
+            headers['If-None-Match'] = seen['etag']
+        if seen and seen['last_modified']:
+            headers['If-Modified-Since'] = seen['last_modified']
+        return headers
+
+    def update(self, no, last_post=None, last_modified=None, etag=None):
+        '''
+        Record what we now know about thread no. last_post never moves
+        backwards.
+        '''
+        seen = self.get(no) or {'last_post': 0, 'last_modified': None, 'etag': None}
+        self.conn.execute('INSERT OR REPLACE INTO threads VALUES (?, ?, ?, ?, ?)',
+                          (int(no),
+                           max(seen['last_post'], int(last_post or 0)),
+                           str(last_modified) if last_modified is not None else seen['last_modified'],
+                           etag if etag is not None else seen['etag'],
+                           time.time()))
+
+    def new_posts(self, no, posts):
+        '''
+        Drop the posts of thread no that were already saved on a previous run,
+        and note the newest post left over.
+
+        Inputs:
+          no (int): thread number.
+          posts (DataFrame): the thread's posts, with an 'id' column.
+
+        Returns: DataFrame of posts newer than anything saved from the thread.
+        '''
+        ids = posts['id'].astype(int)
+        fresh = posts[ids > self.last_post(no)]
+        if len(fresh):
+            self.update(no, last_post=ids.max())
+        return fresh
+
+    def forget_older_than(self, seconds):
+        '''
+        Drop threads we have not seen in the given number of seconds; they
+        have long since fallen off the board.
+        '''
+        self.conn.execute('DELETE FROM threads WHERE seen_at < ?', (time.time() - seconds,))
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
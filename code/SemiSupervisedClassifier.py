@@ -4,162 +4,249 @@
 ###        that attempts to use wordvectors to predict whether 4chan
 ###        posts are or are not trans related.
 
-# Things needed to stack:
-from sklearn.neural_network import MLPClassifier
-#from sklearn.metrics import roc_curve, roc_auc_score
-from sklearn.ensemble import (StackingClassifier, 
-                              BaggingClassifier, 
-                              GradientBoostingClassifier,
-                              RandomForestClassifier)
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.linear_model import LogisticRegression, LogisticRegressionCV
-from sklearn.svm import SVC
 from sklearn.metrics import classification_report
-from sklearn.model_selection import GridSearchCV
-
-import HelperChan
+from Ensemble import StackedEnsemble, ESTIMATORS, DEFAULT_ESTIMATORS, FAST_ESTIMATORS
+from VectorStore import load_vectors, attach_vectors, rows_for
+from LabelQueue import LABELS_PATH
 import pandas as pd
 import numpy as np
+import argparse
+import warnings
+import os
 
 k=100 # values to add to each category
+# Three weeks of hand labeled posts.
+LABELED_PATHS = ['../data/first_pass_labels.csv', '../data/lgbt_week_2_classified.csv',
+                 '../data/lgbt_week_3_classified.csv']
 
-def make_clf(training_data, testing_data):
+def make_clf(vec_train, lab_train, vec_test, lab_test, estimators=DEFAULT_ESTIMATORS,
+             n_jobs=None, previous=None):
     '''
     This function assumes the test train split was made in advanced.
-    '''
 
-    vec_train = np.stack(training_data['docsvecs'].values)
-    lab_train = training_data['classification'].values 
-    
-    print(f'Training with {sum(lab_train)} positive values, {len(lab_train) - sum(lab_train)} negative')
+    Inputs:
+      vec_train, vec_test (2d arrays): docvecs to train and score on.
+      lab_train, lab_test (arrays): their classifications (0 or 1).
+      estimators (list of str): base estimators, from Ensemble.ESTIMATORS.
+      n_jobs (int): estimators / folds fit at once; -1 for every core.
+      previous (StackedEnsemble): if given, it is refit (warm starting
+        whatever it can) rather than a new ensemble built.
 
-    vec_test = np.stack(testing_data['docsvecs'].values)
-    lab_test = testing_data['classification'].values
-
-    base_estimators = [
-        ('SVC', SVC()),
-        ('BaggedLogistics', BaggingClassifier(estimator=LogisticRegression(), 
-                                            max_features=.75, 
-                                            max_samples=.75, 
-                                            bootstrap_features=True, 
-                                            n_estimators=10)),
-        ('GradientBoost', GradientBoostingClassifier()),
-        ('KNN', KNeighborsClassifier(algorithm='ball_tree', 
-                                    leaf_size=10, 
-                                    n_neighbors=5, p=1)),
-        ('DecisionTree', DecisionTreeClassifier())
-    ]
-
-    stack_clf = StackingClassifier(estimators=base_estimators, 
-                                   final_estimator=MLPClassifier(max_iter=1000))
+    Returns: fitted stacking classifier.
+    '''
+    print(f'Training with {sum(lab_train)} positive values, {len(lab_train) - sum(lab_train)} negative')
 
+    stack_clf = previous or StackedEnsemble(estimators, n_jobs=n_jobs)
     stack_clf.fit(vec_train, lab_train)
+
+    for name, seconds in stack_clf.fit_times_.items():
+        print(f'  {name}: fit in {seconds:.2f}s')
     
     # Score
     print(stack_clf.score(vec_test, lab_test))
     
     return(stack_clf)
 
-if __name__ == '__main__':
+def ensemble_maker(estimators=DEFAULT_ESTIMATORS, n_jobs=None, warm_start=False):
+    '''
+    A make function for self_train that keeps one ensemble across rounds,
+    so that with warm_start each round picks up from the last.
+    '''
+    ensemble = StackedEnsemble(estimators, n_jobs=n_jobs, warm_start=warm_start)
+    def make(vec_train, lab_train, vec_test, lab_test):
+        return make_clf(vec_train, lab_train, vec_test, lab_test, previous=ensemble)
+    return make
 
-    
+def self_train(vectors, labels, vec_test, lab_test, k=k, max_iter=10,
+               tol=.001, min_confidence=.5, make=make_clf):
+    '''
+    Self-training: fit a classifier on the labeled posts, label the k posts
+    it is most sure are positive and the k it is most sure are negative,
+    and go again with those added to the training data.
+
+    Stops after max_iter rounds, when no unlabeled posts are left, when the
+    k-th most likely positive post is under min_confidence (the classifier
+    has run out of posts it believes in), or once fewer than tol of the
+    unlabeled posts changed predicted class since the last round.
+
+    Inputs:
+      vectors (2d array): docvecs of every post, labeled or not.
+      labels (array of int): classification of each post, -1 if unlabeled.
+      vec_test, lab_test: held out posts to report performance on.
+      k (int): posts to add to each class per round.
+      max_iter (int): most rounds to run.
+      tol (float): fraction of changed predictions to stop under.
+      min_confidence (float): least positive probability to keep labeling at.
+      make (function): make(vec_train, lab_train, vec_test, lab_test)
+        returns a fitted classifier; make_clf by default.
+
+    Returns: (last classifier, labels including the ones it assigned).
+    '''
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    labels = np.array(labels, dtype=np.int8)
+    labeled = labels >= 0
+    predicted = np.full(len(labels), -1, dtype=np.int8)
+
+    for i in range(max_iter):
+        print('Training classifier.')
+        clf = make(vectors[labeled], labels[labeled], vec_test, lab_test)
+        print(classification_report(lab_test, clf.predict(vec_test), labels=[0, 1]))
+
+        pool = np.flatnonzero(~labeled)
+        if len(pool) == 0:
+            print('Every post is labeled; stopping.')
+            break
+
+        # Get classifier probabilities for every unlabeled post.
+        probs_pos = clf.predict_proba(vectors[pool])[:, list(clf.classes_).index(1)]
+
+        # How much of the pool changed predicted class since last round.
+        now = (probs_pos >= .5).astype(np.int8)
+        changed = np.mean(now != predicted[pool]) if i > 0 else 1.0
+        predicted[pool] = now
+
+        # The k most likely positive, then the k most likely negative of the rest.
+        n_pos = min(k, len(pool))
+        top_pos = np.argpartition(probs_pos, -n_pos)[-n_pos:]
+        rest = np.ones(len(pool), dtype=bool)
+        rest[top_pos] = False
+        rest = np.flatnonzero(rest)
+        n_neg = min(k, len(rest))
+        top_neg = rest[np.argpartition(probs_pos[rest], n_neg - 1)[:n_neg]] if n_neg else rest
+
+        cutoff_pos = probs_pos[top_pos].min()
+        print(f'Using a probability cutoff of {cutoff_pos} for the positive case')
+        if cutoff_pos < min_confidence:
+            print(f'Cutoff is under {min_confidence}; stopping.')
+            break
+
+        labels[pool[top_pos]] = 1
+        labels[pool[top_neg]] = 0
+        labeled[pool[top_pos]] = True
+        labeled[pool[top_neg]] = True
+        print(f'Adding the {n_pos + n_neg} new labeled posts to our training dataset.')
+        print(f'New training dataset has {labeled.sum()} posts.')
+
+        print('================')
+        if changed < tol:
+            print(f'Only {changed:.4%} of predictions changed; stopping.')
+            break
+
+    return clf, labels
+
+def train_classifier(label_paths=LABELED_PATHS, active_labels=LABELS_PATH,
+                     vectors_path='../data/docvecs.npy',
+                     preprocessed_path='../data/preprocessed.csv', k=k, max_iter=10,
+                     tol=.001, min_confidence=.5, estimators=DEFAULT_ESTIMATORS, n_jobs=None,
+                     warm_start=False, save=None, doc2vec='../data/doc2vec.model'):
+    '''
+    Self-train a stacking classifier on the docvecs of every post, from the
+    hand labeled ones, holding out a test set throughout.
+
+    Inputs:
+      label_paths (list of str): CSVs of labeled posts.
+      active_labels (str): CSV of labels from l4beler's queue, used if it exists.
+      vectors_path (str): docvecs, saved by embedder.
+      preprocessed_path (str): cleaned posts, saved by CorpusCleaner.
+      k, max_iter, tol, min_confidence: see self_train.
+      estimators, n_jobs, warm_start: see ensemble_maker.
+      save (str): if given, save the final classifier as a model artifact
+        here (see Scorer).
+      doc2vec (str): the Doc2Vec model the docvecs came from, saved by embedder.
+
+    Returns: the final classifier.
+    '''
     # Read in labeled posts; we have three weeks of them,
     # so we need to read in all weeks worth of posts.
     print('Reading and merging three weeks of labeled data...')
     labeled_posts = pd.concat(
-        [
-            pd.read_csv('../data/first_pass_labels.csv', index_col='Unnamed: 0'),
-            pd.read_csv('../data/lgbt_week_2_classified.csv', index_col='Unnamed: 0'),
-            pd.read_csv('../data/lgbt_week_3_classified.csv', index_col='Unnamed: 0')
-        ],
+        [pd.read_csv(path, index_col='Unnamed: 0') for path in label_paths] + (
+            # Labels from l4beler's active learning queue, if there are any.
+            [pd.read_csv(active_labels, index_col='Unnamed: 0')]
+            if active_labels and os.path.exists(active_labels) else []
+        ),
         ignore_index=True
     ).drop_duplicates()
 
     # Acquire docvecs
     print('Getting docvecs..')
-    docvecs = pd.read_csv('../data/docvecs.csv')
+    docvec_ids, docvecs = load_vectors(vectors_path)
 
-    # Merge in
+    # Attach them
     print('Merging things together..')
-    labeled_posts = labeled_posts.merge(docvecs, on='id')
-
-    # Fix our vector arrays
-    print('Cleaning up vectors..')
-    labeled_posts['docsvecs'] = labeled_posts['docsvecs']\
-        .apply(HelperChan.very_good_ast_literal_eval)\
-        .apply(np.array)
+    labeled_posts = attach_vectors(labeled_posts, docvec_ids, docvecs)
 
     # Do the test train split; testing data will be held out throughout.
     train = labeled_posts.sample(frac=.6)
     test = labeled_posts.drop(train.index)
 
     # Used to check model performance.
-    vec_test = np.stack(test['docsvecs'].values)
+    vec_test = np.stack(test['docsvecs'].values).astype(np.float32)
     lab_test = test['classification'].values
 
-    # Read in the unlabeled data to be added to the mix.
+    # Every other post with a docvec, besides the test ones, is unlabeled.
     print('Reading in all of our posts and attaching docvecs')
-    posts_all = pd.read_csv('../data/preprocessed.csv', index_col='Unnamed: 0')
-    posts_all = posts_all.merge(docvecs, on='id')
-    posts_all['docsvecs'] = posts_all['docsvecs']\
-                                .apply(HelperChan.very_good_ast_literal_eval)\
-                                .apply(np.array)
-    posts_all = posts_all[~posts_all['id'].isin(test['id'])].reset_index(drop=True)
-
-
-    # While loop is a placeholder until I determine a more 
-    # reasonable cutoff rule.
-    i = 0
-    while i < 10:
-        print('Training classifier.')
-        clf = make_clf(train, test)
-        print(classification_report(lab_test, clf.predict(vec_test), labels=[0, 1]))
+    posts_all = pd.read_csv(preprocessed_path, usecols=['id'])
+    unlabeled = posts_all.loc[~posts_all['id'].isin(labeled_posts['id']), 'id'].unique()
+    ids = np.concatenate([train['id'].to_numpy(np.int64), unlabeled.astype(np.int64)])
+    labels = np.concatenate([train['classification'].to_numpy(np.int8),
+                             np.full(len(unlabeled), -1, dtype=np.int8)])
+    rows = rows_for(docvec_ids, ids)
+
+    # One float32 matrix for the whole loop.
+    vectors = np.asarray(docvecs[rows[rows >= 0]], dtype=np.float32)
+    labels = labels[rows >= 0]
+
+    make = ensemble_maker(estimators, n_jobs, warm_start)
+    clf, labels = self_train(vectors, labels, vec_test, lab_test, k,
+                             max_iter, tol, min_confidence, make)
+
+    if save:
+        from CorpusCleaner import load_config
+        from embedder import load_model
+        from Scorer import save_artifact
+        # Score new posts the way the training posts were cleaned.
+        cleaning = load_config(preprocessed_path)
+        if cleaning is None:
+            warnings.warn(f'No cleaning settings saved with {preprocessed_path}; '
+                          f'assuming the defaults.')
+            cleaning = {}
+        settings = {'estimators': [name for name, _ in clf.estimators],
+                    **{key: cleaning[key] for key in ['tokenizer', 'backref_depth']
+                       if key in cleaning}}
+        print(f'Saving model artifact to {save}..')
+        save_artifact(save, clf, load_model(doc2vec), settings)
+    return clf
 
-        docvecs = np.stack(posts_all['docsvecs'].values)
-
-        # Get clasifier probabilities for all values.
-        probs = clf.predict_proba(docvecs)
-        probs_pos = [prob[1] for prob in probs]
-        probs_neg = [prob[0] for prob in probs]
-
-        # Get the top 100 most likely positive, negative clasisfications.
-        top_k_pos_inds = np.argpartition(probs_pos, -k)[-k:]
-        top_k_neg_inds = np.argpartition(probs_neg, -k)[-k:]
-
-        # Find the cutoffs to retrieve those, just so we can report
-        # what our cutoff (de jour) is, even if we de facto do not need it.
-        cutoff_pos = np.array(probs_pos)[top_k_pos_inds][-1]
-        cutoff_neg = 1 - cutoff_pos
-
-        print(f'Using a probability cutoff of {cutoff_pos} for the positive case')
-
-        # Assign our new values
-        new_labels = {}
-        for ind, id in enumerate(posts_all['id'].values):
-            if ind in top_k_neg_inds:
-                new_labels[id] = 0
-            if ind in top_k_pos_inds:
-                new_labels[id] = 1
-
-        # Add them to the training dataset
-        newly_labeled = posts_all.copy()[posts_all['id'].isin(new_labels.keys())]
-        newly_labeled['classification'] = newly_labeled['id'].apply(lambda x: new_labels[x])
-
-#        print(posts_all)
-        to_drop = np.concatenate([top_k_neg_inds, top_k_pos_inds])
-        posts_all = posts_all.drop(index=to_drop)\
-                            .reset_index(drop=True)
-
-
-        print(f'Adding the {len(newly_labeled)} new labeled posts to our training dataset.')
-
-        train = pd.concat([train, newly_labeled], ignore_index=True).drop_duplicates('id')
-
-        print(f'New training dataset has {len(train)} posts.')
-                                        
-        i += 1 
-
-        print('================')
-        
-        
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Self-train a stacking classifier on the docvecs.')
+    parser.add_argument('--k', type=int, default=k,
+                        help='posts to add to each class per round.')
+    parser.add_argument('--max-iter', type=int, default=10,
+                        help='most rounds of self-training to run.')
+    parser.add_argument('--tol', type=float, default=.001,
+                        help='stop once fewer than this fraction of predictions change.')
+    parser.add_argument('--min-confidence', type=float, default=.5,
+                        help='stop once the k-th most likely positive post is under this.')
+    parser.add_argument('--estimators', nargs='+', default=DEFAULT_ESTIMATORS,
+                        choices=list(ESTIMATORS), help='base estimators of the ensemble.')
+    parser.add_argument('--fast', action='store_true',
+                        help=f'use the scalable estimators {FAST_ESTIMATORS} instead.')
+    parser.add_argument('--n-jobs', type=int, default=None,
+                        help='estimators / folds fit at once; -1 for every core.')
+    parser.add_argument('--warm-start', action='store_true',
+                        help='continue estimators that allow it from the last round.')
+    parser.add_argument('--save', default=None,
+                        help='save the final classifier as a model artifact here (see Scorer).')
+    parser.add_argument('--doc2vec', default='../data/doc2vec.model',
+                        help='the Doc2Vec model the docvecs came from, saved by embedder.')
+    parser.add_argument('--vectors', default='../data/docvecs.npy',
+                        help='docvecs of every post, saved by embedder.')
+    parser.add_argument('--preprocessed', default='../data/preprocessed.csv',
+                        help='cleaned posts, saved by CorpusCleaner.')
+    args = parser.parse_args()
+
+    train_classifier(LABELED_PATHS, LABELS_PATH, args.vectors, args.preprocessed,
+                     args.k, args.max_iter, args.tol, args.min_confidence,
+                     FAST_ESTIMATORS if args.fast else args.estimators, args.n_jobs,
+                     args.warm_start, args.save, args.doc2vec)
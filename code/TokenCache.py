@@ -0,0 +1,124 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: On-disk cache of preprocessed tokens, so that rerunning the cleaning
+###        step only tokenizes posts that are new or whose (backreferenced,
+###        cleaned) text changed. Entries are keyed on the post id, a hash of
+###        the exact text that was tokenized, and a hash of the cleaning
+###        configuration, so changing the tokenizer or the backref depth
+###        quietly invalidates everything it should.
+###        Any stage that needs tokens for posts can share the same cache.
+
+import hashlib
+import sqlite3
+import json
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tokens (
+    id INTEGER NOT NULL,
+    config_hash TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    tokens TEXT NOT NULL,
+    PRIMARY KEY (id, config_hash)
+)
+'''
+# SQLite caps the number of ? parameters in a query.
+CHUNK = 900
+
+
+def text_hash(text):
+    '''
+    Short, stable hash of a piece of text.
+    '''
+    return hashlib.blake2b(str(text).encode('utf-8'), digest_size=16).hexdigest()
+
+def config_hash(config):
+    '''
+    Hash of a cleaning configuration (a JSON-able dict).
+    '''
+    return text_hash(json.dumps(config, sort_keys=True, default=str))
+
+
+class TokenCache:
+
+    def __init__(self, path, config):
+        '''
+        Opens (creating if need be) the token cache at path, for tokens
+        made with the given configuration.
+
+        Inputs:
+          path (str): path of the cache file.
+          config (dict): everything that affects the tokens besides the text
+            itself, e.g. tokenizer model and version and backref depth.
+        '''
+        self.path = path
+        self.config = config_hash(config)
+        self.hits, self.misses = 0, 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    def lookup(self, ids, hashes):
+        '''
+        Find cached tokens for posts.
+
+        Inputs:
+          ids (list of int): post ids.
+          hashes (list of str): text_hash of each post's text, in order.
+
+        Returns: dict mapping post id to tokens, for the posts whose cached
+          tokens were made from the same text.
+        '''
+        wanted = dict(zip((int(i) for i in ids), hashes))
+        found = {}
+        keys = list(wanted)
+        for start in range(0, len(keys), CHUNK):
+            chunk = keys[start:start + CHUNK]
+            rows = self.conn.execute(
+                f'SELECT id, content_hash, tokens FROM tokens '
+                f'WHERE config_hash = ? AND id IN ({", ".join("?" * len(chunk))})',
+                [self.config] + chunk)
+            for post_id, content_hash, tokens in rows:
+                if wanted[post_id] == content_hash:
+                    found[post_id] = json.loads(tokens)
+        return found
+
+    def store(self, ids, hashes, tokens):
+        '''
+        Save tokens for posts, replacing whatever was cached for them.
+        '''
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?)',
+                ((int(post_id), self.config, content_hash, json.dumps(toks))
+                 for post_id, content_hash, toks in zip(ids, hashes, tokens)))
+
+    def tokens_for(self, ids, texts, tokenize):
+        '''
+        Get tokens for every post, only tokenizing the ones not already cached.
+
+        Inputs:
+          ids (list of int): post ids.
+          texts (list of str): the text to tokenize for each post.
+          tokenize (function): takes a list of texts and returns (or yields)
+            a list of tokens per text, e.g. CorpusCleaner.tokenize_corpus.
+
+        Returns: list of tokens per post, in order.
+        '''
+        ids = [int(post_id) for post_id in ids]
+        texts = [str(text) for text in texts]
+        hashes = [text_hash(text) for text in texts]
+        found = self.lookup(ids, hashes)
+
+        missing = [i for i, post_id in enumerate(ids) if post_id not in found]
+        if missing:
+            fresh = list(tokenize([texts[i] for i in missing]))
+            self.store([ids[i] for i in missing], [hashes[i] for i in missing], fresh)
+            for i, toks in zip(missing, fresh):
+                found[ids[i]] = toks
+
+        self.hits = len(ids) - len(missing)
+        self.misses = len(missing)
+        return [found[post_id] for post_id in ids]
+
+    def close(self):
+        self.conn.close()
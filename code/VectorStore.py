@@ -0,0 +1,202 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Binary storage for the tokens and document vectors passed between
+###        the pipeline's scripts, instead of Python list reprs in CSVs that
+###        have to be literal_eval'd back one row at a time.
+###        Tokens go in a .npz: the vocabulary, every post's tokens as integer
+###        codes into it laid end to end, and the offset each post starts at.
+###        Vectors go in a float32 .npy matrix with a parallel .ids.npy array
+###        of post ids, which load memory-mapped (i.e. instantly, and without
+###        reading what isn't used).
+
+import numpy as np
+import os
+
+
+def ids_path(path):
+    '''
+    Path of the id array that goes with the vector matrix at path.
+    '''
+    root, _ = os.path.splitext(path)
+    return f'{root}.ids.npy'
+
+
+class TokenTable:
+
+    def __init__(self, ids, vocab, codes, offsets):
+        '''
+        Tokens for a collection of posts, as written by save_tokens. Post i's
+        tokens are vocab[codes[offsets[i]:offsets[i + 1]]].
+        '''
+        self.ids = ids
+        self.vocab = vocab
+        self.codes = codes
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.ids)
+
+    def codes_for(self, i):
+        '''
+        Vocabulary codes of the i-th post's tokens.
+        '''
+        return self.codes[self.offsets[i]:self.offsets[i + 1]]
+
+    def __getitem__(self, i):
+        return self.vocab[self.codes_for(i)].tolist()
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def save_tokens(path, ids, tokens):
+    '''
+    Save every post's tokens.
+
+    Inputs:
+      path (str): file to write, e.g. '../data/tokens.npz'.
+      ids (list of int): post ids.
+      tokens (list of list of str): tokens of each post, in order.
+    '''
+    vocab = {}
+    codes = []
+    offsets = [0]
+    for toks in tokens:
+        codes.extend(vocab.setdefault(str(tok), len(vocab)) for tok in toks)
+        offsets.append(len(codes))
+
+    np.savez(path,
+             ids=np.asarray(ids, dtype=np.int64),
+             vocab=np.array(list(vocab), dtype=str),
+             codes=np.asarray(codes, dtype=np.int32),
+             offsets=np.asarray(offsets, dtype=np.int64))
+
+def load_tokens(path):
+    '''
+    Load tokens saved with save_tokens.
+
+    Returns: TokenTable.
+    '''
+    with np.load(path) as archive:
+        return TokenTable(archive['ids'], archive['vocab'],
+                          archive['codes'], archive['offsets'])
+
+def save_vectors(path, ids, vectors):
+    '''
+    Save a vector for every post.
+
+    Inputs:
+      path (str): .npy file to write the matrix to, e.g. '../data/docvecs.npy'.
+        The ids are written next to it (see ids_path).
+      ids (list of int): post ids.
+      vectors (2d array-like): one row per post, in order.
+    '''
+    vectors = np.asarray(vectors, dtype=np.float32)
+    ids = np.asarray(ids, dtype=np.int64)
+    if vectors.ndim != 2 or len(vectors) != len(ids):
+        raise ValueError(f'Expected one vector per id, got {vectors.shape} for {len(ids)} ids.')
+    np.save(path, vectors)
+    np.save(ids_path(path), ids)
+
+def load_vectors(path, mmap=True):
+    '''
+    Load vectors saved with save_vectors.
+
+    Inputs:
+      path (str): the .npy matrix.
+      mmap (bool): memory-map the matrix (read-only) rather than reading it in.
+
+    Returns: (ids, vectors) arrays.
+    '''
+    vectors = np.load(path, mmap_mode='r' if mmap else None)
+    return np.load(ids_path(path)), vectors
+
+def append_vectors(path, ids, vectors):
+    '''
+    Add vectors for new posts to the ones saved at path (or start saving
+    them there), skipping any post that already has a vector.
+
+    Returns: number of vectors added.
+    '''
+    ids = np.asarray(ids, dtype=np.int64)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if not os.path.exists(path):
+        save_vectors(path, ids, vectors)
+        return len(ids)
+
+    old_ids, old_vectors = load_vectors(path)
+    new = (rows_for(old_ids, ids) < 0)
+    if not new.any():
+        return 0
+    all_ids = np.concatenate([old_ids, ids[new]])
+    all_vectors = np.concatenate([old_vectors, vectors[new]])
+    # Drop the memory map before replacing the file under it.
+    del old_vectors
+
+    root, ext = os.path.splitext(path)
+    save_vectors(f'{root}.tmp{ext}', all_ids, all_vectors)
+    os.replace(f'{root}.tmp{ext}', path)
+    os.replace(ids_path(f'{root}.tmp{ext}'), ids_path(path))
+    return int(new.sum())
+
+def rows_for(ids, wanted):
+    '''
+    Find the rows of the given posts.
+
+    Inputs:
+      ids (array of int): ids of the rows, e.g. from load_vectors.
+      wanted (array-like of int): ids to look up.
+
+    Returns: array of row numbers, -1 where a wanted id is missing.
+    '''
+    ids = np.asarray(ids, dtype=np.int64)
+    wanted = np.asarray(wanted, dtype=np.int64)
+    if len(ids) == 0:
+        return np.full(len(wanted), -1)
+
+    order = np.argsort(ids, kind='stable')
+    found = np.searchsorted(ids, wanted, sorter=order)
+    rows = order[np.minimum(found, len(ids) - 1)]
+    return np.where(ids[rows] == wanted, rows, -1)
+
+def attach_vectors(posts, ids, vectors, column='docsvecs'):
+    '''
+    Give posts their vectors, dropping the posts that have none, as merging
+    on id used to.
+
+    Inputs:
+      posts (DataFrame): posts with an 'id' column.
+      ids, vectors: as returned by load_vectors.
+      column (str): column to put the vectors in; each entry is a view of
+        a row of vectors, not a copy.
+
+    Returns: DataFrame of the posts that have vectors.
+    '''
+    rows = rows_for(ids, posts['id'].astype(np.int64))
+    posts = posts[rows >= 0].copy()
+    posts[column] = list(vectors[rows[rows >= 0]])
+    return posts
+
+
+if __name__ == '__main__':
+    import argparse
+    import ast
+    import pandas as pd
+    import HelperChan
+
+    parser = argparse.ArgumentParser(description='Convert CSVs of tokens or docvecs to binary storage.')
+    parser.add_argument('kind', choices=['tokens', 'vectors'],
+                        help="'tokens' for preprocessed.csv, 'vectors' for docvecs.csv")
+    parser.add_argument('csv', help='CSV with an id column and a tokens or docsvecs column')
+    parser.add_argument('out', help='file to write, e.g. ../data/tokens.npz or ../data/docvecs.npy')
+    args = parser.parse_args()
+
+    if args.kind == 'tokens':
+        corpus = pd.read_csv(args.csv, usecols=['id', 'tokens'])
+        save_tokens(args.out, corpus['id'], corpus['tokens'].map(ast.literal_eval))
+    else:
+        docvecs = pd.read_csv(args.csv, usecols=['id', 'docsvecs'])
+        save_vectors(args.out, docvecs['id'],
+                     np.stack(docvecs['docsvecs'].map(HelperChan.very_good_ast_literal_eval)))
+    print(f'Wrote {args.out}')
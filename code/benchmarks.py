@@ -0,0 +1,1197 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Small benchmarks for the slow parts of the pipeline. Everything in
+###        here runs offline against generated data; run e.g.
+###        `python benchmarks.py scrape` to time one of them.
+###        Most benchmarks pit old implementations against new ones. The
+###        regression suite (`python benchmarks.py suite --posts 100000`)
+###        instead times the current code the same way every run, over a
+###        FakeBoard corpus of fixed size and seed, keeping the best of a few
+###        repeats per case. A run's results are appended to a JSONL file
+###        along with the commit, machine and scale, and compared against
+###        the last run at the same scale.
+
+from functools import cached_property
+from datetime import datetime
+import subprocess
+import platform
+import argparse
+import tempfile
+import inspect
+import tracemalloc
+import warnings
+import contextlib
+import io
+import ast
+import json
+import time
+import os
+
+import regex as re
+
+from ScrapeState import ScrapeState
+from PostStore import load_posts
+import numpy as np
+import VectorStore
+import pandas as pd
+import networkx as nx
+import AsyncScraper
+import FakeBoard
+import ChanAPI
+import HelperChan
+
+
+def bench_scrape(n_threads=150, posts_per_thread=50, latency=.05,
+                 connections=(1, 4, 16), backend='html'):
+    '''
+    Time AsyncScraper against a local fake board, at a few pool sizes.
+    A pool of one connection stands in for the old serial scraper.
+
+    Inputs:
+      n_threads (int): threads on the fake board.
+      posts_per_thread (int): posts in every thread.
+      latency (float): seconds of fake network latency per request.
+      connections (iterable of int): pool sizes to try.
+      backend (str): 'html' or 'json'.
+
+    Returns: dict mapping pool size to (seconds, threads per second, posts).
+    '''
+    threads = FakeBoard.make_board(n_threads, posts_per_thread)
+    results = {}
+    with FakeBoard.serve_board(threads, latency=latency) as url:
+        for n in connections:
+            start = time.perf_counter()
+            df = AsyncScraper.get_all_current_posts('lgbt', base_url=url,
+                                                    max_connections=n,
+                                                    requests_per_second=None,
+                                                    backend=backend, api_url=url)
+            elapsed = time.perf_counter() - start
+            results[n] = (elapsed, n_threads / elapsed, len(df))
+            print(f'{n:>3} connections: {elapsed:7.2f}s, '
+                  f'{n_threads / elapsed:7.1f} threads/s, {len(df)} posts')
+    return results
+
+def bench_parse(n_threads=50, posts_per_thread=200):
+    '''
+    Compare the cost of parsing the same threads from rendered html
+    (ChanParser) and from the JSON API (ChanAPI).
+
+    Returns: dict mapping backend to seconds taken.
+    '''
+    threads = FakeBoard.make_board(n_threads, posts_per_thread)
+    pages = [FakeBoard.render_thread(thread) for thread in threads]
+    documents = [json.dumps({'posts': thread['posts']}) for thread in threads]
+
+    results = {}
+    start = time.perf_counter()
+    for page in pages:
+        AsyncScraper.parse_html_thread(page)
+    results['html'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for document in documents:
+        AsyncScraper.parse_json_thread(document)
+    results['json'] = time.perf_counter() - start
+
+    n_posts = n_threads * posts_per_thread
+    for backend, elapsed in results.items():
+        print(f'{backend:>5}: {elapsed:7.2f}s, {n_posts / elapsed:9.0f} posts/s')
+    return results
+
+
+def bench_incremental(n_threads=150, posts_per_thread=50, bumped=15, backend='html'):
+    '''
+    Scrape a fake board twice with a ScrapeState, bumping a few threads in
+    between, to show how much less the second (incremental) run fetches.
+
+    Returns: list of (seconds, requests, posts) for the two runs.
+    '''
+    threads = FakeBoard.make_board(n_threads, posts_per_thread)
+    stats = {}
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeBoard.serve_board(threads, stats=stats) as url:
+        state = ScrapeState(os.path.join(tmp, 'state.sqlite'))
+        for run in range(2):
+            stats['requests'] = stats['not_modified'] = 0
+            start = time.perf_counter()
+            df = AsyncScraper.get_all_current_posts('lgbt', base_url=url, api_url=url,
+                                                    backend=backend, state=state,
+                                                    max_connections=16,
+                                                    requests_per_second=None)
+            state.commit()
+            elapsed = time.perf_counter() - start
+            results.append((elapsed, stats['requests'], len(df)))
+            print(f'run {run + 1}: {elapsed:6.2f}s, {stats["requests"]:4} requests '
+                  f'({stats["not_modified"]} not modified), {len(df)} new posts')
+            FakeBoard.bump_threads(threads, bumped)
+        state.close()
+    return results
+
+def bench_accumulate(n_threads=150, posts_per_thread=200):
+    '''
+    Compare growing the scrape result with one concat per thread (the old
+    scrape loops) against collecting the per-thread batches and
+    concatenating once, on a synthetic 150 thread / 30k post board.
+
+    Returns: dict mapping strategy to (seconds, peak MiB allocated).
+    '''
+    threads = FakeBoard.make_board(n_threads, posts_per_thread)
+    batches = [ChanAPI.parse_thread_json(thread) for thread in threads]
+
+    def per_thread_concat():
+        df = batches[0]
+        for batch in batches[1:]:
+            df = pd.concat([df, batch], ignore_index=True)
+        return df
+
+    def concat_once():
+        return pd.concat(batches, ignore_index=True)
+
+    results = {}
+    for name, strategy in [('concat per thread', per_thread_concat),
+                           ('concat once', concat_once)]:
+        tracemalloc.start()
+        start = time.perf_counter()
+        df = strategy()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+        results[name] = (elapsed, peak)
+        print(f'{name:>18}: {elapsed:6.3f}s, peak {peak:7.1f} MiB, {len(df)} posts')
+    return results
+
+def legacy_content_with_back_reference(post, posts):
+    '''
+    The original HelperChan.content_with_back_reference, which scans the
+    whole posts DataFrame for every reference. Kept here as a baseline.
+    '''
+    references = HelperChan.get_references(post)
+
+    found_refs = []
+    content_col = posts.columns.tolist().index('content')
+    for ref in references:
+        matches = posts['id'] == int(ref.strip('>>'))
+        if sum(matches) == 1:
+            found_refs.append(posts[matches].iloc[0, content_col])
+        elif sum(matches) == 0:
+            warnings.warn(f'WARNING: {ref.strip(">>")} not found in posts DataFrame.')
+            found_refs.append(ref)
+        elif sum(matches) >= 1:
+            raise ValueError('Posts DataFrame has duplicate entries.')
+
+    for old, new in zip(references, found_refs):
+        post = re.sub(old, f"<ref>{repr(new)}</ref>\n", post)
+
+    return post
+
+def synthetic_corpus(n_posts=69000, posts_per_thread=200, seed=0):
+    '''
+    A corpus of posts, as scraped, from a board generated by FakeBoard.
+    '''
+    return FakeBoard.make_corpus(n_posts, posts_per_thread=posts_per_thread, seed=seed)
+
+def bench_backref(sources=None, n_posts=69000, legacy_sample=200):
+    '''
+    Time back-reference expansion over a whole corpus with a
+    HelperChan.BackReferencer, against the old per-post DataFrame scan.
+    The old approach is timed on a sample and extrapolated, since running
+    it over the full corpus takes hours.
+
+    Inputs:
+      sources (list of str): CSVs / PostStores making up the corpus, e.g.
+        the three weekly CSVs; a synthetic corpus of n_posts is used if None.
+      n_posts (int): size of the synthetic corpus.
+      legacy_sample (int): posts to time the old approach on.
+
+    Returns: dict with seconds for 'indexed' and (estimated) 'legacy'.
+    '''
+    if sources:
+        corpus = pd.concat([load_posts(source, ['subject', 'id', 'content'])
+                            for source in sources],
+                           ignore_index=True).drop_duplicates('id')
+    else:
+        corpus = synthetic_corpus(n_posts)
+    contents = corpus['content'].map(str).tolist()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        start = time.perf_counter()
+        expanded = HelperChan.BackReferencer(corpus).expand_all(contents)
+        indexed = time.perf_counter() - start
+
+        sample = contents[:legacy_sample]
+        start = time.perf_counter()
+        legacy = [legacy_content_with_back_reference(post, corpus) for post in sample]
+        legacy_time = (time.perf_counter() - start) * len(contents) / len(sample)
+
+    assert legacy == expanded[:len(sample)], 'BackReferencer output differs'
+    print(f'{len(corpus)} posts')
+    print(f'  indexed: {indexed:9.2f}s')
+    print(f'   legacy: {legacy_time:9.2f}s (estimated from {len(sample)} posts)')
+    return {'indexed': indexed, 'legacy': legacy_time}
+
+# URL_REGEX as it was, for the old helpers.
+LEGACY_URL_REGEX = r'[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*)'
+
+def bench_content(sources=None, n_posts=69000):
+    '''
+    Time extracting references and URLs from, and cleaning, every post in a
+    corpus: the old three separate uncompiled regex helpers, against the
+    fused single-scan HelperChan.process_content and its Series version.
+
+    Returns: dict mapping approach to seconds taken.
+    '''
+    if sources:
+        contents = pd.concat([load_posts(source, ['content']) for source in sources],
+                             ignore_index=True)['content'].map(str)
+    else:
+        contents = synthetic_corpus(n_posts)['content']
+
+    def separate(content):
+        return (re.findall(HelperChan.POST_REF_REGEX, content),
+                re.findall(LEGACY_URL_REGEX, content),
+                re.sub(HelperChan.POST_REF_REGEX, '\n',
+                       re.sub(LEGACY_URL_REGEX, ' ', content)))
+
+    results = {}
+    for name, process in [('separate', lambda: [separate(c) for c in contents]),
+                          ('fused', lambda: [HelperChan.process_content(c) for c in contents]),
+                          ('series', lambda: HelperChan.process_series(contents))]:
+        start = time.perf_counter()
+        process()
+        results[name] = time.perf_counter() - start
+        print(f'{name:>9}: {results[name]:6.2f}s, {len(contents) / results[name]:9.0f} posts/s')
+    return results
+
+def bench_tokenize(sources=None, n_posts=20000, batch_size=1000):
+    '''
+    Time tokenizing a corpus post by post with CorpusCleaner.word_tokenize
+    against the batched CorpusCleaner.tokenize_corpus, on one process and
+    on every core. Needs the spaCy model CorpusCleaner uses.
+
+    Returns: dict mapping approach to seconds taken.
+    '''
+    import CorpusCleaner
+
+    if sources:
+        texts = pd.concat([load_posts(source, ['content']) for source in sources],
+                          ignore_index=True)['content'].map(str).tolist()
+    else:
+        texts = synthetic_corpus(n_posts)['clean_content'].tolist()
+
+    results = {}
+    model = CorpusCleaner.default_model()
+    start = time.perf_counter()
+    expected = [CorpusCleaner.cleaner_tokens(CorpusCleaner.word_tokenize(text, model))
+                for text in texts]
+    results['word_tokenize'] = time.perf_counter() - start
+
+    tokenizer = CorpusCleaner.load_tokenizer()
+    for n_process in sorted({1, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        tokens = list(CorpusCleaner.tokenize_corpus(texts, tokenizer, batch_size, n_process))
+        results[f'pipe x{n_process}'] = time.perf_counter() - start
+        assert tokens == expected, 'tokenize_corpus output differs'
+
+    for name, elapsed in results.items():
+        print(f'{name:>14}: {elapsed:7.2f}s, {len(texts) / elapsed:8.0f} posts/s')
+    return results
+
+def bench_storage(n_posts=69000, dims=100, seed=0):
+    '''
+    Compare loading tokens and document vectors from CSVs of list reprs (as
+    embedder.py and SemiSupervisedClassifier.py used to) against loading
+    them from VectorStore's binary files.
+
+    Returns: dict mapping approach to seconds taken.
+    '''
+    corpus = synthetic_corpus(n_posts)
+    tokens = corpus['clean_content'].str.split().tolist()
+    ids = corpus['id'].to_numpy()
+    vectors = np.random.default_rng(seed).normal(size=(len(ids), dims)).astype(np.float32)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        pd.DataFrame({'id': ids, 'tokens': tokens}).to_csv(os.path.join(tmp, 'tokens.csv'))
+        pd.DataFrame({'id': ids, 'docsvecs': list(vectors)}).to_csv(os.path.join(tmp, 'docvecs.csv'))
+        VectorStore.save_tokens(os.path.join(tmp, 'tokens.npz'), ids, tokens)
+        VectorStore.save_vectors(os.path.join(tmp, 'docvecs.npy'), ids, vectors)
+
+        start = time.perf_counter()
+        pd.read_csv(os.path.join(tmp, 'tokens.csv'))['tokens'].map(ast.literal_eval)
+        results['tokens csv'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        table = VectorStore.load_tokens(os.path.join(tmp, 'tokens.npz'))
+        results['tokens npz'] = time.perf_counter() - start
+        assert list(table) == tokens, 'TokenTable differs'
+
+        start = time.perf_counter()
+        np.stack(pd.read_csv(os.path.join(tmp, 'docvecs.csv'))['docsvecs']
+                 .map(HelperChan.very_good_ast_literal_eval))
+        results['vectors csv'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        loaded_ids, loaded = VectorStore.load_vectors(os.path.join(tmp, 'docvecs.npy'))
+        VectorStore.attach_vectors(corpus[['id']], loaded_ids, loaded)
+        results['vectors npy'] = time.perf_counter() - start
+        del loaded
+
+    for name, elapsed in results.items():
+        print(f'{name:>12}: {elapsed:8.3f}s')
+    return results
+
+def legacy_self_train(train, posts_all, make, k=100, iterations=5):
+    '''
+    The original pseudo-labeling loop of SemiSupervisedClassifier, which
+    keeps vectors in a DataFrame column. Kept here as a baseline.
+    '''
+    for _ in range(iterations):
+        clf = make(np.stack(train['docsvecs'].values), train['classification'].values)
+        docvecs = np.stack(posts_all['docsvecs'].values)
+
+        probs = clf.predict_proba(docvecs)
+        probs_pos = [prob[1] for prob in probs]
+        probs_neg = [prob[0] for prob in probs]
+        top_k_pos_inds = np.argpartition(probs_pos, -k)[-k:]
+        top_k_neg_inds = np.argpartition(probs_neg, -k)[-k:]
+
+        new_labels = {}
+        for ind, id in enumerate(posts_all['id'].values):
+            if ind in top_k_neg_inds:
+                new_labels[id] = 0
+            if ind in top_k_pos_inds:
+                new_labels[id] = 1
+
+        newly_labeled = posts_all.copy()[posts_all['id'].isin(new_labels.keys())]
+        newly_labeled['classification'] = newly_labeled['id'].apply(lambda x: new_labels[x])
+        to_drop = np.concatenate([top_k_neg_inds, top_k_pos_inds])
+        posts_all = posts_all.drop(index=to_drop).reset_index(drop=True)
+        train = pd.concat([train, newly_labeled], ignore_index=True).drop_duplicates('id')
+    return clf
+
+def bench_selftrain(n_posts=69000, n_labeled=2000, dims=100, iterations=5, seed=0):
+    '''
+    Time rounds of self-training over n_posts docvecs with the original
+    DataFrame-based loop and with SemiSupervisedClassifier.self_train. A
+    logistic regression stands in for the stacking ensemble, so that what
+    is timed is the loop itself rather than the classifier.
+
+    Returns: dict mapping approach to seconds taken.
+    '''
+    from sklearn.linear_model import LogisticRegression
+    import SemiSupervisedClassifier
+
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n_posts, dims)).astype(np.float32)
+    truth = (vectors[:, 0] + rng.normal(scale=.5, size=n_posts) > 0).astype(np.int8)
+    labels = np.full(n_posts, -1, dtype=np.int8)
+    labels[:n_labeled] = truth[:n_labeled]
+
+    def fit(vec_train, lab_train, *test):
+        return LogisticRegression(max_iter=200).fit(vec_train, lab_train)
+
+    results = {}
+    posts = pd.DataFrame({'id': np.arange(n_posts), 'docsvecs': list(vectors.astype(np.float64)),
+                          'classification': labels})
+    start = time.perf_counter()
+    legacy_self_train(posts.head(n_labeled), posts, fit, iterations=iterations)
+    results['legacy'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        SemiSupervisedClassifier.self_train(vectors, labels, vectors[:200], truth[:200],
+                                            max_iter=iterations, tol=0, min_confidence=0,
+                                            make=fit)
+    results['vectorized'] = time.perf_counter() - start
+
+    for name, elapsed in results.items():
+        print(f'{name:>10}: {elapsed:7.2f}s, {elapsed / iterations:6.2f}s per round')
+    return results
+
+def bench_ensemble(n_train=2000, n_added=200, dims=100, n_jobs=-1, seed=0):
+    '''
+    Time fitting the stacking ensemble: sklearn's StackingClassifier (the
+    original make_clf), then Ensemble.StackedEnsemble with the original and
+    the scalable estimators, each fit once and then refit (warm started)
+    after a self-training round's worth of new posts.
+
+    Returns: dict mapping approach to (seconds, test accuracy).
+    '''
+    from sklearn.ensemble import StackingClassifier
+    from sklearn.neural_network import MLPClassifier
+    import Ensemble
+
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_train + n_added + 1000, dims)).astype(np.float32)
+    y = (X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(scale=.5, size=len(X)) > 0).astype(np.int8)
+    X_test, y_test = X[-1000:], y[-1000:]
+
+    results = {}
+    def timed(name, fit):
+        start = time.perf_counter()
+        clf = fit()
+        results[name] = (time.perf_counter() - start, clf.score(X_test, y_test))
+        print(f'{name:>24}: {results[name][0]:7.2f}s, accuracy {results[name][1]:.3f}')
+        return clf
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        timed('StackingClassifier', lambda: StackingClassifier(
+            [(name, Ensemble.ESTIMATORS[name]()) for name in Ensemble.DEFAULT_ESTIMATORS],
+            final_estimator=MLPClassifier(max_iter=1000)).fit(X[:n_train], y[:n_train]))
+
+        for label, names in [('default', Ensemble.DEFAULT_ESTIMATORS),
+                             ('fast', Ensemble.FAST_ESTIMATORS)]:
+            ensemble = Ensemble.StackedEnsemble(names, n_jobs=n_jobs, warm_start=True)
+            timed(f'{label}', lambda: ensemble.fit(X[:n_train], y[:n_train]))
+            timed(f'{label}, warm started', lambda: ensemble.fit(X[:n_train + n_added],
+                                                                 y[:n_train + n_added]))
+            for name, seconds in ensemble.fit_times_.items():
+                print(f'{name:>30}: {seconds:7.2f}s')
+    return results
+
+def bench_serving(n_posts=5000, n_requests=200, seed=0):
+    '''
+    Train a small classifier on a synthetic corpus, save and load it as a
+    Scorer model artifact, then measure batch scoring throughput and the
+    latency of single-post requests to the HTTP service. Needs the spaCy
+    model CorpusCleaner uses.
+
+    Returns: dict with batch 'posts/s' and HTTP 'p50' / 'p99' seconds.
+    '''
+    from http.server import ThreadingHTTPServer
+    from urllib.request import urlopen, Request
+    import threading
+    import CorpusCleaner
+    import embedder
+    import Ensemble
+    import Scorer
+
+    corpus = synthetic_corpus(n_posts, seed=seed)
+    corpus['content'] = corpus['content'].map(str)
+    tokenizer = CorpusCleaner.load_tokenizer()
+    tokens = list(CorpusCleaner.tokenize_corpus(corpus['clean_content'], tokenizer))
+    labels = np.array([int(any(word in toks for word in FakeBoard.WORDS[:5])) for toks in tokens])
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        VectorStore.save_tokens(os.path.join(tmp, 'tokens.npz'), corpus['id'], tokens)
+        doc2vec = embedder.train_doc2vec(VectorStore.load_tokens(os.path.join(tmp, 'tokens.npz')),
+                                         vector_size=50, epochs=5)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            ensemble = Ensemble.StackedEnsemble(Ensemble.FAST_ESTIMATORS, n_jobs=-1)
+            ensemble.fit(doc2vec.dv.vectors[:len(tokens)], labels)
+        Scorer.save_artifact(os.path.join(tmp, 'model'), ensemble, doc2vec)
+        clf = Scorer.load_artifact(os.path.join(tmp, 'model'))
+
+        corpus[['id', 'content']].to_csv(os.path.join(tmp, 'posts.csv'), index=False)
+        start = time.perf_counter()
+        with contextlib.redirect_stderr(io.StringIO()):
+            Scorer.score_sources(clf, [os.path.join(tmp, 'posts.csv')],
+                                 os.path.join(tmp, 'scores.csv'), chunksize=1000)
+        results['posts/s'] = n_posts / (time.perf_counter() - start)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Scorer.make_handler(clf))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/score'
+    latencies = []
+    for content in corpus['content'].head(n_requests):
+        body = json.dumps({'content': content}).encode('utf-8')
+        start = time.perf_counter()
+        with urlopen(Request(url, data=body, headers={'Content-Type': 'application/json'})) as resp:
+            json.load(resp)
+        latencies.append(time.perf_counter() - start)
+    server.shutdown()
+    server.server_close()
+
+    results['p50'], results['p99'] = np.percentile(latencies, [50, 99])
+    print(f'   batch: {results["posts/s"]:8.0f} posts/s')
+    print(f'    http: p50 {results["p50"] * 1000:6.1f}ms, p99 {results["p99"] * 1000:6.1f}ms '
+          f'over {n_requests} requests')
+    return results
+
+def bench_ann(n_posts=69000, dims=100, n_queries=500, k=5, clusters=200,
+              probes=(1, 4, 8, 16), seed=0):
+    '''
+    Compare an ANNIndex.IVFIndex against the exact ball tree search of the
+    stack's KNN member (manhattan distance, leaf_size 10), on clustered
+    synthetic docvecs: build time, time per query, and recall of the true
+    k nearest neighbors at a few n_probe settings.
+
+    Returns: dict mapping approach to (build seconds, ms per query, recall).
+    '''
+    from sklearn.neighbors import NearestNeighbors
+    import ANNIndex
+
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(scale=3, size=(clusters, dims))
+    vectors = (centers[rng.integers(0, clusters, n_posts)]
+               + rng.normal(size=(n_posts, dims))).astype(np.float32)
+    queries = vectors[rng.choice(n_posts, n_queries, replace=False)] \
+        + rng.normal(scale=.3, size=(n_queries, dims)).astype(np.float32)
+
+    results = {}
+    start = time.perf_counter()
+    tree = NearestNeighbors(n_neighbors=k, algorithm='ball_tree', leaf_size=10, p=1).fit(vectors)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    exact = tree.kneighbors(queries, return_distance=False)
+    results['ball tree'] = (built, (time.perf_counter() - start) * 1000 / n_queries, 1.0)
+
+    start = time.perf_counter()
+    index = ANNIndex.IVFIndex(metric='l1', seed=seed).fit(vectors)
+    built = time.perf_counter() - start
+    for n_probe in probes:
+        start = time.perf_counter()
+        rows, _ = index.search(queries, k, n_probe)
+        per_query = (time.perf_counter() - start) * 1000 / n_queries
+        recall = np.mean([len(set(found) & set(true)) / k for found, true in zip(rows, exact)])
+        results[f'ivf n_probe={n_probe}'] = (built, per_query, recall)
+
+    for name, (built, per_query, recall) in results.items():
+        print(f'{name:>16}: build {built:6.2f}s, {per_query:7.3f}ms per query, recall@{k} {recall:.3f}')
+    return results
+
+def legacy_build_networks(posts):
+    '''
+    The original NetworkChan graph building, which filters the posts once
+    per thread and walks each thread with iterrows. Kept here as a baseline.
+    '''
+    def make_network_from_thread(thread):
+        graph = nx.DiGraph()
+        head = None
+        for _, post in thread.iterrows():
+            graph.add_node(post['id'])
+            if post['is_head']:
+                head = post['id']
+                continue
+            references = HelperChan.get_references(str(post['content']))
+            makes_reference = any([(int(ref.strip('>>')) in graph.nodes)
+                                   for ref in references])
+            if not makes_reference:
+                graph.add_edge(post['id'], head)
+                continue
+            for ref in references:
+                if int(ref.strip('>>')) in graph.nodes:
+                    graph.add_edge(post['id'], int(ref.strip('>>')))
+        return graph
+
+    key = posts[HelperChan.thread_column(posts)]
+    threads = [posts[key == thread] for thread in key.unique()]
+    return [make_network_from_thread(thread) for thread in threads]
+
+def bench_network(sources=None, n_posts=69000, posts_per_thread=100):
+    '''
+    Time building the reply graph of every thread with HelperChan.NetworkChan
+    against the original per-thread filtering, plus the compact edge list /
+    CSR form of the whole board.
+
+    Returns: dict mapping approach to seconds taken.
+    '''
+    if sources:
+        posts = pd.concat([load_posts(source, ['subject', 'thread', 'id', 'date', 'time', 'content'])
+                           for source in sources], ignore_index=True).drop_duplicates('id')
+    else:
+        posts = synthetic_corpus(n_posts, posts_per_thread)
+    network = HelperChan.NetworkChan(posts)
+
+    results = {}
+    start = time.perf_counter()
+    legacy = legacy_build_networks(network.posts)
+    results['legacy'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    network.make_graphs()
+    results['graphs'] = time.perf_counter() - start
+
+    del network._reply_edges
+    start = time.perf_counter()
+    network.make_graphs(compact=True)
+    results['compact'] = time.perf_counter() - start
+
+    assert all(list(old.edges) == list(new.edges) for old, new in zip(legacy, network.graphs)), \
+        'NetworkChan graphs differ'
+    print(f'{len(network.graphs)} threads, {network.adjacency.nnz} replies')
+    for name, elapsed in results.items():
+        print(f'{name:>8}: {elapsed:7.2f}s')
+    return results
+
+def bench_threads(sources=None, n_posts=69000, repeat=10):
+    '''
+    Time grouping posts into threads (sorting, labeling heads and counting
+    posts per thread) keyed on subject strings, against keying on the
+    OP's integer post number.
+
+    Returns: dict mapping key to seconds taken.
+    '''
+    if sources:
+        posts = pd.concat([load_posts(source, ['subject', 'thread', 'id']) for source in sources],
+                          ignore_index=True).drop_duplicates('id')
+    else:
+        posts = synthetic_corpus(n_posts)
+    posts = pd.concat([posts] * repeat, ignore_index=True)
+
+    results = {}
+    for key in ['subject', 'thread']:
+        if posts[key].isna().any():
+            continue
+        start = time.perf_counter()
+        ordered = posts.sort_values([key, 'id'])
+        (~ordered[key].duplicated()).sum()
+        counts = posts.groupby(key).size()
+        results[key] = time.perf_counter() - start
+        print(f'{key:>8}: {results[key]:7.3f}s, {len(counts)} threads')
+    return results
+
+def bench_labeling(n_posts=69000, n_labels=50, seed=0):
+    '''
+    Time how long l4beler takes to show the first post, and then each post
+    after it: the old way (read the whole CSV, sample, index every post for
+    back references) against a LabelSession over a queue and a PostStore.
+
+    Returns: dict mapping approach to (seconds to first post, ms per post).
+    '''
+    import LabelQueue
+    from PostStore import PostStore
+
+    corpus = synthetic_corpus(n_posts)
+    probabilities = np.random.default_rng(seed).random(len(corpus))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        csv, store = os.path.join(tmp, 'posts.csv'), os.path.join(tmp, 'posts.sqlite')
+        corpus.to_csv(csv, index=False)
+        posts = PostStore(store)
+        posts.append(corpus)
+        posts.close()
+        queue = os.path.join(tmp, 'queue.npz')
+        LabelQueue.save_queue(queue, *LabelQueue.rank_queue(corpus['id'], probabilities))
+
+        start = time.perf_counter()
+        posts = load_posts(csv)
+        sample = posts.sample(n=n_labels, random_state=seed)
+        referencer = HelperChan.BackReferencer(posts)
+        contents = iter(sample['content'])
+        referencer.expand(next(contents))
+        first = time.perf_counter() - start
+        for content in contents:
+            referencer.expand(content)
+        results['sample'] = (first, (time.perf_counter() - start - first) * 1000 / (n_labels - 1))
+
+        start = time.perf_counter()
+        session = LabelQueue.LabelSession(store, queue, os.path.join(tmp, 'labels.csv'))
+        shown = iter(session)
+        next(shown)
+        first = time.perf_counter() - start
+        for _ in range(n_labels - 1):
+            next(shown)
+        results['queue'] = (first, (time.perf_counter() - start - first) * 1000 / (n_labels - 1))
+        session.close()
+
+    for name, (first, per_post) in results.items():
+        print(f'{name:>7}: first post after {first:6.3f}s, then {per_post:6.2f}ms per post')
+    return results
+
+def bench_llm(n_posts=200, latency=.05, server_rpm=3000, concurrency=16):
+    '''
+    Time labeling posts against a local FakeLLM server: one blocking request
+    at a time (as in the labeling notebook), against LLMLabeler with many
+    requests in flight, with and without a requests per minute budget
+    matching the server's limit, and again from a warm cache.
+
+    Returns: dict mapping approach to (seconds taken, requests refused).
+    '''
+    import asyncio
+    import logging
+    import requests
+    import FakeLLM
+    import GPTHelper
+    import LLMLabeler
+
+    prompts = [GPTHelper.prompt_messages(content) for content in synthetic_corpus(n_posts)['content']]
+    results = {}
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = LLMLabeler.ResponseCache(os.path.join(tmp, 'cache.sqlite'))
+        runs = [('sequential', None, None, 1, None),
+                ('concurrent, no budget', None, server_rpm, concurrency, None),
+                ('concurrent, budget', server_rpm, server_rpm, concurrency, cache),
+                ('cached rerun', server_rpm, server_rpm, concurrency, cache)]
+        for name, budget, limit, slots, responses in runs:
+            stats = {}
+            with FakeLLM.serve_llm(latency, requests_per_minute=limit, stats=stats) as url:
+                start = time.perf_counter()
+                if slots == 1:
+                    with requests.Session() as session:
+                        answers = [session.post(f'{url}/chat/completions',
+                                                json={'model': 'fake', 'messages': messages})
+                                   .json()['choices'][0]['message']['content'] for messages in prompts]
+                else:
+                    client = LLMLabeler.LabelClient(url, api_key='', cache=responses,
+                                                    requests_per_minute=budget, tokens_per_minute=None,
+                                                    concurrency=slots, backoff=.05)
+
+                    async def run():
+                        return [answer async for batch in client.stream(prompts) for answer in batch]
+                    answers = asyncio.run(run())
+                results[name] = (time.perf_counter() - start, stats['rate_limited'])
+            assert answers == [FakeLLM.answer(messages) for messages in prompts], f'{name} answers differ'
+        cache.close()
+    logging.disable(logging.NOTSET)
+
+    for name, (elapsed, refused) in results.items():
+        print(f'{name:>21}: {elapsed:6.2f}s, {n_posts / elapsed:8.1f} posts/s, {refused} requests refused')
+    return results
+
+def legacy_make_datetime(posts):
+    '''
+    The original make_datetime: standardizes each date with an apply, then
+    parses each timestamp separately (and keeps the strings). Kept here as
+    a baseline.
+    '''
+    datetime = posts['date'].apply(HelperChan.standardize_date) + ' ' + posts['time']
+    datetime.apply(lambda x: pd.to_datetime(x, format='%Y-%m-%d %H:%M:%S'))
+    return datetime
+
+def bench_datetime(sources=None, n_posts=69000):
+    '''
+    Time parsing every post's date and time with the vectorized
+    HelperChan.make_datetime, against the original per-row version.
+
+    Returns: dict mapping approach to seconds taken.
+    '''
+    if sources:
+        posts = pd.concat([load_posts(source, ['date', 'time']) for source in sources],
+                          ignore_index=True)
+    else:
+        posts = synthetic_corpus(n_posts)
+
+    results = {}
+    for name, parse in [('legacy', legacy_make_datetime),
+                        ('vectorized', HelperChan.make_datetime)]:
+        start = time.perf_counter()
+        parsed = parse(posts)
+        results[name] = time.perf_counter() - start
+        print(f'{name:>10}: {results[name]:7.3f}s')
+
+    legacy = pd.to_datetime(legacy_make_datetime(posts), format='%Y-%m-%d %H:%M:%S')
+    assert (parsed == legacy).all(), 'make_datetime output differs'
+    return results
+
+def synthetic_reply_graph(n_posts=2000000, posts_per_thread=200, seed=0):
+    '''
+    A ReplyGraph of n_posts, in which every reply answers a random earlier
+    post of its thread, posted a random 0-20 minutes after it.
+    '''
+    from ReplyGraph import ReplyGraph
+
+    rng = np.random.default_rng(seed)
+    post_offsets = np.append(np.arange(0, n_posts, posts_per_thread), n_posts)
+    rows = np.arange(n_posts)
+    starts = post_offsets[:-1][np.searchsorted(post_offsets, rows, side='right') - 1]
+    replies = rows[rows != starts]
+    targets = starts[replies] + (rng.random(len(replies)) * (replies - starts[replies])).astype(np.int64)
+    times = 1700000000 + np.cumsum(rng.integers(0, 1200, n_posts))
+    edge_offsets = np.append(0, np.cumsum(np.diff(post_offsets) - 1))
+    return ReplyGraph(34000000 + rows, times, np.arange(len(post_offsets) - 1).astype(str),
+                      post_offsets, replies, targets, edge_offsets)
+
+def bench_replygraph(n_posts=2000000, posts_per_thread=200):
+    '''
+    Time ReplyGraph's board-wide metrics on a synthetic archive of n_posts,
+    and report how much memory the graph takes.
+
+    Returns: dict mapping metric to seconds taken.
+    '''
+    replies = synthetic_reply_graph(n_posts, posts_per_thread)
+    print(f'{len(replies)} posts, {replies.n_threads} threads: {replies.nbytes / 2 ** 20:.1f} MiB')
+
+    results = {}
+    for name, metric in [('depth', replies.depth), ('fan_in', replies.fan_in),
+                         ('latency', replies.latency), ('pagerank', replies.pagerank),
+                         ('thread_metrics', replies.thread_metrics),
+                         ('one thread graph', lambda: replies.graph(replies.n_threads // 2))]:
+        start = time.perf_counter()
+        metric()
+        results[name] = time.perf_counter() - start
+        print(f'{name:>16}: {results[name]:7.3f}s')
+    return results
+
+def bench_pipeline(sources=None, n_posts=200000, n_new=1000, dims=100, seed=0):
+    '''
+    Time Pipeline reruns over the stages that need neither spaCy nor
+    gensim (the reply graph and the ANN index): a first run, a rerun with
+    nothing changed, a rerun after the archive is rewritten unchanged (new
+    modification time, same content) and one after a small scrape, which
+    should only rebuild what reads the archive.
+
+    Returns: dict mapping run to (seconds, stages that ran).
+    '''
+    import Pipeline
+
+    corpus = synthetic_corpus(n_posts) if sources is None else pd.concat(
+        [load_posts(source) for source in sources], ignore_index=True)
+    rng = np.random.default_rng(seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        posts = os.path.join(tmp, 'posts.csv')
+        corpus.iloc[:-n_new].to_csv(posts, index=False)
+        VectorStore.save_vectors(os.path.join(tmp, 'docvecs.npy'), corpus['id'].iloc[:-n_new],
+                                 rng.standard_normal((len(corpus) - n_new, dims)))
+        stages = [stage for stage in Pipeline.make_stages([posts], data=tmp)
+                  if stage.name in ('reply_graph', 'index')]
+        manifest = os.path.join(tmp, 'pipeline.json')
+
+        def run(name):
+            start = time.perf_counter()
+            status = Pipeline.run_pipeline(stages, manifest, jobs=2)
+            results[name] = (time.perf_counter() - start,
+                             [stage for stage, result in status.items() if result == 'ran'])
+
+        run('first')
+        run('unchanged')
+        corpus.iloc[:-n_new].to_csv(posts, index=False)
+        run('rewritten')
+        corpus.to_csv(posts, index=False)
+        run('new posts')
+
+    for name, (seconds, ran) in results.items():
+        print(f'{name:>10}: {seconds:6.3f}s, ran {ran}')
+    return results
+
+
+### The regression suite.
+
+RESULTS_PATH = '../data/benchmarks.jsonl'
+# Changes smaller than this are noise.
+THRESHOLD = .10
+
+
+class SuiteData:
+
+    def __init__(self, n_posts=20000, seed=0):
+        '''
+        The inputs the suite's cases run over, generated on first use and
+        shared between cases.
+
+        Inputs:
+          n_posts (int): posts in the corpus; cases with slower functions
+            run over a fixed fraction of it.
+          seed (int): seed for FakeBoard.
+        '''
+        self.n_posts = n_posts
+        self.seed = seed
+
+    @cached_property
+    def corpus(self):
+        return synthetic_corpus(self.n_posts, posts_per_thread=100, seed=self.seed)
+
+    @cached_property
+    def pages(self):
+        '''
+        Rendered pages of a board a tenth the size of the corpus.
+        '''
+        return [page for _, page in FakeBoard.iter_pages(max(self.n_posts // 10, 1),
+                                                         seed=self.seed)]
+
+    @cached_property
+    def docvecs(self):
+        '''
+        Docvecs for every post, with a label that depends on them.
+        '''
+        rng = np.random.default_rng(self.seed)
+        vectors = rng.normal(size=(self.n_posts, 100)).astype(np.float32)
+        labels = (vectors[:, 0] + rng.normal(scale=.5, size=self.n_posts) > 0).astype(np.int8)
+        return vectors, labels
+
+
+### Cases. Each takes the SuiteData and returns (function to time, number
+### of items it processes); setup done before returning is not timed.
+
+def case_parse_thread(data):
+    '''
+    ChanParser.parse_thread over rendered thread pages, soup included: the
+    parsing half of 4chan_scrape.scrape_thread (the other half is fetching).
+    '''
+    import ChanParser
+
+    pages = data.pages
+    n_posts = sum(page.count('class="post ') for page in pages)
+    return lambda: [ChanParser.parse_thread(ChanParser.make_soup(page)) for page in pages], n_posts
+
+def case_content_with_back_reference(data, calls=1000):
+    '''
+    HelperChan.content_with_back_reference, one call per post against an
+    index of the corpus built once, as the notebooks use it.
+    '''
+    contents = data.corpus['content'].head(calls).tolist()
+    index = HelperChan.BackReferencer(data.corpus)
+
+    def run():
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return [HelperChan.content_with_back_reference(content, index) for content in contents]
+    return run, len(contents)
+
+def case_expand_all(data):
+    '''
+    HelperChan.BackReferencer.expand_all over the whole corpus, as CorpusCleaner does.
+    '''
+    contents = data.corpus['content'].tolist()
+    posts = data.corpus
+
+    def run():
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return HelperChan.BackReferencer(posts).expand_all(contents)
+    return run, len(contents)
+
+def case_remove_links(data):
+    '''
+    HelperChan.remove_links, post by post.
+    '''
+    contents = data.corpus['content'].tolist()
+    return lambda: [HelperChan.remove_links(content) for content in contents], len(contents)
+
+def case_remove_links_series(data):
+    '''
+    HelperChan.remove_links_series over the whole corpus.
+    '''
+    contents = data.corpus['content']
+    return lambda: HelperChan.remove_links_series(contents), len(contents)
+
+def case_word_tokenize(data):
+    '''
+    CorpusCleaner.word_tokenize, post by post, over a tenth of the corpus.
+    Needs the spaCy model CorpusCleaner uses.
+    '''
+    import CorpusCleaner
+
+    model = CorpusCleaner.default_model()
+    texts = data.corpus['clean_content'].head(max(data.n_posts // 10, 1)).tolist()
+    return lambda: [CorpusCleaner.word_tokenize(text, model) for text in texts], len(texts)
+
+def case_make_graphs(data):
+    '''
+    HelperChan.NetworkChan.make_graphs over the whole corpus, the
+    constructor (sorting and indexing the posts) included.
+    '''
+    posts = data.corpus
+    return lambda: HelperChan.NetworkChan(posts).make_graphs(), len(posts)
+
+def case_very_good_ast_literal_eval(data):
+    '''
+    HelperChan.very_good_ast_literal_eval over the reprs of a tenth of the
+    docvecs, as they were written to CSV.
+    '''
+    with np.printoptions(threshold=np.inf):
+        reprs = [str(vector) for vector in data.docvecs[0][:max(data.n_posts // 10, 1)]]
+    return lambda: [HelperChan.very_good_ast_literal_eval(text) for text in reprs], len(reprs)
+
+def case_make_clf(data, n_train=1000, n_test=250):
+    '''
+    SemiSupervisedClassifier.make_clf with the default estimators, fit on
+    n_train docvecs (one round of self-training).
+    '''
+    import SemiSupervisedClassifier
+
+    vectors, labels = data.docvecs
+    n_train = min(n_train, len(vectors) - n_test)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return SemiSupervisedClassifier.make_clf(vectors[:n_train], labels[:n_train],
+                                                     vectors[-n_test:], labels[-n_test:])
+    return run, n_train
+
+
+# name: (case, repeats)
+CASES = {'parse_thread': (case_parse_thread, 3),
+         'content_with_back_reference': (case_content_with_back_reference, 3),
+         'expand_all': (case_expand_all, 3),
+         'remove_links': (case_remove_links, 3),
+         'remove_links_series': (case_remove_links_series, 3),
+         'word_tokenize': (case_word_tokenize, 3),
+         'make_graphs': (case_make_graphs, 3),
+         'very_good_ast_literal_eval': (case_very_good_ast_literal_eval, 3),
+         'make_clf': (case_make_clf, 1)}
+
+
+def run_case(case, data, repeat=3):
+    '''
+    Time a case.
+
+    Returns: dict with the 'best' and 'median' seconds over the repeats,
+      the 'items' processed and items 'per_second' at best; or with the
+      reason it was 'skipped', if its dependencies are missing.
+    '''
+    try:
+        function, items = case(data)
+    except (ImportError, OSError) as err:
+        return {'skipped': f'{type(err).__name__}: {err}'}
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return {'best': best, 'median': float(np.median(times)), 'items': items,
+            'per_second': items / best if best else None}
+
+def git_commit():
+    '''
+    Returns: (commit, whether the tree has uncommitted changes), or
+      (None, None) outside a git checkout.
+    '''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True).stdout.strip() != ''
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def run_suite(cases=None, n_posts=20000, seed=0, repeat=None):
+    '''
+    Run the suite's cases named (all of them by default).
+
+    Returns: a record of the run, as saved by save_run.
+    '''
+    data = SuiteData(n_posts, seed)
+    commit, dirty = git_commit()
+    record = {'time': datetime.now().isoformat(timespec='seconds'), 'commit': commit,
+              'dirty': dirty, 'python': platform.python_version(),
+              'machine': platform.platform(), 'cpus': os.cpu_count(),
+              'n_posts': n_posts, 'seed': seed, 'results': {}}
+    for name in cases or CASES:
+        case, default_repeat = CASES[name]
+        record['results'][name] = result = run_case(case, data, repeat or default_repeat)
+        if 'skipped' in result:
+            print(f'{name:>28}: skipped ({result["skipped"]})')
+        else:
+            print(f'{name:>28}: {result["best"]:8.3f}s, {result["per_second"]:10.0f} items/s')
+    return record
+
+def save_run(path, record):
+    '''
+    Append a run's record to a JSONL file of past runs.
+    '''
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+
+def load_runs(path):
+    '''
+    Returns: list of the records saved to path, oldest first.
+    '''
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def previous_run(runs, record):
+    '''
+    Returns: the latest of runs made at the same scale and seed as record
+      and on the same kind of machine, or None.
+    '''
+    for run in reversed(runs):
+        if all(run.get(key) == record[key] for key in ('n_posts', 'seed', 'cpus', 'machine')):
+            return run
+    return None
+
+def compare(record, previous, threshold=THRESHOLD):
+    '''
+    Print how each case's best time changed since a previous run.
+
+    Returns: list of names of the cases that got slower by more than threshold.
+    '''
+    print(f'Against {previous["commit"]}{" (dirty)" if previous.get("dirty") else ""} '
+          f'from {previous["time"]}:')
+    slower = []
+    for name, result in record['results'].items():
+        before = previous['results'].get(name, {})
+        if 'best' not in result or 'best' not in before:
+            continue
+        change = result['best'] / before['best'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  <- slower'
+            slower.append(name)
+        elif change < -threshold:
+            flag = '  <- faster'
+        print(f'{name:>28}: {before["best"]:8.3f}s -> {result["best"]:8.3f}s ({change:+7.1%}){flag}')
+    return slower
+
+def bench_suite(cases=None, n_posts=20000, seed=0, repeat=None, results_path=RESULTS_PATH,
+                save=True, fail_slower=False):
+    '''
+    Run the regression suite, compare it against the last comparable run
+    saved to results_path, and save it there.
+
+    Inputs:
+      cases (list of str): cases to run, from CASES; all of them if None.
+      n_posts (int): size of the synthetic corpus.
+      seed (int): seed for the corpus.
+      repeat (int): times to run each case; defaults to each case's own.
+      results_path (str): JSONL file runs are saved to and compared against.
+      save (bool): whether to save this run.
+      fail_slower (bool): exit with an error if any case got more than
+        THRESHOLD slower.
+
+    Returns: the run's record.
+    '''
+    record = run_suite(cases, n_posts, seed, repeat)
+    previous = previous_run(load_runs(results_path), record)
+    slower = compare(record, previous) if previous else []
+    if save:
+        save_run(results_path, record)
+    if fail_slower and slower:
+        raise SystemExit(f'Slower: {", ".join(slower)}')
+    return record
+
+
+BENCHMARKS = {'scrape': bench_scrape, 'parse': bench_parse,
+              'incremental': bench_incremental, 'accumulate': bench_accumulate,
+              'backref': bench_backref, 'content': bench_content,
+              'tokenize': bench_tokenize, 'storage': bench_storage,
+              'selftrain': bench_selftrain, 'ensemble': bench_ensemble,
+              'serving': bench_serving, 'ann': bench_ann,
+              'network': bench_network, 'replygraph': bench_replygraph,
+              'datetime': bench_datetime, 'threads': bench_threads,
+              'labeling': bench_labeling, 'llm': bench_llm,
+              'pipeline': bench_pipeline, 'suite': bench_suite}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run pipeline benchmarks.')
+    parser.add_argument('names', nargs='*', default=list(BENCHMARKS),
+                        help=f'benchmarks to run, from {list(BENCHMARKS)}')
+    parser.add_argument('--corpus', nargs='+', default=None,
+                        help='CSVs / PostStores to use instead of synthetic data, '
+                             'for the benchmarks that take a corpus.')
+    suite = parser.add_argument_group('regression suite')
+    suite.add_argument('--cases', nargs='+', default=None,
+                       help=f'cases of the suite to run, from {list(CASES)}')
+    suite.add_argument('--posts', type=int, default=20000, help='size of the synthetic corpus.')
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--repeat', type=int, default=None,
+                       help='times to run each case; defaults to each case\'s own.')
+    suite.add_argument('--results', default=RESULTS_PATH,
+                       help='JSONL file runs are saved to and compared against.')
+    suite.add_argument('--no-save', action='store_true', help='do not save this run.')
+    suite.add_argument('--fail-slower', action='store_true',
+                       help=f'exit with an error if any case got more than {THRESHOLD:.0%} slower.')
+    args = parser.parse_args()
+
+    for name in args.names:
+        print(f'== {name} ==')
+        bench = BENCHMARKS[name]
+        if bench is bench_suite:
+            bench(args.cases, args.posts, args.seed, args.repeat, args.results,
+                  not args.no_save, args.fail_slower)
+        elif args.corpus and 'sources' in inspect.signature(bench).parameters:
+            bench(sources=args.corpus)
+        else:
+            bench()
@@ -1,38 +1,210 @@
 ### Author: Ashlynn Wimer
 ### Date: 3/4/2024
+### Last Modified: 10/18/2026
 ### About: This script creates docvec embeddings of my posts, before saving the
-###        embedding information to a file on the side. 
-###        Notably, it does *not* save the actual embedding space, as that would
-###        have taken up too much storage to keep and too much RAM to load.
+###        embedding information to a file on the side.
+###        The model itself is saved with its weights in separate .npy files,
+###        which load memory-mapped, so that newly scraped posts can be
+###        embedded with infer_vector (--infer) instead of retraining.
+###        The corpus is streamed from the stored tokens (or gensim's
+###        corpus_file mode) rather than held in memory as TaggedDocuments.
 
 import gensim.models.doc2vec as d2v
-import pandas as pd
-import ast
-from tqdm import tqdm
-tqdm.pandas()
+from gensim import utils
+from VectorStore import load_tokens, save_vectors, load_vectors, append_vectors, rows_for
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import argparse
+import os
+
+# Stands in for the tokens of a post with none, in corpus_file mode. It is
+# kept out of the vocabulary (see keep_out_empty), so those posts are left
+# untrained, as they are when streaming TaggedDocuments.
+EMPTY_TOKEN = '<empty>'
+
+
+class TaggedCorpus:
+
+    def __init__(self, tokens):
+        '''
+        Restartable stream of TaggedDocuments over a TokenTable, so gensim
+        can take as many passes as it likes without the whole corpus of
+        TaggedDocuments ever sitting in memory.
+
+        Documents are tagged with their position in the table rather than
+        their post id: gensim takes int tags as row numbers, so tagging with
+        ids in the tens of millions would allocate that many vectors.
+        '''
+        self.tokens = tokens
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __iter__(self):
+        for i, words in enumerate(self.tokens):
+            yield d2v.TaggedDocument(words=words, tags=[i])
+
+def write_corpus_file(tokens, path):
+    '''
+    Write a TokenTable in the format of gensim's corpus_file mode: one post
+    per line, tokens separated by spaces. Line numbers are the tags, so
+    posts without tokens get EMPTY_TOKEN rather than a blank line, which a
+    reader could skip.
+    '''
+    with open(path, 'w', encoding='utf-8') as f:
+        for words in tokens:
+            f.write((' '.join(words) or EMPTY_TOKEN) + '\n')
+
+def keep_out_empty(word, count, min_count):
+    '''
+    gensim trim_rule keeping EMPTY_TOKEN out of the vocabulary; on a big
+    enough board there are more than min_count posts without tokens, and
+    they would otherwise all be trained towards one shared word.
+    '''
+    if word == EMPTY_TOKEN:
+        return utils.RULE_DISCARD
+    return utils.RULE_DEFAULT
+
+def check_vectors(model, tokens):
+    '''
+    Make sure the model has exactly one document vector per post, so that
+    model.dv.vectors[i] is tokens.ids[i]'s.
+    '''
+    if len(model.dv) != len(tokens):
+        raise ValueError(f'Doc2Vec made {len(model.dv)} document vectors '
+                         f'for {len(tokens)} posts.')
+
+def train_doc2vec(tokens, vector_size=100, epochs=10, workers=None, corpus_file=None):
+    '''
+    Train a Doc2Vec model over the stored tokens.
+
+    Inputs:
+      tokens (TokenTable): tokens of every post, from VectorStore.load_tokens.
+      vector_size (int): dimensions of the document vectors.
+      epochs (int): passes over the corpus.
+      workers (int): training threads; defaults to one per core.
+      corpus_file (str): if given, the corpus is written here and gensim
+        reads it itself, which scales across workers far better than
+        streaming TaggedDocuments from Python.
+
+    Returns: trained model; model.dv.vectors[i] belongs to tokens.ids[i].
+    '''
+    workers = workers or os.cpu_count() or 1
+    if corpus_file is None:
+        model = d2v.Doc2Vec(documents=TaggedCorpus(tokens), vector_size=vector_size,
+                            dm=0, epochs=epochs, workers=workers)
+    else:
+        write_corpus_file(tokens, corpus_file)
+        # Doc2Vec's constructor drops trim_rule, so build the vocabulary first.
+        model = d2v.Doc2Vec(vector_size=vector_size, dm=0, epochs=epochs, workers=workers)
+        model.build_vocab(corpus_file=corpus_file, trim_rule=keep_out_empty)
+        model.train(corpus_file=corpus_file, total_examples=model.corpus_count,
+                    total_words=model.corpus_total_words, epochs=model.epochs)
+    check_vectors(model, tokens)
+    return model
+
+def save_model(model, path):
+    '''
+    Save a model so that load_model can memory-map its weights.
+    '''
+    model.save(path, sep_limit=0)
+
+def load_model(path):
+    '''
+    Load a model saved with save_model, its weights memory-mapped read-only.
+    Inference never writes to them, and the model loads near instantly.
+    '''
+    return d2v.Doc2Vec.load(path, mmap='r')
+
+def infer_vectors(model, documents, batch_size=1000, workers=None):
+    '''
+    Embed documents the model was not trained on.
+
+    Inputs:
+      model (Doc2Vec): trained model.
+      documents (list of list of str): tokens of each document.
+      batch_size (int): documents handed to a worker at a time.
+      workers (int): inference threads; defaults to one per core. gensim's
+        training loop releases the GIL, so threads run in parallel.
+
+    Returns: float32 array with one row per document.
+    '''
+    def infer_batch(batch):
+        return [model.infer_vector(words) for words in batch]
+
+    batches = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+    with ThreadPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        vectors = [vec for batch in pool.map(infer_batch, batches) for vec in batch]
+    return np.asarray(vectors, dtype=np.float32).reshape(len(documents), model.vector_size)
+
+def embed_new_posts(model, tokens, vectors_path, batch_size=1000, workers=None):
+    '''
+    Embed the posts in tokens that have no vector saved at vectors_path yet,
+    and append their vectors there.
+
+    Returns: number of posts embedded.
+    '''
+    if os.path.exists(vectors_path):
+        new = np.flatnonzero(rows_for(load_vectors(vectors_path)[0], tokens.ids) < 0)
+    else:
+        new = np.arange(len(tokens))
+    if len(new) == 0:
+        return 0
+
+    vectors = infer_vectors(model, [tokens[i] for i in new], batch_size, workers)
+    return append_vectors(vectors_path, tokens.ids[new], vectors)
+
+def embed(tokens_path='../data/tokens.npz', vectors_path='../data/docvecs.npy',
+          model_path='../data/doc2vec.model', vector_size=100, epochs=10, workers=None,
+          corpus_file=None, infer=False, batch_size=1000):
+    '''
+    Train Doc2Vec on the stored tokens and save the model and every post's
+    vector; or, with infer, only embed the posts without vectors, using the
+    saved model.
+
+    Inputs:
+      tokens_path (str): tokens saved by CorpusCleaner.
+      vectors_path (str): where to save the document vectors.
+      model_path (str): where the model is saved, or loaded from with infer.
+      vector_size, epochs, workers, corpus_file: see train_doc2vec.
+      infer (bool): only embed posts without vectors, using the saved model.
+      batch_size (int): posts per inference batch with infer.
+    '''
+    tokens = load_tokens(tokens_path)
+
+    if infer:
+        print('Embedding new posts...')
+        chanD2V = load_model(model_path)
+        added = embed_new_posts(chanD2V, tokens, vectors_path, batch_size, workers)
+        print(f'Embedded {added} new posts.')
+    else:
+        print('Running doc2vec...')
+        chanD2V = train_doc2vec(tokens, vector_size, epochs, workers, corpus_file)
+
+        print('Saving..')
+        save_model(chanD2V, model_path)
+        save_vectors(vectors_path, tokens.ids, chanD2V.dv.vectors)
+
 
 if __name__ == '__main__':
-    corpus = pd.read_csv('../data/preprocessed.csv', index_col='Unnamed: 0')
-    corpus['tokens'] = corpus['tokens'].apply(ast.literal_eval)
-    
-    print('Creating tagged documents...')
-    taggedDocs = []
-    for index, row in corpus.iterrows():
-        taggedDocs.append(
-            d2v.TaggedDocument(
-                words=[str(word) for word in row['tokens']],
-                tags=[row['id']]))
-    corpus['TaggedDocs'] = [d2v.TaggedDocument(
-        words=[[str(word) for word in row['tokens']]], 
-        tags=row['id']) for _, row in corpus.iterrows()]
-
-    print('Running doc2vec...')
-    chanD2V = d2v.Doc2Vec(documents=taggedDocs, vector_size=100, dm=0)
-
-    print('Extracting document vectors...')
-    docvecs = [chanD2V.docvecs[post] for post in corpus['id'].tolist()]
-
-    corpus['docsvecs'] = docvecs
-
-    print('Saving..')
-    corpus.to_csv('../data/full_corpus.csv')
+    parser = argparse.ArgumentParser(description='Embed the preprocessed corpus with Doc2Vec.')
+    parser.add_argument('--tokens', default='../data/tokens.npz',
+                        help='tokens saved by CorpusCleaner.')
+    parser.add_argument('--out', default='../data/docvecs.npy',
+                        help='where to save the document vectors.')
+    parser.add_argument('--vector-size', type=int, default=100)
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='training threads; defaults to one per core.')
+    parser.add_argument('--corpus-file', default=None,
+                        help="train in gensim's corpus_file mode, via this file.")
+    parser.add_argument('--model', default='../data/doc2vec.model',
+                        help='where the model is saved, or loaded from with --infer.')
+    parser.add_argument('--infer', action='store_true',
+                        help='only embed posts without vectors, using the saved model.')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='posts per inference batch with --infer.')
+    args = parser.parse_args()
+
+    embed(args.tokens, args.out, args.model, args.vector_size, args.epochs, args.workers,
+          args.corpus_file, args.infer, args.batch_size)
@@ -8,8 +8,11 @@
 ###           pulled by occassional manual calls to the `4chan_scrape.py`
 ###           script made every few days.
 
+from PostStore import load_posts
+from LabelQueue import LabelSession, QUEUE_PATH, LABELS_PATH
 import HelperChan as hc
 import pandas as pd
+import argparse
 
 def limited_input(prompt, is_valid_response=lambda x: (x in ['0', '1']), condition='Either 0 or 1.'):
     '''
@@ -33,8 +36,37 @@ def is_pos_int(x):
     except:
         return False
 
+def label_queue(session, n):
+    '''
+    Label (up to) n posts from an active learning queue, most uncertain
+    first. Each label is saved as soon as it is given.
+    '''
+    labeled = 0
+    for post, probability, context in session:
+        if labeled >= n:
+            break
+        print('-' * 20)
+        print(context)
+        rsp = limited_input('\n:: If this is a trans related post, type "1". Otherwise, type "0". ::\n')
+        session.record(post, probability, int(rsp))
+        labeled += 1
+    return labeled
+
 if __name__ == '__main__':
-    
+
+    parser = argparse.ArgumentParser(description='Hand label 4chan posts.')
+    parser.add_argument('--posts', default=None,
+                        help='CSV or PostStore to sample from, instead of picking a week.')
+    parser.add_argument('--queue', nargs='?', const=QUEUE_PATH, default=None,
+                        help='label the most uncertain posts from this active learning queue '
+                             '(see LabelQueue) instead of a random sample; needs --posts.')
+    parser.add_argument('--labels', default=LABELS_PATH,
+                        help='(with --queue) CSV labels are saved to as you go; labeling '
+                             'resumes where it left off.')
+    args = parser.parse_args()
+    if args.queue and args.posts is None:
+        parser.error('--queue needs --posts')
+
     # TODO: make this funnier iff you plan on using it on others 
     print('''Welcome to l4beler.py, the world's most innovative 4chan post labeling module (\j).''')
 
@@ -44,23 +76,34 @@ if __name__ == '__main__':
 
     print(f"Awesome, I'll grab {int(num_to_grab)} posts!")
 
+    if args.queue:
+        session = LabelSession(args.posts, args.queue, args.labels)
+        print(f'{session.count} posts already labeled in {args.labels}; picking up from there.')
+        labeled = label_queue(session, int(num_to_grab))
+        session.close()
+        print(f'Labeled {labeled} posts, saved to {args.labels}.')
+        exit()
+
     print(f"Grabbing {int(num_to_grab)} random posts..")
 
-    week_num = limited_input('Which week\'s data?', 
-                                is_valid_response=lambda x: True if str(x) in ['1', '2', '3'] else False,
-                                condition = 'one of 1, 2, or 3')
+    if args.posts is None:
+        week_num = limited_input('Which week\'s data?', 
+                                    is_valid_response=lambda x: True if str(x) in ['1', '2', '3'] else False,
+                                    condition = 'one of 1, 2, or 3')
+        args.posts = f'../data/lgbt_week_{week_num}.csv'
     
     # Read and subset
-    posts = pd.read_csv(f'../data/lgbt_week_{week_num}.csv')
+    posts = load_posts(args.posts)
     sampled_posts = posts.sample(n=int(num_to_grab))
 
     print(f'{len(sampled_posts)} posts grabbed! Prepare yourself for ~classifying~')
 
+    backreffer = hc.BackReferencer(posts)
     classes = {}
     for ind, post in sampled_posts.iterrows():
         print('-' * 20)
         try:
-            backref = hc.content_with_back_reference(post['content'], posts)
+            backref = backreffer.expand(post['content'])
         except TypeError:
             # fix this later -.-
             print("Failed to retrieve proper backref. Presenting post without context.")
@@ -0,0 +1,9 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: The scripts import each other as top level modules, run from
+###        code/, so put code/ on the path for the tests too.
+
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
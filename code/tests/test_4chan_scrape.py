@@ -0,0 +1,35 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: The scraper's metrics count the posts an archive actually gained.
+
+import importlib
+import pandas as pd
+import pytest
+import FakeBoard
+import ChanAPI
+from ScrapeMetrics import ScrapeMetrics
+
+pytest.importorskip('requests_html')
+chan_scrape = importlib.import_module('4chan_scrape')
+
+
+def test_rows_written_counts_new_posts(tmp_path):
+    threads = FakeBoard.make_board(n_threads=4, posts_per_thread=10)
+    FakeBoard.write_fixtures(threads, str(tmp_path / 'api'))
+    scraped = ChanAPI.get_all_current_posts('/lgbt/', api_url=str(tmp_path / 'api'))
+
+    # An archive which already has half of the board's posts, some twice over.
+    archive = str(tmp_path / 'archive.csv')
+    old = scraped.iloc[:20]
+    pd.concat([old, old.iloc[:5]], ignore_index=True).to_csv(archive, index=False)
+
+    metrics = ScrapeMetrics()
+    chan_scrape.scrape('/lgbt/', archive, backend='json', api_url=str(tmp_path / 'api'),
+                       metrics=metrics)
+    assert metrics.summary()['counters']['rows_written{sink="csv"}'] == 20
+    assert len(pd.read_csv(archive)) == 40
+
+def test_async_engine_rejects_fixture_directory(tmp_path):
+    with pytest.raises(ValueError, match='http'):
+        chan_scrape.scrape('/lgbt/', str(tmp_path / 'archive.csv'), engine='async',
+                           backend='json', api_url=str(tmp_path / 'api'))
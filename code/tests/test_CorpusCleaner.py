@@ -0,0 +1,76 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Incremental cleaning gives the same output as cleaning from scratch.
+###        Uses spaCy's blank English tokenizer, so no model is needed.
+
+import pandas as pd
+import pytest
+import CorpusCleaner
+from VectorStore import load_tokens
+
+TOKENIZER = 'blank:en'
+
+
+def make_posts():
+    return pd.DataFrame({'subject': 'thread', 'id': [100, 101, 102, 103],
+                         'content': ['first post', '>>00000100 second', 'third https://youtu.be/x',
+                                     '>>00000101 fourth']})
+
+def clean(tmp_path, sources, name, depth=1, incremental=True, cache=False):
+    tokens_path = str(tmp_path / f'{name}.npz')
+    preprocessed_path = str(tmp_path / f'{name}.csv')
+    CorpusCleaner.clean_corpus(sources, tokens_path, preprocessed_path, depth,
+                               cache_path=str(tmp_path / 'cache.sqlite') if cache else None,
+                               incremental=incremental, tokenizer=TOKENIZER)
+    tokens = load_tokens(tokens_path)
+    return pd.read_csv(preprocessed_path, keep_default_na=False)['clean_content'].tolist(), \
+        dict(zip(tokens.ids.tolist(), tokens))
+
+def test_stale_posts():
+    previous = make_posts()
+    corpus = pd.concat([previous, pd.DataFrame({'subject': 'thread', 'id': [104],
+                                                'content': ['>>00000103 fifth']})],
+                       ignore_index=True)
+    assert CorpusCleaner.stale_posts(corpus, previous).tolist() == [False] * 4 + [True]
+
+    # A changed post makes the posts referencing it stale, up to depth away.
+    corpus.loc[0, 'content'] = 'first post, edited'
+    assert CorpusCleaner.stale_posts(corpus, previous, 1).tolist() == \
+        [True, True, False, False, True]
+    assert CorpusCleaner.stale_posts(corpus, previous, 2).tolist() == \
+        [True, True, False, True, True]
+
+    # So does a post that is gone.
+    assert CorpusCleaner.stale_posts(previous.iloc[1:], previous.iloc[:1]).tolist() == \
+        [True, True, True]
+
+@pytest.mark.parametrize('depth', [1, 2])
+@pytest.mark.parametrize('cache', [False, True])
+def test_incremental_matches_full(tmp_path, capsys, depth, cache):
+    posts = make_posts()
+    first = str(tmp_path / 'first.csv')
+    posts.to_csv(first, index=False)
+    clean(tmp_path, [first], 'incremental', depth, cache=cache)
+
+    # Image-only posts have no content.
+    more = pd.DataFrame({'subject': 'thread', 'id': [104, 105, 106],
+                         'content': ['>>00000103 fifth', '>>00000104 >>00000100 sixth', None]})
+    second = str(tmp_path / 'second.csv')
+    more.to_csv(second, index=False)
+    capsys.readouterr()
+    incremental = clean(tmp_path, [first, second], 'incremental', depth, cache=cache)
+    assert '3 of 7 posts are new or affected' in capsys.readouterr().out
+    full = clean(tmp_path, [first, second], 'full', depth, incremental=False)
+    assert incremental == full
+
+    assert clean(tmp_path, [first, second], 'incremental', depth, cache=cache) == full
+    assert '0 of 7 posts are new or affected' in capsys.readouterr().out
+
+def test_depth_change_cleans_again(tmp_path):
+    posts = make_posts()
+    source = str(tmp_path / 'posts.csv')
+    posts.to_csv(source, index=False)
+    clean(tmp_path, [source], 'out', depth=1, cache=True)
+    changed = clean(tmp_path, [source], 'out', depth=2, cache=True)
+    assert changed == clean(tmp_path, [source], 'full', depth=2, incremental=False)
+    assert CorpusCleaner.load_config(str(tmp_path / 'out.csv'))['backref_depth'] == 2
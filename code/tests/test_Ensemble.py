@@ -0,0 +1,99 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Warm started refits of the stacking ensemble.
+
+from sklearn.ensemble import BaggingClassifier, HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold
+from sklearn.base import BaseEstimator, ClassifierMixin
+import numpy as np
+import warnings
+import pytest
+import Ensemble
+
+
+def make_data(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 5))
+    y = (X[:, 0] + rng.normal(scale=.3, size=n) > 0).astype(int)
+    return X, y
+
+def bagging():
+    return BaggingClassifier(estimator=LogisticRegression(), n_estimators=4, random_state=0)
+
+def test_warm_refit_grows_bagging():
+    X, y = make_data()
+    ensemble = Ensemble.StackedEnsemble([('bag', bagging())], cv=3, warm_start=True)
+    ensemble.fit(X, y)
+    first = ensemble.estimators_[0][1]
+    coefs = [est.coef_.copy() for est in first.estimators_]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        ensemble.fit(X, 1 - y)
+    bag = ensemble.estimators_[0][1]
+    # The old estimators are kept, and new ones are fit on the new labels.
+    assert len(bag.estimators_) == 4 + Ensemble.GROW_BY
+    for before, est in zip(coefs, bag.estimators_):
+        assert np.array_equal(before, est.coef_)
+    assert all(est.coef_[0, 0] < 0 for est in bag.estimators_[4:])
+    assert ensemble.score(X, 1 - y) > .8
+
+class Recorder(ClassifierMixin, BaseEstimator):
+    '''
+    Remembers the rows (by the id in their first column) it has been fit
+    on, across warm started fits.
+    '''
+
+    def __init__(self, warm_start=False):
+        self.warm_start = warm_start
+
+    def fit(self, X, y):
+        seen = self.seen_ if self.warm_start and hasattr(self, 'seen_') else set()
+        self.seen_ = seen | set(X[:, 0].tolist())
+        self.classes_ = np.unique(y)
+        return self
+
+    def predict_proba(self, X):
+        return np.full((len(X), 2), .5)
+
+def test_folds_never_see_their_test_rows():
+    X, y = make_data(600)
+    X[:, 0] = np.arange(len(X))
+    ensemble = Ensemble.StackedEnsemble([('rec', Recorder())], cv=3, warm_start=True)
+    ensemble.fit(X[:300], y[:300])
+    # The labeled set grows (and is reordered) between self-training rounds.
+    order = np.random.default_rng(1).permutation(500)
+    ensemble.fit(X[order], y[order])
+
+    folds = StratifiedKFold(3).split(X[order], y[order])
+    for fold, (_, test) in zip(ensemble.fold_estimators_[0][1], folds):
+        assert not fold.seen_ & set(X[order][test, 0].tolist())
+    assert ensemble.estimators_[0][1].seen_ == set(range(500))
+
+@pytest.mark.parametrize('estimator, param, start', [
+    (bagging(), 'n_estimators', 4),
+    (HistGradientBoostingClassifier(max_iter=10), 'max_iter', 10)])
+def test_warm_refit_leaves_last_round_alone(estimator, param, start):
+    X, y = make_data()
+    ensemble = Ensemble.StackedEnsemble([('est', estimator)], cv=3, warm_start=True)
+    ensemble.fit(X, y)
+    last_round = ensemble.estimators_[0][1]
+    last_final = ensemble.final_estimator_
+    ensemble.fit(X[:300], y[:300])
+
+    assert ensemble.estimators_[0][1].get_params()[param] == start + Ensemble.GROW_BY
+    assert last_round.get_params()[param] == start
+    assert ensemble.estimators_[0][1] is not last_round
+    assert ensemble.final_estimator_ is not last_final
+    # Fold models are fit from scratch every round.
+    assert all(fold.get_params()[param] == start for fold in ensemble.fold_estimators_[0][1])
+
+def test_cold_refit_starts_over():
+    X, y = make_data()
+    ensemble = Ensemble.StackedEnsemble([('bag', bagging())], cv=3)
+    ensemble.fit(X, y)
+    ensemble.fit(X, 1 - y)
+    assert len(ensemble.estimators_[0][1].estimators_) == 4
+    assert all(len(fold.estimators_) == 4 for fold in ensemble.fold_estimators_[0][1])
+    assert ensemble.score(X, 1 - y) > .8
@@ -0,0 +1,38 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: FakeBoard makes the same board for the same seed, and its pages
+###        parse to the same posts as its JSON.
+
+import pandas as pd
+import FakeBoard
+import ChanAPI
+import ChanParser
+
+
+def test_same_seed_same_board():
+    assert FakeBoard.make_board(5, 20, seed=3) == FakeBoard.make_board(5, 20, seed=3)
+    assert FakeBoard.make_board(5, 20, seed=3) != FakeBoard.make_board(5, 20, seed=4)
+
+def test_make_board_shape():
+    threads = FakeBoard.make_board(6, 25)
+    assert [len(thread['posts']) for thread in threads] == [25] * 6
+    bumps = [thread['posts'][-1]['time'] for thread in threads]
+    assert bumps == sorted(bumps, reverse=True)
+    # Every thread is live at once, so post numbers interleave across threads.
+    ids = sorted((post['no'], thread['no']) for thread in threads for post in thread['posts'])
+    assert len({thread for _, thread in ids[:25]}) > 1
+
+def test_make_corpus():
+    corpus = FakeBoard.make_corpus(1000, posts_per_thread=50, seed=1)
+    assert len(corpus) == 1000 and corpus['id'].is_unique
+    assert list(corpus.columns) == list(ChanAPI.parse_thread_json(
+        FakeBoard.make_board(1, 2)[0]).columns)
+    chunks = list(FakeBoard.make_corpus(1000, chunksize=300, posts_per_thread=50, seed=1))
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), corpus)
+
+def test_pages_parse_like_json():
+    for thread, page in FakeBoard.iter_pages(500, posts_per_thread=50, seed=2):
+        from_html = ChanParser.parse_thread(ChanParser.make_soup(page))
+        from_json = ChanAPI.parse_thread_json(thread)
+        for column in ('id', 'content', 'refs', 'urls'):
+            assert [str(x) for x in from_html[column]] == [str(x) for x in from_json[column]]
@@ -0,0 +1,79 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Pinned outputs of HelperChan's content cleaning and back referencing.
+
+import warnings
+import pytest
+import pandas as pd
+import HelperChan
+
+
+@pytest.mark.parametrize('content, refs, urls, clean', [
+    # Sentences run together, abbreviations and version numbers aren't URLs.
+    ('e.g. i.e. this...that', [], [], 'e.g. i.e. this...that'),
+    ('version 1.2.3 is out', [], [], 'version 1.2.3 is out'),
+    ('the narrative.It was', [], [], 'the narrative.It was'),
+    ('tranny...alas', [], [], 'tranny...alas'),
+    ('you know...I do', [], [], 'you know...I do'),
+    ('fuck.Is it', [], [], 'fuck.Is it'),
+    ('apply.QOTT: why', [], [], 'apply.QOTT: why'),
+    ('mail me@gmail.com', [], [], 'mail me@gmail.com'),
+    # URLs with a scheme or www., and bare domains.
+    ('see https://www.youtube.com/watch?v=abc_d-1 now', [],
+     ['https://www.youtube.com/watch?v=abc_d-1'], 'see   now'),
+    ('https://youtu.be/xyz', [], ['https://youtu.be/xyz'], ' '),
+    ('www.transline.zone/abc ok', [], ['www.transline.zone/abc'], '  ok'),
+    ('go to reddit.com/r/trans. ok', [], ['reddit.com/r/trans'], 'go to  . ok'),
+    ('example.co.uk:8080/x?y=1', [], ['example.co.uk:8080/x?y=1'], ' '),
+    # References are replaced with newlines, before URLs are looked for.
+    ('>>34664894 lol', ['>>34664894'], [], '\n lol'),
+    ('>>34664894\nhttp://imgur.com/a1 >>34664895', ['>>34664894', '>>34664895'],
+     ['http://imgur.com/a1'], '\n\n  \n'),
+])
+def test_process_content(content, refs, urls, clean):
+    assert HelperChan.process_content(content) == (refs, urls, clean)
+    assert HelperChan.get_references(content) == refs
+    assert HelperChan.get_urls(content) == urls
+    assert HelperChan.remove_links(content) == clean
+
+def test_process_series():
+    contents = pd.Series(['>>34664894 lol', 'see https://youtu.be/xyz', 'e.g. this'],
+                         index=[3, 1, 2])
+    processed = HelperChan.process_series(contents)
+    assert processed.index.tolist() == [3, 1, 2]
+    assert processed['refs'].tolist() == [['>>34664894'], [], []]
+    assert processed['urls'].tolist() == [[], ['https://youtu.be/xyz'], []]
+    assert HelperChan.remove_links_series(contents).tolist() == ['\n lol', 'see  ', 'e.g. this']
+
+def make_posts():
+    return pd.DataFrame({'id': [34664894, 34664895, 34664896],
+                         'content': ['first', '>>34664894 second', '>>34664895 >>34000000 third']})
+
+def test_back_reference():
+    # References to posts not found are wrapped too, as they always were.
+    posts = make_posts()
+    with pytest.warns(UserWarning, match='34000000 not found'):
+        assert HelperChan.content_with_back_reference(posts['content'][2], posts) == \
+            "<ref>'>>34664894 second'</ref>\n <ref>'>>34000000'</ref>\n third"
+    with pytest.warns(UserWarning):
+        assert HelperChan.content_with_back_reference(posts['content'][2], posts, depth=2) == \
+            "<ref>\"<ref>'first'</ref>\n second\"</ref>\n <ref>'>>34000000'</ref>\n third"
+
+def test_back_reference_against_index():
+    posts = make_posts()
+    referencer = HelperChan.BackReferencer(posts)
+    for content in posts['content']:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            assert HelperChan.content_with_back_reference(content, referencer) == \
+                HelperChan.content_with_back_reference(content, posts) == referencer.expand(content)
+
+def test_back_reference_without_references(monkeypatch):
+    # Posts without references never index the DataFrame.
+    monkeypatch.setattr(HelperChan.BackReferencer, '__init__', None)
+    assert HelperChan.content_with_back_reference('no refs here', make_posts()) == 'no refs here'
+
+def test_back_reference_duplicates():
+    posts = pd.concat([make_posts(), make_posts()], ignore_index=True)
+    with pytest.raises(ValueError):
+        HelperChan.content_with_back_reference('>>34664894', posts)
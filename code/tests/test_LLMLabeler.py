@@ -0,0 +1,105 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: LLMLabeler's response cache and retrying, against a local server
+###        answering as scripted.
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from contextlib import contextmanager
+import threading
+import aiohttp
+import asyncio
+import json
+import pytest
+import GPTHelper
+import LLMLabeler
+
+
+@contextmanager
+def serve(script):
+    '''
+    Serve chat completions, answering each post with script(post, times it
+    has been asked about before), which returns (status, headers, answer).
+
+    Returns: (API url, dict counting the requests made per post).
+    '''
+    asked = {}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            post = request['messages'][-1]['content'].split('MESSAGE:', 1)[-1].strip()
+            with lock:
+                times = asked.get(post, 0)
+                asked[post] = times + 1
+            status, headers, answer = script(post, times)
+            body = json.dumps({'choices': [{'message': {'role': 'assistant', 'content': answer}}]})
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body.encode('utf-8'))
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}/v1', asked
+    finally:
+        server.shutdown()
+        server.server_close()
+
+async def collect(client, posts, batch_size=10):
+    prompts = [GPTHelper.prompt_messages(post) for post in posts]
+    return [answer async for batch in client.stream(prompts, batch_size) for answer in batch]
+
+
+def test_retry_after():
+    assert LLMLabeler.retry_after(None, 2.0) == 2.0
+    assert LLMLabeler.retry_after('1.5', 2.0) == 1.5
+    assert LLMLabeler.retry_after('nonsense', 2.0) == 2.0
+    past = format_datetime(datetime.now(timezone.utc) - timedelta(seconds=30), usegmt=True)
+    assert LLMLabeler.retry_after(past, 2.0) == 0.0
+    future = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < LLMLabeler.retry_after(future, 2.0) <= 30
+
+def test_retries_with_http_date_retry_after(tmp_path):
+    def script(post, times):
+        if post == 'busy' and times == 0:
+            now = format_datetime(datetime.now(timezone.utc), usegmt=True)
+            return 429, {'Retry-After': now}, ''
+        return 200, {}, 'Yes'
+
+    with serve(script) as (url, asked):
+        client = LLMLabeler.LabelClient(url, api_key='', backoff=.01, timeout=5)
+        assert asyncio.run(collect(client, ['busy', 'fine'])) == ['Yes', 'Yes']
+    assert asked == {'busy': 2, 'fine': 1}
+
+def test_failed_request_keeps_the_rest_of_the_batch(tmp_path):
+    posts = [f'post {i}' for i in range(5)] + ['bad']
+    fail = {'bad'}
+
+    def script(post, times):
+        if post in fail:
+            return 400, {}, ''
+        return 200, {}, 'No'
+
+    cache = LLMLabeler.ResponseCache(str(tmp_path / 'cache.sqlite'))
+    with serve(script) as (url, asked):
+        client = LLMLabeler.LabelClient(url, api_key='', cache=cache, timeout=5)
+        with pytest.raises(aiohttp.ClientResponseError):
+            asyncio.run(collect(client, posts))
+        # The answers that came back were cached, so only the failed
+        # request is made again.
+        fail.clear()
+        assert asyncio.run(collect(client, posts)) == ['No'] * 6
+    assert asked == {**{post: 1 for post in posts[:-1]}, 'bad': 2}
+    assert cache.hits == 5
+    cache.close()
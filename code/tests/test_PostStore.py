@@ -0,0 +1,44 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Reading posts in chunks gives what reading them at once does,
+###        from a CSV or a PostStore.
+
+import pandas as pd
+import pytest
+from PostStore import PostStore, load_posts, iter_posts
+import FakeBoard
+
+
+def test_iter_posts_matches_load_posts(tmp_path):
+    posts = FakeBoard.make_corpus(300, posts_per_thread=30)
+    csv = str(tmp_path / 'posts.csv')
+    posts.to_csv(csv, index=False)
+    store = PostStore(str(tmp_path / 'posts.sqlite'))
+    store.append(posts)
+    store.close()
+
+    for source in (csv, str(tmp_path / 'posts.sqlite')):
+        columns = ['id', 'thread', 'content', 'datetime']
+        chunks = list(iter_posts(source, 70, columns))
+        assert len(chunks) == 5
+        pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True),
+                                      load_posts(source, columns), check_dtype=False)
+        assert pd.api.types.is_datetime64_any_dtype(chunks[0]['datetime'])
+
+def test_iter_posts_old_csv(tmp_path):
+    # Archives scraped before thread numbers were recorded.
+    old = str(tmp_path / 'old.csv')
+    pd.DataFrame({'subject': 'thread', 'id': [1, 2, 3], 'content': ['a', 'b', 'c'],
+                  'datetime': '2024-02-14 12:00:00'}).to_csv(old, index=False)
+    chunks = list(iter_posts(old, 2, ['id', 'thread', 'datetime']))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert chunks[0]['thread'].isna().all()
+    assert chunks[0]['datetime'].iloc[0] == pd.Timestamp('2024-02-14 12:00:00')
+
+def test_iter_posts_missing_store(tmp_path):
+    missing = str(tmp_path / 'missing.sqlite')
+    with pytest.raises(FileNotFoundError):
+        list(iter_posts(missing, 10))
+    with pytest.raises(FileNotFoundError):
+        load_posts(missing)
+    assert not (tmp_path / 'missing.sqlite').exists()
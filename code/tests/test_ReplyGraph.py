@@ -0,0 +1,15 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Per-post reply metrics join back onto the posts they describe.
+
+import FakeBoard
+from ReplyGraph import ReplyGraph
+
+
+def test_post_metrics_join_on_thread():
+    posts = FakeBoard.make_corpus(500, posts_per_thread=50)
+    metrics = ReplyGraph.from_posts(posts).post_metrics(centrality=False)
+    joined = posts.merge(metrics, on=['id', 'thread'], validate='one_to_one')
+    assert len(joined) == len(posts)
+    # Every thread's posts share one thread_index.
+    assert (joined.groupby('thread')['thread_index'].nunique() == 1).all()
@@ -0,0 +1,81 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Cleaning posts for scoring, writing scores, and the settings a
+###        model artifact keeps.
+###        Uses spaCy's blank English tokenizer, so no model is needed.
+
+import pandas as pd
+import numpy as np
+import Scorer
+
+
+class StubEnsemble:
+    classes_ = np.array([0, 1])
+
+    def predict_proba(self, vectors):
+        return np.column_stack([1 - vectors[:, 0], vectors[:, 0]])
+
+def make_classifier(**settings):
+    # Cleaning needs neither a fitted ensemble nor a Doc2Vec model.
+    return Scorer.PostClassifier(StubEnsemble(), None, {'tokenizer': 'blank:en', **settings})
+
+class StubClassifier:
+    settings = Scorer.DEFAULT_SETTINGS
+
+    def score_posts(self, posts, workers=None):
+        return np.full(len(posts), .75)
+
+def test_import_loads_no_model():
+    import CorpusCleaner
+    assert CorpusCleaner.nlp is None
+
+def test_clean_with_duplicate_posts():
+    posts = pd.DataFrame({'id': [1, 34664894, 34664894, 2],
+                          'content': ['>>34664894 see', 'first https://youtu.be/x',
+                                      'first https://youtu.be/x', 'no refs']})
+    assert make_classifier().clean(posts) == ["<ref>'first  '</ref>\n see",
+                                             'first  ', 'first  ', 'no refs']
+
+def test_artifact_keeps_cleaning_settings(tmp_path):
+    import CorpusCleaner
+    import embedder
+    import SemiSupervisedClassifier
+
+    rng = np.random.default_rng(0)
+    words = ['trans', 'hrt', 'estrogen', 'game', 'food', 'music', 'weather', 'cat']
+    posts = pd.DataFrame({'subject': 'thread', 'id': np.arange(10000000, 10000200),
+                          'content': [' '.join(rng.choice(words, 8)) for _ in range(200)]})
+    posts['classification'] = posts['content'].str.contains('trans').astype(int)
+    source = str(tmp_path / 'posts.csv')
+    labels = str(tmp_path / 'labels.csv')
+    posts.drop(columns='classification').to_csv(source, index=False)
+    posts.head(100).to_csv(labels)
+
+    data = lambda name: str(tmp_path / name)
+    CorpusCleaner.clean_corpus([source], data('tokens.npz'), data('preprocessed.csv'), depth=2,
+                               cache_path=None, tokenizer='blank:en')
+    embedder.embed(data('tokens.npz'), data('docvecs.npy'), data('doc2vec.model'),
+                   vector_size=10, epochs=2, workers=1)
+    SemiSupervisedClassifier.train_classifier(
+        [labels], None, data('docvecs.npy'), data('preprocessed.csv'), k=5, max_iter=1,
+        estimators=['LinearSVC', 'DecisionTree'], save=data('model'), doc2vec=data('doc2vec.model'))
+
+    clf = Scorer.load_artifact(data('model'))
+    assert clf.settings['backref_depth'] == 2
+    assert clf.settings['tokenizer'] == 'blank:en'
+    assert len(clf.score_posts(posts.head(5))) == 5
+
+def test_rescoring_replaces_scores(tmp_path):
+    source = str(tmp_path / 'posts.csv')
+    pd.DataFrame({'id': [1, 2, 3], 'content': ['a', 'b', 'c']}).to_csv(source, index=False)
+    out = str(tmp_path / 'scores.csv')
+    pd.DataFrame({'old': ['layout']}).to_csv(out, index=False)
+
+    for _ in range(2):
+        assert Scorer.score_sources(StubClassifier(), [source], out, chunksize=2) == 3
+        scores = pd.read_csv(out)
+        assert list(scores.columns) == ['id', 'probability', 'classification']
+        assert scores['id'].tolist() == [1, 2, 3]
+
+    Scorer.score_sources(StubClassifier(), [source], out, append=True)
+    assert pd.read_csv(out)['id'].tolist() == [1, 2, 3] * 2
@@ -0,0 +1,17 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: The run summary and the Prometheus textfile report the same quantiles.
+
+from ScrapeMetrics import ScrapeMetrics, QUANTILES
+
+
+def test_summary_and_prometheus_agree():
+    metrics = ScrapeMetrics()
+    for value in range(100):
+        metrics.observe('request_seconds', value / 100, kind='thread')
+    summary = metrics.summary()['observations']['request_seconds{kind="thread"}']
+    lines = dict(line.rsplit(' ', 1) for line in metrics.prometheus().splitlines()
+                 if not line.startswith('#'))
+    for q in QUANTILES:
+        exported = float(lines[f'chan_scrape_request_seconds{{kind="thread",quantile="{q}"}}'])
+        assert abs(summary[f'p{q * 100:g}'] - exported) < 1e-6
@@ -0,0 +1,51 @@
+### Author: Ashlynn Wimer
+### Date: 10/18/2026
+### About: Every post, tokens or not, gets its own document vector.
+
+import numpy as np
+import pytest
+import embedder
+from VectorStore import save_tokens, load_tokens, load_vectors
+
+
+def make_tokens(tmp_path):
+    tokens = [['trans', 'rights'], [], ['food', 'music', 'cat'], []] * 10
+    save_tokens(str(tmp_path / 'tokens.npz'), range(100, 100 + len(tokens)), tokens)
+    return load_tokens(str(tmp_path / 'tokens.npz'))
+
+def test_corpus_file_has_a_line_per_post(tmp_path):
+    tokens = make_tokens(tmp_path)
+    embedder.write_corpus_file(tokens, str(tmp_path / 'corpus.txt'))
+    with open(tmp_path / 'corpus.txt', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert len(lines) == len(tokens)
+    assert lines[:2] == ['trans rights', embedder.EMPTY_TOKEN]
+
+@pytest.mark.parametrize('corpus_file', [False, True])
+def test_a_vector_per_post(tmp_path, corpus_file):
+    make_tokens(tmp_path)
+    embedder.embed(str(tmp_path / 'tokens.npz'), str(tmp_path / 'docvecs.npy'),
+                   str(tmp_path / 'doc2vec.model'), vector_size=5, epochs=1, workers=1,
+                   corpus_file=str(tmp_path / 'corpus.txt') if corpus_file else None)
+    ids, vectors = load_vectors(str(tmp_path / 'docvecs.npy'))
+    assert ids.tolist() == list(range(100, 140))
+    assert vectors.shape == (40, 5)
+
+def test_check_vectors(tmp_path):
+    tokens = make_tokens(tmp_path)
+    model = embedder.train_doc2vec(tokens, vector_size=5, epochs=1, workers=1)
+    embedder.check_vectors(model, tokens)
+    with pytest.raises(ValueError):
+        embedder.check_vectors(model, list(tokens)[:-1])
+
+def test_modes_agree_on_empty_posts(tmp_path):
+    # More posts without tokens than min_count, so EMPTY_TOKEN would make
+    # the vocabulary if it were let in.
+    tokens = make_tokens(tmp_path)
+    streamed = embedder.train_doc2vec(tokens, vector_size=5, epochs=2, workers=1)
+    from_file = embedder.train_doc2vec(tokens, vector_size=5, epochs=2, workers=1,
+                                       corpus_file=str(tmp_path / 'corpus.txt'))
+    assert embedder.EMPTY_TOKEN not in from_file.wv.key_to_index
+    assert set(from_file.wv.key_to_index) == set(streamed.wv.key_to_index)
+    empty = [i for i, words in enumerate(tokens) if len(words) == 0]
+    assert np.array_equal(streamed.dv.vectors[empty], from_file.dv.vectors[empty])